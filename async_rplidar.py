@@ -0,0 +1,280 @@
+"""Asyncio driver for RPLidar rangefinder scanners.
+
+The serial port is read without blocking: its file descriptor is watched by
+the event loop and the bytes are decoded with the packet decoders of
+rplidar.RPLidar as they arrive. Only the latest complete rotation is kept,
+so a slow consumer skips stale scans instead of falling behind.
+
+Usage example:
+
+>>> import asyncio
+>>> from async_rplidar import AsyncRPLidar
+>>>
+>>> async def main():
+...     lidar = AsyncRPLidar('/dev/ttyUSB0')
+...     await lidar.connect()
+...     print(await lidar.get_health())
+...     lidar.start_motor()
+...     async for scan in lidar.scans():
+...         print(scan.valid.sum())
+...     await lidar.stop()
+...     await lidar.stop_motor()
+...     lidar.disconnect()
+>>>
+>>> asyncio.run(main())
+"""
+import asyncio
+import os
+import time
+
+import serial
+
+from rplidar import (DESCRIPTOR_LEN, GET_HEALTH_BYTE, GET_INFO_BYTE, HEALTH_LEN,
+                     HEALTH_TYPE, INFO_LEN, INFO_TYPE, RESET_BYTE, STOP_BYTE,
+                     RPLidar, RPLidarException, RPLidarTimeoutException, Scan,
+                     _HEALTH_STATUSES, _SCAN_TYPE, _bin_scan, _check_response,
+                     _parse_descriptor, _parse_health, _parse_info, _showhex)
+
+
+class AsyncRPLidar(RPLidar):
+    """RPLidar driver for asyncio applications.
+
+    Use the coroutines `connect`, `get_info`, `get_health`, `start`,
+    `stop`, `read_scan` and the asynchronous iterator `scans`; the blocking
+    iterators of RPLidar are not available. The port must have a file
+    descriptor (a serial port or a pseudo terminal such as
+    lidar_sim.PtySensor).
+
+    Rotations completed while the previous one was not read yet replace it
+    and are counted in `stats.scans_dropped`.
+    """
+
+    def __init__(self, port, baudrate=115200, timeout=1, logger=None,
+                 serial_factory=None):
+        super(AsyncRPLidar, self).__init__(port, baudrate, timeout, logger,
+                                           serial_factory, auto_connect=False)
+        self._loop = None
+        self._fd = None
+        # bytes of the responses to commands, scan bytes are decoded at once
+        self._buffer = bytearray()
+        self._latest = None
+        self._error = None
+        self._wakeup = None
+
+    async def connect(self):
+        """Opens the port and starts watching it from the running loop"""
+        if self._serial is not None:
+            self.disconnect()
+        factory = self.serial_factory or serial.Serial
+        try:
+            self._serial = factory(
+                self.port, self.baudrate,
+                parity=serial.PARITY_NONE, stopbits=serial.STOPBITS_ONE,
+                timeout=0)
+        except serial.SerialException as err:
+            raise RPLidarException('Failed to connect to the sensor '
+                                   'due to: %s' % err)
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._error = None
+        self._fd = self._serial.fileno()
+        self._loop.add_reader(self._fd, self._on_readable)
+
+    def disconnect(self):
+        """Stops watching and closes the port"""
+        if self._serial is None:
+            return
+        if self._fd is not None:
+            self._loop.remove_reader(self._fd)
+            self._fd = None
+        self._serial.close()
+        self._serial = None
+
+    def _on_readable(self):
+        try:
+            data = os.read(self._fd, 65536)
+        except BlockingIOError:
+            return
+        except OSError as err:
+            self._fail(RPLidarException('Failed to read from the sensor due to: %s' % err))
+            return
+        if not data:
+            self._fail(RPLidarException('The sensor port was closed'))
+            return
+        if self.scanning[0]:
+            try:
+                self._feed(data)
+            except RPLidarException as err:
+                self._fail(err)
+                return
+        else:
+            self._buffer += data
+        self._wakeup.set()
+
+    def _fail(self, err):
+        self._error = err
+        self._loop.remove_reader(self._fd)
+        self._fd = None
+        self._wakeup.set()
+
+    def _feed(self, data):
+        """Decodes scan bytes and keeps the latest complete rotation"""
+        read_time = time.monotonic()
+        self.stats.observe_backlog(len(data))
+        measures = self._decode_packets(data, self.scanning[1])
+        while True:
+            rotation = self._assemble_scan(read_time, measures)
+            if rotation is None:
+                break
+            if self._latest is not None:
+                self.stats.scans_dropped += 1
+            self._latest = rotation, self.last_scan_info
+            (read_time, measures), self._pending = self._pending, None
+
+    async def _wait_for(self, ready, timeout=None):
+        """Waits until `ready()` is true, for at most `timeout` seconds"""
+        if timeout is None:
+            timeout = self.timeout
+        deadline = self._loop.time() + timeout
+        while not ready():
+            if self._error is not None:
+                raise self._error
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                raise RPLidarTimeoutException(
+                    'Timed out after %.3f s waiting for the sensor' % timeout)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _read_response(self, dsize, timeout=None):
+        """Reads response packet with length of `dsize` bytes"""
+        start = time.monotonic()
+        await self._wait_for(lambda: len(self._buffer) >= dsize, timeout)
+        self.last_read_wait = time.monotonic() - start
+        data = bytes(self._buffer[:dsize])
+        del self._buffer[:dsize]
+        self.logger.debug('Received data: %s', _showhex(data))
+        return data
+
+    async def _read_descriptor(self):
+        return _parse_descriptor(await self._read_response(DESCRIPTOR_LEN))
+
+    async def get_info(self):
+        """Get device information, see `RPLidar.get_info`"""
+        if self._buffer:
+            return ('Data in buffer, you can\'t have info ! '
+                    'Run clean_input() to emptied the buffer.')
+        self._send_cmd(GET_INFO_BYTE)
+        dsize, _, _ = _check_response(await self._read_descriptor(), INFO_LEN, True,
+                                      INFO_TYPE)
+        return _parse_info(await self._read_response(dsize))
+
+    async def get_health(self):
+        """Get device health state, see `RPLidar.get_health`"""
+        if self._buffer:
+            return ('Data in buffer, you can\'t have info ! '
+                    'Run clean_input() to emptied the buffer.')
+        self.logger.info('Asking for health')
+        self._send_cmd(GET_HEALTH_BYTE)
+        dsize, _, _ = _check_response(await self._read_descriptor(), HEALTH_LEN, True,
+                                      HEALTH_TYPE)
+        return _parse_health(await self._read_response(dsize))
+
+    async def stop_motor(self):
+        """Stops sensor motor"""
+        self.logger.info('Stoping motor')
+        self._set_pwm(0)
+        await asyncio.sleep(.001)
+        self._serial.setDTR(True)
+        self.motor_running = False
+
+    def clean_input(self):
+        """Clean input buffer by reading all available data"""
+        message = super(AsyncRPLidar, self).clean_input()
+        if message is None:
+            self._buffer.clear()
+            self._latest = None
+        return message
+
+    async def start(self, scan_type='normal'):
+        """Start the scanning process, see `RPLidar.start`"""
+        if self.scanning[0]:
+            return 'Scanning already running !'
+        status, error_code = await self.get_health()
+        self.logger.debug('Health status: %s [%d]', status, error_code)
+        if status == _HEALTH_STATUSES[2]:
+            self.logger.warning('Trying to reset sensor due to the error. '
+                                'Error code: %d', error_code)
+            await self.reset()
+            status, error_code = await self.get_health()
+            if status == _HEALTH_STATUSES[2]:
+                raise RPLidarException('RPLidar hardware failure. '
+                                       'Error code: %d' % error_code)
+        elif status == _HEALTH_STATUSES[1]:
+            self.logger.warning('Warning sensor status detected! '
+                                'Error code: %d', error_code)
+
+        cmd = _SCAN_TYPE[scan_type]['byte']
+        self.logger.info('starting scan process in %s mode' % scan_type)
+        if scan_type == 'express':
+            self._send_payload_cmd(cmd, b'\x00\x00\x00\x00\x00')
+        else:
+            self._send_cmd(cmd)
+        dsize, _, _ = _check_response(await self._read_descriptor(),
+                                      _SCAN_TYPE[scan_type]['size'], False,
+                                      _SCAN_TYPE[scan_type]['response'])
+        self.scanning = [True, dsize, scan_type]
+        # scan bytes that arrived with the descriptor
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        if data:
+            self._feed(data)
+
+    async def stop(self):
+        """Stops scanning process, see `RPLidar.stop`"""
+        self.logger.info('Stopping scanning')
+        self._send_cmd(STOP_BYTE)
+        await asyncio.sleep(.1)
+        self.scanning[0] = False
+        self.clean_input()
+
+    async def reset(self):
+        """Resets sensor core, see `RPLidar.reset`"""
+        self.logger.info('Resetting the sensor')
+        self._send_cmd(RESET_BYTE)
+        await asyncio.sleep(2)
+        self.clean_input()
+
+    async def read_scan(self, scan_type='normal', with_quality=False, out=None,
+                        n_bins=360, reduce='last', with_count=False):
+        """Waits for the next complete rotation.
+
+        Auto-start the scanning process if it is not already started. The
+        parameters are those of `RPLidar.read_scan`, without the backlog
+        limit: rotations are dropped rather than accumulated.
+
+        Returns
+        -------
+        Scan
+            The most recent rotation not read yet
+        """
+        if not self.scanning[0]:
+            await self.start(scan_type)
+        await self._wait_for(lambda: self._latest is not None)
+        (quality, angle, distance), info = self._latest
+        self._latest = None
+        if out is None:
+            out = Scan.empty(n_bins, with_quality, with_count)
+        _bin_scan(angle, distance, quality, out=out, reduce=reduce)
+        return out._replace(info=info)
+
+    async def scans(self, scan_type='normal', with_quality=False, n_bins=360,
+                    reduce='last', with_count=False):
+        """Iterates over rotations as they complete, see `read_scan`.
+        Every scan is a new Scan, so they can be kept by the consumer."""
+        while True:
+            yield await self.read_scan(scan_type, with_quality, n_bins=n_bins,
+                                       reduce=reduce, with_count=with_count)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Load-time benchmark of visualizer data files: parsing the csv text as the
+statistics did against the sidecar frame cache of visualizer.frame_cache.
+
+For every size a data file is written by repeating the frames of a recorded
+csv file, then timed:
+  - readlines: what DataManager did with the file before any parsing
+  - lazy index: the line-offset index of the lazy DataManager mode
+  - per-value parse: readlines plus the float() loop of the former
+    DataAnalyzer.analyze_data_file (skipped above --legacy-max frames)
+  - first load: parse into the frame table and write the sidecar cache
+  - cached load: memory-map the sidecar
+  - cached load + pass: the same, then count the valid distances of every
+    frame (touches all of the cache)
+  - touched file: cached load after only the modification time changed,
+    which hashes the content instead of parsing it
+
+Usage:
+    python benchmarks/bench_dataset_load.py [--frames 10000 100000 1000000]
+                                            [--data data/run1/out1.txt] [--dir /tmp]
+"""
+
+import argparse
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from visualizer.data_input import LazyLines
+from visualizer.frame_cache import cache_paths, load_frame_table
+
+
+def write_data_file(path, template, n_frames):
+    """Writes n_frames lines cycling through the template lines"""
+    block = ''.join(template)
+    with open(path, 'w') as f:
+        for _ in range(n_frames // len(template)):
+            f.write(block)
+        f.writelines(template[:n_frames % len(template)])
+
+
+def legacy_parse(path):
+    """The per-value loop of the former DataAnalyzer.analyze_data_file"""
+    frames = 0
+    with open(path) as f:
+        for line in f.readlines():
+            data = line.strip().split(',')
+            if len(data) == 361:
+                frames += 1
+                for i in range(360):
+                    value = float(data[i])
+                    if math.isinf(value) or math.isnan(value) or value == 0:
+                        pass
+                float(data[360])
+    return frames
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def remove_cache(path):
+    for cache_path in cache_paths(path):
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--frames', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--data', default='data/run1/out1.txt',
+                        help='csv file whose frames are repeated')
+    parser.add_argument('--dir', default=None, help='directory of the generated files')
+    parser.add_argument('--legacy-max', type=int, default=100000,
+                        help='largest file parsed with the per-value loop')
+    args = parser.parse_args()
+
+    with open(args.data) as f:
+        template = [line if line.endswith('\n') else line + '\n' for line in f
+                    if line.count(',') == 360]
+    directory = tempfile.mkdtemp(dir=args.dir)
+    try:
+        print(f"Frames repeated from {args.data} ({len(template)} frames)")
+        print(f"{'frames':>9} {'MB':>8} {'readlines':>10} {'lazy index':>11} {'per-value':>10} "
+              f"{'first load':>11} {'cached':>9} {'cached+pass':>12} {'touched':>9}")
+        for n_frames in args.frames:
+            path = os.path.join(directory, f'frames_{n_frames}.txt')
+            write_data_file(path, template, n_frames)
+            size = os.path.getsize(path) / 1e6
+
+            t_readlines, _ = timed(lambda: open(path).readlines())
+            t_index, lines = timed(lambda: LazyLines(path))
+            lines.close()
+            t_legacy = '-'
+            if n_frames <= args.legacy_max:
+                t_legacy = f"{timed(lambda: legacy_parse(path))[0]:9.2f}s"
+            remove_cache(path)
+            t_first, table = timed(lambda: load_frame_table(path))
+            assert len(table) == n_frames
+            del table
+            t_cached, _ = timed(lambda: load_frame_table(path))
+            t_pass, _ = timed(lambda: int(load_frame_table(path).valid_counts().sum()))
+            os.utime(path)
+            t_touched, _ = timed(lambda: load_frame_table(path))
+
+            print(f"{n_frames:>9} {size:8.1f} {t_readlines:9.2f}s {t_index:10.2f}s {t_legacy:>10} "
+                  f"{t_first:10.2f}s {t_cached * 1e3:7.2f}ms {t_pass:11.2f}s {t_touched:8.2f}s")
+            remove_cache(path)
+            os.remove(path)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
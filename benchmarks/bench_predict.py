@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Per-call latency of steering prediction: the original csv/pandas
+`predict_dir` against mldriver.SteeringPredictor on numeric scans, with
+sklearn's predict and with the CompiledForest engine.
+
+Without --model, a 200-tree RandomForestRegressor is trained on the given
+data file with the same feature indices mldriver uses.
+
+Usage:
+    python benchmarks/bench_predict.py [--model model.pkl] [--data data/run1/out1.txt]
+"""
+
+import argparse
+import os
+import sys
+import time
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from mldriver import SteeringPredictor, load_predictor, selected_feature_indices
+
+
+def load_frames(data_file):
+    frames = []
+    with open(data_file) as f:
+        for line in f:
+            try:
+                frames.append([float(v) for v in line.strip().split(',')[:361]])
+            except ValueError:
+                continue  # header line
+    return np.array(frames)
+
+
+def legacy_predict_dir(model, in_str):
+    """The original mldriver.predict_dir"""
+    ar = pd.read_csv(StringIO(in_str), sep=',', header=None)
+    df = ar.iloc[:, selected_feature_indices]
+    return model.predict(df)
+
+
+def latency(func, inputs, repeat):
+    samples = np.empty(repeat)
+    for i in range(repeat):
+        x = inputs[i % len(inputs)]
+        start = time.perf_counter()
+        func(x)
+        samples[i] = time.perf_counter() - start
+    return samples
+
+
+def report(label, samples, reference=None):
+    p50, p95 = np.percentile(samples, [50, 95]) * 1e3
+    line = f"{label:<36} p50 {p50:8.3f} ms   p95 {p95:8.3f} ms"
+    if reference is not None:
+        line += f"   x{np.median(reference) / np.median(samples):.1f}"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--model', help='pickled model (bare or trainer dictionary)')
+    parser.add_argument('--data', default='data/run1/out1.txt')
+    parser.add_argument('--repeat', type=int, default=300)
+    args = parser.parse_args()
+
+    frames = load_frames(args.data)
+    scans = frames[:, :360].astype(np.float32)
+    lines = [','.join(map(str, row)) for row in frames[:, :360].tolist()]
+
+    if args.model:
+        predictor = load_predictor(args.model, compiled=False)
+    else:
+        from sklearn.ensemble import RandomForestRegressor
+        model = RandomForestRegressor(n_estimators=200, random_state=42)
+        model.fit(frames[:, selected_feature_indices], frames[:, 360])
+        predictor = SteeringPredictor(model, compiled=False)
+    model = predictor.model
+    compiled = SteeringPredictor(model, predictor.feature_indices)
+
+    print(f"Model: {type(model).__name__}, {len(predictor.feature_indices)} features")
+    print(f"Frames: {len(frames)} from {args.data}")
+    print()
+
+    legacy = latency(lambda s: legacy_predict_dir(model, s), lines, args.repeat)
+    report("legacy predict_dir (csv + pandas)", legacy)
+    report("SteeringPredictor.predict (sklearn)", latency(predictor.predict, scans, args.repeat),
+           legacy)
+    if compiled.engine is not None:
+        report("SteeringPredictor.predict (compiled)",
+               latency(compiled.predict, scans, args.repeat), legacy)
+        diff = np.max(np.abs(compiled.predict_batch(scans) - predictor.predict_batch(scans)))
+        print(f"  max difference compiled vs sklearn: {diff:.2e}")
+
+    gather = latency(lambda s: np.take(s, predictor.feature_indices,
+                                       out=predictor._features[0]), scans, args.repeat)
+    report("  of which feature gather", gather)
+
+    for label, p in (('sklearn', predictor), ('compiled', compiled)):
+        start = time.perf_counter()
+        p.predict_batch(scans)
+        elapsed = time.perf_counter() - start
+        label = f"predict_batch ({label})"
+        print(f"{label:<36} {elapsed / len(scans) * 1e3:8.3f} ms/scan for {len(scans)} scans")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark: per-packet `_process_scan` against the vectorized
+`_process_scan_bulk` decoder of rplidar.RPLidar.
+
+The byte stream is either a raw recording of the sensor output (starting at a
+packet boundary, i.e. right after the scan descriptor), a serial capture made
+with lidar_sim.py or, when none is given, a synthetic stream built from the
+frames of a recorded csv data file. The same stream is then read end to end
+through RPLidar.read_scan over the simulated serial port of lidar_sim.
+
+Express mode is benchmarked on a synthetic express stream: the former
+per-point decoder (tuple building per packet, one call per measure) against
+the vectorized `_process_express_bulk` + `_express_measures` pair.
+
+Usage:
+    python benchmarks/bench_scan_decode.py [--stream raw.bin | --capture scan.rpcap]
+                                           [--data data/run1/out1.txt]
+"""
+
+import argparse
+import os
+import sys
+import time
+from functools import partial
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lidar_sim import CaptureSource, FakeSerial, SyntheticSource, encode_normal_packets
+from rplidar import (BIN_REDUCTIONS, RPLidar, RPLidarTimeoutException, _bin_scan, _express_measures,
+                     _process_express_bulk, _process_scan, _process_scan_bulk)
+
+PACKET_SIZE = 5
+
+
+def build_stream(data_file, max_frames=None):
+    """Encodes every frame of a csv recording as one rotation of packets"""
+    rotations = []
+    with open(data_file) as f:
+        for n, line in enumerate(f):
+            if max_frames is not None and n >= max_frames:
+                break
+            try:
+                distances = [float(v) for v in line.strip().split(',')[:360]]
+            except ValueError:
+                continue  # header line
+            angle = np.arange(len(distances))
+            rotations.append(encode_normal_packets(angle == 0, np.full(len(angle), 15),
+                                                   angle, distances))
+    return b''.join(rotations)
+
+
+def per_packet(stream):
+    """Current path: one _process_scan call per 5-byte packet"""
+    count = 0
+    for i in range(0, len(stream) - PACKET_SIZE + 1, PACKET_SIZE):
+        _process_scan(stream[i:i + PACKET_SIZE])
+        count += 1
+    return count
+
+
+def bulk(stream, read_size):
+    """New path: decode whatever a single buffer read would return"""
+    count = 0
+    read_size -= read_size % PACKET_SIZE
+    for i in range(0, len(stream), read_size):
+        new_scan, quality, angle, distance = _process_scan_bulk(stream[i:i + read_size])
+        count += len(new_scan)
+    return count
+
+
+def bulk_and_bin(stream, reduce='last', n_bins=360):
+    """Bulk decode plus per-rotation binning, as read_single_measure does it"""
+    new_scan, quality, angle, distance = _process_scan_bulk(stream)
+    starts = np.flatnonzero(new_scan)
+    for begin, end in zip(starts[:-1], starts[1:]):
+        _bin_scan(angle[begin:end], distance[begin:end], quality[begin:end],
+                  n_bins=n_bins, reduce=reduce)
+    return len(starts)
+
+
+def legacy_express_packet(data):
+    """The former ExpressPacket.from_string"""
+    packet = bytearray(data)
+    checksum = 0
+    for b in packet[2:]:
+        checksum ^= b
+    if checksum != (packet[0] & 0b00001111) + ((packet[1] & 0b00001111) << 4):
+        raise ValueError('Invalid checksum')
+    start_angle = (packet[2] + ((packet[3] & 0b01111111) << 8)) / 64
+    d = a = ()
+    for i in range(0, 80, 5):
+        d += ((packet[i + 4] >> 2) + (packet[i + 5] << 6),)
+        a += (((packet[i + 8] & 0b00001111) + ((packet[i + 4] & 0b00000001) << 4)) / 8
+              * (1, -1)[(packet[i + 4] & 0b00000010) >> 1],)
+        d += ((packet[i + 6] >> 2) + (packet[i + 7] << 6),)
+        a += (((packet[i + 8] >> 4) + ((packet[i + 6] & 0b00000001) << 4)) / 8
+              * (1, -1)[(packet[i + 6] & 0b00000010) >> 1],)
+    return d, a, start_angle
+
+
+def legacy_express(stream):
+    """Former express path: one packet parse per packet, one call per measure"""
+    count = 0
+    old = legacy_express_packet(stream[:84])
+    for i in range(84, len(stream) - 83, 84):
+        new = legacy_express_packet(stream[i:i + 84])
+        for trame in range(1, 33):
+            new_scan = (new[2] < old[2]) & (trame == 1)
+            angle = (old[2] + ((new[2] - old[2]) % 360) / 32 * trame - old[1][trame - 1]) % 360
+            distance = old[0][trame - 1]
+            count += 1
+        old = new
+    return count
+
+
+def bulk_express(stream):
+    """Vectorized express path over the whole buffer"""
+    _, start_angle, distance, offset = _process_express_bulk(stream)
+    new_scan, angle, distance = _express_measures(start_angle[:-1], distance[:-1],
+                                                  offset[:-1], start_angle[1:])
+    return len(distance)
+
+
+class StreamSource(object):
+    """lidar_sim source serving a fixed byte stream"""
+
+    def __init__(self, stream, chunk=160):
+        self.chunks = [(0., stream[i:i + chunk]) for i in range(0, len(stream), chunk)]
+
+    def stream(self, scan_type='normal', chunk=None):
+        return iter(self.chunks)
+
+
+def read_scans(stream):
+    """End to end: RPLidar.read_scan over the simulated serial port"""
+    lidar = RPLidar('sim', timeout=0.01,
+                    serial_factory=partial(FakeSerial, source=StreamSource(stream)))
+    lidar.start()
+    count = 0
+    try:
+        while True:
+            lidar.read_scan(max_buf_meas=False)
+            count += 1
+    except RPLidarTimeoutException:
+        return count  # end of the stream
+
+
+def timed(func, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--stream', help='raw byte stream recorded from the sensor')
+    parser.add_argument('--capture', help='serial capture made with lidar_sim.py')
+    parser.add_argument('--data', default='data/run1/out1.txt',
+                        help='csv recording used to synthesize a stream')
+    parser.add_argument('--frames', type=int, default=None,
+                        help='limit the number of frames taken from --data')
+    args = parser.parse_args()
+
+    if args.stream:
+        with open(args.stream, 'rb') as f:
+            stream = f.read()
+        stream = stream[:len(stream) - len(stream) % PACKET_SIZE]
+        source = args.stream
+    elif args.capture:
+        stream = b''.join(chunk for _, chunk in CaptureSource(args.capture).stream())
+        stream = stream[:len(stream) - len(stream) % PACKET_SIZE]
+        source = args.capture
+    else:
+        stream = build_stream(args.data, args.frames)
+        source = args.data + ' (synthesized)'
+
+    n_packets = len(stream) // PACKET_SIZE
+    print(f"Stream: {source}")
+    print(f"Packets: {n_packets} ({len(stream) / 1024:.1f} KB)")
+    print()
+
+    _, t_ref = timed(per_packet, stream)
+    print(f"{'per-packet _process_scan':<34} {t_ref * 1e3:9.2f} ms "
+          f"{n_packets / t_ref:12.0f} packets/s")
+
+    for read_size in (500, 3000, len(stream)):
+        _, t = timed(bulk, stream, read_size)
+        label = f"bulk, {read_size} byte reads"
+        print(f"{label:<34} {t * 1e3:9.2f} ms {n_packets / t:12.0f} packets/s"
+              f"  x{t_ref / t:.1f}")
+
+    for reduce in BIN_REDUCTIONS:
+        rotations, t = timed(bulk_and_bin, stream, reduce)
+        label = f"bulk decode + binning ({reduce})"
+        print(f"{label:<34} {t * 1e3:9.2f} ms {rotations / t:12.0f} scans/s")
+
+    express = b''.join(chunk for _, chunk in
+                       SyntheticSource(rotations=n_packets // 360).stream('express'))
+    n_measures, t_ref = timed(legacy_express, express)
+    print()
+    print(f"Express packets: {len(express) // 84} ({n_measures} measures)")
+    print(f"{'per-point express decode':<34} {t_ref * 1e3:9.2f} ms "
+          f"{n_measures / t_ref:12.0f} measures/s")
+    _, t = timed(bulk_express, express)
+    print(f"{'vectorized express decode':<34} {t * 1e3:9.2f} ms "
+          f"{n_measures / t:12.0f} measures/s  x{t_ref / t:.1f}")
+    print()
+
+    scans, t = timed(read_scans, stream, repeat=1)
+    t -= 0.01  # the final read waits for the timeout
+    print(f"{'RPLidar.read_scan, simulated port':<34} {t * 1e3:9.2f} ms "
+          f"{scans / t:12.0f} scans/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Hardware backends for the driving loop.
+
+A backend provides the three devices DrivePipeline needs: the motor, the
+joystick (a callable returning the button dictionary of joystickmodule) and
+the serial port of the lidar. RealHardware imports RPi.GPIO, pygame and
+pyserial only when a device is created, so everything else in the driving
+stack loads on any machine; SimHardware runs the whole loop on a
+workstation against the simulated sensor of lidar_sim, the in-memory GPIO
+of motormodule and a scripted joystick.
+
+Usage example:
+
+>>> hardware = SimHardware(seconds=5)
+>>> pipeline = DrivePipeline(hardware.motor(), hardware.joystick(),
+...                          partial(start_lidar, hardware=hardware), predict)
+>>> pipeline.run()  # self-drives the simulated room for 5 seconds
+"""
+import time
+from functools import partial
+
+from motormodule import FakeGPIO, Motor
+
+MOTOR_PINS = (3, 5, 7, 15, 13, 11)
+
+# State returned by joystickmodule.get_joystick with nothing pressed
+JOYSTICK_IDLE = {'y': 0, 'b': 0, 'a': 0, 'x': 0,
+                 'L1': 0, 'R1': 0, 'L2': 0, 'R2': 0,
+                 'select': 0, 'start': 0, 'j1': 0, 'j2': 0, 'home': 0,
+                 'axis0': 0., 'axis1': 0., 'axis2': 0., 'axis3': 0.,
+                 'hat0': 0., 'hat1': 0.}
+
+
+class RealHardware:
+    """The devices of the car"""
+
+    def __init__(self, lidar_port='/dev/ttyUSB0', motor_pins=MOTOR_PINS):
+        self.lidar_port = lidar_port
+        self.motor_pins = motor_pins
+        self.serial_factory = None  # serial.Serial
+
+    def motor(self):
+        return Motor(*self.motor_pins)
+
+    def joystick(self):
+        from joystickmodule import get_joystick
+        return get_joystick
+
+
+class ScriptedJoystick:
+    """Joystick replaying timed button changes.
+
+    `events` is a list of (seconds, changes) with the times counted from
+    the first call; every changes dictionary updates the state, so a press
+    is followed by a release to avoid repeating it.
+    """
+
+    def __init__(self, events):
+        self.events = sorted(events, key=lambda event: event[0])
+        self.state = dict(JOYSTICK_IDLE)
+        self._start = None
+        self._next = 0
+
+    def __call__(self, name=''):
+        now = time.monotonic()
+        if self._start is None:
+            self._start = now
+        while self._next < len(self.events) and \
+                self.events[self._next][0] <= now - self._start:
+            self.state.update(self.events[self._next][1])
+            self._next += 1
+        return self.state if name == '' else self.state[name]
+
+
+def self_driving_script(seconds, start=0.5):
+    """Joystick events switching to self-driving after `start` seconds and
+    quitting after `seconds`"""
+    return [(start, {'L2': 1}), (start + 0.05, {'L2': 0}), (seconds, {'x': 1})]
+
+
+class SimHardware:
+    """Simulated devices for running the driving loop on a workstation.
+
+    Parameters
+    ----------
+    source : lidar_sim.SyntheticSource or CaptureSource, optional
+        Scans of the simulated lidar (a synthetic room by default), played
+        in real time
+    joystick_events : list, optional
+        Script of the joystick (see ScriptedJoystick), by default
+        `self_driving_script(seconds)`
+    seconds : float
+        Length of the default joystick script
+    """
+
+    def __init__(self, source=None, joystick_events=None, seconds=10.):
+        from lidar_sim import FakeSerial, SyntheticSource
+        self.source = source if source is not None else SyntheticSource()
+        self.joystick_events = joystick_events if joystick_events is not None \
+            else self_driving_script(seconds)
+        self.lidar_port = 'sim'
+        self.motor_pins = MOTOR_PINS
+        self.serial_factory = partial(FakeSerial, source=self.source, realtime=True)
+        self.gpio = FakeGPIO()
+
+    def motor(self):
+        return Motor(*self.motor_pins, gpio=self.gpio)
+
+    def joystick(self):
+        return ScriptedJoystick(self.joystick_events)
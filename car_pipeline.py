@@ -0,0 +1,286 @@
+"""Multi-stage threaded runtime for the driving loop.
+
+Acquisition, inference, joystick input and actuation each run in their own
+thread and hand data to each other through latest-value mailboxes, so a slow
+stage never holds up the others and every stage works on the newest data.
+The actuator ticks at a fixed rate.
+
+Usage example:
+
+>>> pipeline = DrivePipeline(motor, get_joystick, lidar_factory, predict)
+>>> pipeline.run()  # returns once button 'x' is pressed
+"""
+import logging
+import math
+import threading
+import time
+
+from telemetry import Telemetry
+
+logger = logging.getLogger('car_pipeline')
+
+
+class Mailbox(object):
+    """Latest-value slot shared between stages. Writers overwrite the value,
+    readers always get the newest one together with its version number."""
+
+    def __init__(self, value=None):
+        self._cond = threading.Condition()
+        self._value = value
+        self._version = 0
+
+    def put(self, value):
+        with self._cond:
+            self._value = value
+            self._version += 1
+            self._cond.notify_all()
+
+    def get(self):
+        """Returns (version, value), version is 0 before the first put"""
+        with self._cond:
+            return self._version, self._value
+
+    def wait_newer(self, version, timeout=None):
+        """Waits for a value newer than `version`. Returns (version, value)
+        or None if nothing new arrived within `timeout` seconds."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._version > version, timeout):
+                return None
+            return self._version, self._value
+
+
+class Stage(threading.Thread):
+    """Calls `step` in a loop until the pipeline stops.
+
+    With `rate_hz` the calls are scheduled at a fixed rate: deadlines advance
+    by one period per tick and missed ticks are skipped (and counted) rather
+    than run back to back. Without it the step paces itself, typically by
+    blocking on a mailbox or on the device it reads.
+    """
+
+    def __init__(self, name, step, stop_event, rate_hz=None, on_stop=None):
+        super().__init__(name=name, daemon=True)
+        self.step = step
+        self.period = 1. / rate_hz if rate_hz else None
+        self.on_stop = on_stop
+        self._stop_event = stop_event
+        self.ticks = 0
+        self.overruns = 0
+        self.error = None
+
+    def run(self):
+        next_tick = time.monotonic()
+        try:
+            while not self._stop_event.is_set():
+                self.step()
+                self.ticks += 1
+                if self.period is None:
+                    continue
+                next_tick += self.period
+                delay = next_tick - time.monotonic()
+                if delay > 0:
+                    self._stop_event.wait(delay)
+                else:
+                    self.overruns += 1
+                    next_tick += math.ceil(-delay / self.period) * self.period
+        except Exception as e:
+            logger.exception('Stage %s failed, stopping the pipeline', self.name)
+            self.error = e
+            self._stop_event.set()
+        finally:
+            if self.on_stop is not None:
+                self.on_stop()
+
+
+class Pipeline(object):
+    """A set of stages sharing one stop event"""
+
+    def __init__(self):
+        self.stop_event = threading.Event()
+        self.stages = []
+
+    def add_stage(self, name, step, rate_hz=None, on_stop=None):
+        stage = Stage(name, step, self.stop_event, rate_hz, on_stop)
+        self.stages.append(stage)
+        return stage
+
+    @property
+    def running(self):
+        return not self.stop_event.is_set()
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def join(self, timeout=None):
+        for stage in self.stages:
+            stage.join(timeout)
+
+    def run(self):
+        """Starts all stages and blocks until the pipeline is stopped"""
+        self.start()
+        try:
+            self.stop_event.wait()
+        except KeyboardInterrupt:
+            self.stop()
+        self.join()
+
+
+class DrivePipeline(Pipeline):
+    """The pi_car driving loop split into four stages.
+
+    joystick (fixed rate)
+        Polls the joystick, applies the button mappings (b: record,
+        a: stop recording, L2: self-driving, R2: manual, x: quit) and
+        publishes the manual command.
+    acquisition (self paced)
+        Owns the LidarControl: starts and stops it when the mode asks for
+        it, reads one scan per rotation and records it in recording mode.
+    inference (self paced)
+        Predicts the turn for every new scan while in self-driving mode.
+    actuator (fixed rate)
+        Drives the motor from the newest manual command or prediction.
+
+    Parameters
+    ----------
+    motor : motormodule.Motor
+    get_joystick : callable
+        Returns the joystick state dictionary (see joystickmodule)
+    lidar_factory : callable
+        Returns a started LidarControl, called with the shared metrics dict
+    predict : callable
+        Maps a 360 element scan to a turn value
+    actuator_rate, joystick_rate : float
+        Tick rates of the fixed-rate stages in Hz
+    auto_speed : float
+        Speed used in self-driving mode
+    max_prediction_age : float
+        Predictions made on scans older than this many seconds are not
+        acted on; the car stops instead
+    telemetry : telemetry.Telemetry, optional
+        Receives the inference and actuation latencies and the end-to-end
+        scan-to-actuation latency, and marks the last scan, prediction and
+        actuation. A new one is created if not given.
+    """
+
+    def __init__(self, motor, get_joystick, lidar_factory, predict,
+                 actuator_rate=50, joystick_rate=100, auto_speed=-0.9,
+                 max_prediction_age=0.5, telemetry=None):
+        super().__init__()
+        self.motor = motor
+        self.get_joystick = get_joystick
+        self.lidar_factory = lidar_factory
+        self.predict = predict
+        self.auto_speed = auto_speed
+        self.max_prediction_age = max_prediction_age
+        self.metrics = {'turn': 0.0, 'speed': 0.0}
+        self.lidar_control = None
+        self._scan_version = 0
+        self._actuated_version = 0
+        self.telemetry = telemetry if telemetry is not None else Telemetry()
+
+        self.mode = Mailbox({'recording': False, 'auto': False})
+        self.command = Mailbox((0.0, 0.0))  # manual (speed, turn)
+        self.scans = Mailbox()  # (timestamp, distances)
+        self.prediction = Mailbox()  # (scan timestamp, turn)
+
+        self.add_stage('joystick', self._joystick_step, joystick_rate)
+        self.add_stage('acquisition', self._acquisition_step, on_stop=self._close_lidar)
+        self.add_stage('inference', self._inference_step)
+        self.add_stage('actuator', self._actuator_step, actuator_rate, on_stop=self.motor.stop)
+        for stage in self.stages:
+            self.telemetry.gauge('stage_overruns_total{stage="%s"}' % stage.name,
+                                 lambda stage=stage: stage.overruns)
+
+    def _joystick_step(self):
+        joystick = self.get_joystick()
+        _, mode = self.mode.get()
+        if joystick['b'] == 1:
+            self.mode.put(dict(mode, recording=True))
+            print('Button b pressed')
+        elif joystick['a'] == 1:
+            self.mode.put(dict(mode, recording=False))
+            print('Button a pressed')
+        elif joystick['L2'] == 1:
+            print('L2 pressed! RobotCar in self-driving mode!')
+            self.mode.put(dict(mode, auto=True))
+        elif joystick['R2'] == 1:
+            print('R2 pressed! RobotCar in manual mode!')
+            self.mode.put(dict(mode, auto=False))
+        elif joystick['x'] == 1:
+            self.mode.put({'recording': False, 'auto': False})
+            self.stop()
+            return
+
+        speed = 0 - joystick['hat1']  # Reverse the sign, depend on the joystick specs
+        turn = joystick['hat0']
+        if joystick['axis1'] != 0:
+            speed = joystick['axis1']
+        if joystick['axis0'] != 0:
+            turn = joystick['axis0']
+
+        self.metrics['speed'] = speed
+        self.metrics['turn'] = turn
+        self.command.put((speed, turn))
+
+    def _acquisition_step(self):
+        _, mode = self.mode.get()
+        if not (mode['recording'] or mode['auto']):
+            self._close_lidar()
+            # nothing to read, wait for the mode to change
+            self.mode.wait_newer(self.mode.get()[0], timeout=0.1)
+            return
+        if self.lidar_control is None:
+            self.lidar_control = self.lidar_factory(self.metrics)
+        if mode['recording']:
+            distances = self.lidar_control.record_line()
+        else:
+            distances = self.lidar_control.read_line()
+        # time the last measure of the rotation was read, when the driver knows it
+        info = getattr(self.lidar_control, 'scan_info', None)
+        timestamp = self.telemetry.mark('scan', info.end_time if info is not None else None)
+        self.scans.put((timestamp, distances))
+
+    def _close_lidar(self):
+        if self.lidar_control is not None:
+            self.lidar_control.stop_record()
+            self.lidar_control = None
+
+    def _inference_step(self):
+        new = self.scans.wait_newer(self._scan_version, timeout=0.1)
+        if new is None:
+            return
+        self._scan_version, (timestamp, distances) = new
+        if self.mode.get()[1]['auto']:
+            self.telemetry.record('scan_age_at_inference', time.monotonic() - timestamp)
+            with self.telemetry.timer('inference'):
+                turn = self.predict(distances)
+            self.telemetry.mark('prediction')
+            self.prediction.put((timestamp, turn))
+
+    def _actuator_step(self):
+        _, mode = self.mode.get()
+        _, (speed, turn) = self.command.get()
+        scan_timestamp = None
+        if mode['auto']:
+            version, prediction = self.prediction.get()
+            if prediction is None or time.monotonic() - prediction[0] > self.max_prediction_age:
+                speed = turn = 0  # no fresh prediction, stop
+            else:
+                speed, turn = self.auto_speed, prediction[1]
+                if version != self._actuated_version:
+                    self._actuated_version = version
+                    scan_timestamp = prediction[0]
+
+        with self.telemetry.timer('actuation'):
+            if abs(speed) < 0.1 and abs(turn) < 0.1:
+                self.motor.stop()
+            else:
+                self.motor.move(speed, turn, 0)
+        self.telemetry.mark('actuation')
+        if scan_timestamp is not None:
+            # first time this prediction reaches the motor
+            self.telemetry.record('scan_to_actuation', time.monotonic() - scan_timestamp)
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""Recording of whole drive sessions and their deterministic replay.
+
+A SessionRecorder wraps the devices given to DrivePipeline and keeps
+everything that crossed them: the scans read from the lidar, every change
+of the joystick state and the motor commands, each with its monotonic
+timestamp. `save` writes them to one .npz file.
+
+SessionReplayer drives the stages of a DrivePipeline from a recorded session
+in a single thread, as fast as they run: the joystick states and scans are
+fed back in their recorded order and the resulting motor commands are
+collected. Replaying the same session with a new model or new code shows
+the end-to-end latency of the loop without the sensor pacing it and, with
+`compare`, every scan on which the car would now act differently.
+
+Usage example:
+
+$ ./car_session.py session.npz  # replays with the current model
+"""
+import argparse
+import json
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from car_hal import JOYSTICK_IDLE
+from car_pipeline import DrivePipeline
+from telemetry import Telemetry
+
+
+class Session(namedtuple('Session', 'scan_times scans joystick_times joystick_states '
+                                    'motor_times motor_commands')):
+    """A recorded drive.
+
+    scan_times, scans : (n,) float64 and (n, 360) float32 arrays
+    joystick_times, joystick_states : array and list of state dictionaries,
+        one entry per change
+    motor_times, motor_commands : (m,) float64 and (m, 2) float32 arrays of
+        (speed, turn), (0, 0) for stop
+    """
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['scan_times'], data['scans'], data['joystick_times'],
+                       [json.loads(state) for state in data['joystick_states']],
+                       data['motor_times'], data['motor_commands'])
+
+    def save(self, path):
+        np.savez_compressed(path, scan_times=self.scan_times, scans=self.scans,
+                            joystick_times=self.joystick_times,
+                            joystick_states=np.array([json.dumps(state)
+                                                      for state in self.joystick_states]),
+                            motor_times=self.motor_times,
+                            motor_commands=self.motor_commands)
+
+    def commands_after_scans(self):
+        """The first motor command issued after every scan, (n, 2) array
+        (NaN where none followed)"""
+        index = np.searchsorted(self.motor_times, self.scan_times, side='right')
+        commands = np.full((len(self.scan_times), 2), np.nan, dtype=np.float32)
+        found = index < len(self.motor_times)
+        commands[found] = self.motor_commands[index[found]]
+        return commands
+
+
+class _RecordingMotor:
+    def __init__(self, motor, recorder):
+        self._motor = motor
+        self._recorder = recorder
+
+    def move(self, speed=0.5, turn=0.0, t=0):
+        self._recorder._motor.append((time.monotonic(), speed, turn))
+        self._motor.move(speed, turn, t)
+
+    def stop(self, t=0):
+        self._recorder._motor.append((time.monotonic(), 0., 0.))
+        self._motor.stop(t)
+
+    def __getattr__(self, name):
+        return getattr(self._motor, name)
+
+
+class _RecordingLidarControl:
+    def __init__(self, lidar_control, recorder):
+        self._lidar_control = lidar_control
+        self._recorder = recorder
+
+    def _keep(self, distances):
+        self._recorder._scans.append((time.monotonic(), np.array(distances, dtype=np.float32)))
+        return distances
+
+    def read_line(self):
+        return self._keep(self._lidar_control.read_line())
+
+    def record_line(self):
+        return self._keep(self._lidar_control.record_line())
+
+    def __getattr__(self, name):
+        return getattr(self._lidar_control, name)
+
+
+class SessionRecorder:
+    """Wraps the devices of a drive and records what crosses them"""
+
+    def __init__(self, n_bins=360):
+        self.n_bins = n_bins
+        self._scans = []
+        self._joystick = []
+        self._motor = []
+
+    def motor(self, motor):
+        return _RecordingMotor(motor, self)
+
+    def joystick(self, get_joystick):
+        def recording_joystick(name=''):
+            state = get_joystick()
+            if not self._joystick or self._joystick[-1][1] != state:
+                self._joystick.append((time.monotonic(), dict(state)))
+            return state if name == '' else state[name]
+        return recording_joystick
+
+    def lidar_factory(self, lidar_factory):
+        return lambda metrics: _RecordingLidarControl(lidar_factory(metrics), self)
+
+    def session(self):
+        scans, joystick, motor = list(self._scans), list(self._joystick), list(self._motor)
+        return Session(
+            np.array([t for t, _ in scans], dtype=np.float64),
+            np.array([scan for _, scan in scans], dtype=np.float32).reshape(-1, self.n_bins),
+            np.array([t for t, _ in joystick], dtype=np.float64),
+            [state for _, state in joystick],
+            np.array([t for t, _, _ in motor], dtype=np.float64),
+            np.array([(speed, turn) for _, speed, turn in motor],
+                     dtype=np.float32).reshape(-1, 2))
+
+    def save(self, path):
+        self.session().save(path)
+
+
+class _ReplayLidarControl:
+    """Hands out the recorded scans in order"""
+
+    scan_info = None
+
+    def __init__(self, scans):
+        self.scans = scans
+        self.position = 0
+
+    def read_line(self):
+        scan = self.scans[self.position]
+        self.position += 1
+        return scan
+
+    record_line = read_line
+
+    def stop_record(self):
+        pass
+
+
+class _CommandLog:
+    def __init__(self):
+        self.commands = []
+
+    def move(self, speed=0.5, turn=0.0, t=0):
+        self.commands.append((speed, turn))
+
+    def stop(self, t=0):
+        self.commands.append((0., 0.))
+
+
+ReplayResult = namedtuple('ReplayResult', 'commands latencies seconds')
+
+
+class SessionReplayer:
+    """Runs the stages of a DrivePipeline on a recorded session.
+
+    Every joystick change is applied at its recorded position among the
+    scans; each scan then goes through acquisition, inference and the
+    actuator in turn, so the result only depends on the session, the model
+    and the code.
+
+    Parameters
+    ----------
+    session : Session
+    predict : callable
+        Maps a scan to a turn value, as for DrivePipeline
+    pipeline_options : dict
+        Further arguments of DrivePipeline (e.g. auto_speed)
+    """
+
+    def __init__(self, session, predict, **pipeline_options):
+        self.session = session
+        self.predict = predict
+        self.pipeline_options = pipeline_options
+
+    def run(self):
+        """Replays the session as fast as possible.
+
+        Returns
+        -------
+        ReplayResult
+            commands: (n, 2) array of the (speed, turn) the actuator issued
+            after every scan; latencies: (n,) seconds from handing out the
+            scan to that command; seconds: total replay time
+        """
+        session = self.session
+        state = dict(JOYSTICK_IDLE)
+        motor = _CommandLog()
+        lidar = _ReplayLidarControl(session.scans)
+        pipeline = DrivePipeline(motor, lambda name='': state if name == '' else state[name],
+                                 lambda metrics: lidar, self.predict, telemetry=Telemetry(),
+                                 **self.pipeline_options)
+        # joystick changes to apply before every scan
+        positions = np.searchsorted(session.scan_times, session.joystick_times, side='right')
+        joystick = 0
+        commands = np.zeros((len(session.scans), 2), dtype=np.float32)
+        latencies = np.zeros(len(session.scans))
+        start = time.monotonic()
+        for i in range(len(session.scans)):
+            while joystick < len(positions) and positions[joystick] <= i:
+                state.clear()
+                state.update(session.joystick_states[joystick])
+                pipeline._joystick_step()
+                joystick += 1
+            if not pipeline.running:
+                commands, latencies = commands[:i], latencies[:i]
+                break
+            _, mode = pipeline.mode.get()
+            scan_start = time.monotonic()
+            if mode['recording'] or mode['auto']:
+                pipeline._acquisition_step()
+                pipeline._inference_step()
+            else:
+                lidar.position += 1  # scan read while the mode was changing
+            pipeline._actuator_step()
+            latencies[i] = time.monotonic() - scan_start
+            commands[i] = motor.commands[-1]
+        return ReplayResult(commands, latencies, time.monotonic() - start)
+
+
+def compare(commands, reference, tolerance=0.05):
+    """Indices of the scans on which the (speed, turn) commands differ from
+    the reference by more than `tolerance`"""
+    commands, reference = np.asarray(commands), np.asarray(reference)
+    n = min(len(commands), len(reference))
+    with np.errstate(invalid='ignore'):
+        differs = np.abs(commands[:n] - reference[:n]) > tolerance
+    return np.flatnonzero(differs.any(axis=1))
+
+
+if __name__ == '__main__':
+    from mldriver import get_predictor, load_predictor
+
+    parser = argparse.ArgumentParser(description='Replay a recorded drive session')
+    parser.add_argument('session')
+    parser.add_argument('--model', help='model to replay with (default: the car model)')
+    parser.add_argument('--tolerance', type=float, default=0.05)
+    args = parser.parse_args()
+
+    session = Session.load(args.session)
+    predictor = load_predictor(args.model) if args.model else get_predictor()
+    result = SessionReplayer(session, predictor.predict).run()
+    print('%d scans replayed in %.3f s, latency p50 %.2f ms p99 %.2f ms' % (
+        len(result.commands), result.seconds,
+        np.percentile(result.latencies, 50) * 1e3, np.percentile(result.latencies, 99) * 1e3))
+    changed = compare(result.commands, session.commands_after_scans(), args.tolerance)
+    print('%d scans with a different motor command than recorded' % len(changed))
@@ -0,0 +1,141 @@
+"""Array-based inference engine for the steering RandomForestRegressor.
+
+The trees of a trained forest are flattened into contiguous NumPy node arrays
+(feature, threshold, children, value) and evaluated for one sample or a batch
+with a vectorized traversal that advances every tree one level per step. This
+avoids sklearn's per-call input validation and per-tree dispatch, which
+dominate the prediction time at batch size 1.
+
+Usage example:
+
+>>> from compiled_forest import CompiledForest
+>>> forest = CompiledForest.from_sklearn(model)
+>>> forest.predict(features)  # same result as model.predict(features)
+>>> forest.save('model.npz')  # loading it back does not need sklearn
+"""
+import pickle
+
+import numpy as np
+
+
+class CompiledForest(object):
+    """Flattened regression forest.
+
+    Leaves point to themselves with an infinite threshold, so once a
+    traversal reaches a leaf it stays there and no per-sample masking is
+    needed: every sample simply takes `max_depth` steps.
+    """
+
+    def __init__(self, feature, threshold, children, value, roots, max_depth, n_features):
+        self.feature = feature  # (n_nodes,) intp, 0 for leaves
+        self.threshold = threshold  # (n_nodes,) float64, +inf for leaves
+        self.children = children  # (n_nodes, 2) intp: [right, left]
+        self.value = value  # (n_nodes,) or (n_nodes, n_outputs) float64
+        self.roots = roots  # (n_trees,) intp
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Flattens a fitted RandomForestRegressor, ExtraTreesRegressor or
+        DecisionTreeRegressor"""
+        if hasattr(model, 'estimators_'):
+            estimators = model.estimators_
+        elif hasattr(model, 'tree_'):
+            estimators = [model]
+        else:
+            raise TypeError('Unsupported model type: %s' % type(model).__name__)
+        if hasattr(model, 'classes_'):
+            raise TypeError('Only regression forests are supported')
+
+        features, thresholds, children, values, roots = [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in estimators:
+            tree = estimator.tree_
+            n = tree.node_count
+            leaf = tree.children_left == -1
+            own = np.arange(n)
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(np.where(leaf, np.inf, tree.threshold))
+            children.append(np.stack([np.where(leaf, own, tree.children_right),
+                                      np.where(leaf, own, tree.children_left)], axis=1) + offset)
+            values.append(tree.value[:, :, 0])
+            roots.append(offset)
+            offset += n
+            max_depth = max(max_depth, tree.max_depth)
+
+        value = np.concatenate(values).astype(np.float64)
+        if value.shape[1] == 1:
+            value = value[:, 0]
+        return cls(np.concatenate(features).astype(np.intp),
+                   np.concatenate(thresholds).astype(np.float64),
+                   np.concatenate(children).astype(np.intp),
+                   value,
+                   np.array(roots, dtype=np.intp),
+                   max_depth,
+                   model.n_features_in_)
+
+    def predict(self, X):
+        """Predicts like the sklearn model: X is (n_samples, n_features) or a
+        single sample of n_features values, the result is always 1-D for
+        single output forests"""
+        # sklearn evaluates the trees on float32 input
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+        if X.shape[1] != self.n_features:
+            raise ValueError('X has %d features, but the forest expects %d'
+                             % (X.shape[1], self.n_features))
+        nodes = np.repeat(self.roots[None, :], len(X), axis=0)
+        rows = np.arange(len(X))[:, None]
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = self.children[nodes, go_left.view(np.int8)]
+        return self.value[nodes].mean(axis=1)
+
+    def save(self, path):
+        """Stores the node arrays in a .npz file"""
+        np.savez(path, feature=self.feature, threshold=self.threshold,
+                 children=self.children, value=self.value, roots=self.roots,
+                 max_depth=self.max_depth, n_features=self.n_features)
+
+    @classmethod
+    def load(cls, path):
+        """Loads node arrays stored with `save`"""
+        with np.load(path) as data:
+            return cls(data['feature'], data['threshold'], data['children'],
+                       data['value'], data['roots'], data['max_depth'], data['n_features'])
+
+
+def compile_model(model):
+    """Returns a CompiledForest for supported models, None otherwise"""
+    try:
+        return CompiledForest.from_sklearn(model)
+    except (TypeError, AttributeError):
+        return None
+
+
+def load_compiled_forest(path):
+    """Loads a model saved by mldriver or RegressionModelTrainer (.pkl) or a
+    compiled forest (.npz).
+
+    Returns
+    -------
+    forest : CompiledForest
+    feature_indices : numpy.ndarray or None
+        Feature indices stored with the model by RegressionModelTrainer
+    """
+    if str(path).endswith('.npz'):
+        return CompiledForest.load(path), None
+    with open(path, 'rb') as file:
+        model = pickle.load(file)
+    feature_indices = None
+    if isinstance(model, dict):
+        feature_indices = model.get('feature_indices')
+        model = model['model']
+    return CompiledForest.from_sklearn(model), feature_indices
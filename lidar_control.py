@@ -1,10 +1,17 @@
 #!/usr/bin/env python3
-"""Records measurements to a given file in csv format. Usage example:
+"""Records measurements to a given file in csv or binary format (see
+scan_recording). Usage example:
 
 $ ./lidar_control.py out.txt"""
+import threading
 import time
+from collections import namedtuple
 
-from rplidar import RPLidar
+import numpy as np
+
+from rplidar import (RPLidar, RPLidarException, RPLidarTimeoutException, Scan, _bin_scan,
+                     scan_to_csv)
+from scan_recording import ScanRecorder
 
 PORT_NAME = '/dev/ttyUSB0'
 # constant based on lidar resolution
@@ -15,9 +22,83 @@ def nvl(value, default):
     return value if value is not None else default
 
 
+LatestScan = namedtuple('LatestScan', 'seq timestamp distance quality valid count info')
+
+
+class ScanRing:
+    """Preallocated ring of scan buffers written by the acquisition thread
+    and read by the control loop. Only the freshest completed scan is ever
+    handed out; scans that get replaced before anyone read them are counted
+    as overwritten."""
+
+    def __init__(self, size=4, resolution=LIDAR_RESOLUTION):
+        assert size >= 2
+        self._slots = [Scan.empty(resolution, with_quality=True, with_count=True)
+                       for _ in range(size)]
+        self._timestamps = np.zeros(size)
+        self._infos = [None] * size
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._seq = 0  # sequence number of the latest completed scan
+        self._read_seq = 0  # latest sequence number handed out
+        self.overwritten = 0
+        self.dropped = 0
+        self.error = None  # exception the writer stopped on
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def write_slot(self):
+        """Scan buffers the writer fills next. They never hold the latest
+        scan, so readers are not disturbed while the writer fills them."""
+        return self._slots[(self._seq + 1) % len(self._slots)]
+
+    def publish(self, timestamp, info=None):
+        """Marks the slot returned by `write_slot` as the latest scan"""
+        with self._lock:
+            if self._read_seq < self._seq:
+                self.overwritten += 1
+            self._seq += 1
+            self._timestamps[self._seq % len(self._slots)] = timestamp
+            self._infos[self._seq % len(self._slots)] = info
+            self._ready.notify_all()
+
+    def fail(self, error):
+        """Marks the writer as stopped by `error`, waking up the readers"""
+        with self._lock:
+            self.error = error
+            self._ready.notify_all()
+
+    def latest(self, timeout=None):
+        """Returns a copy of the freshest scan. Only blocks until the very
+        first scan is available; returns None if it did not arrive in time.
+        Raises the error of the writer once it failed, as no newer scan
+        will come."""
+        with self._lock:
+            if not self._ready.wait_for(lambda: self._seq > 0 or self.error is not None,
+                                        timeout):
+                return None
+            if self.error is not None:
+                raise self.error
+            slot = self._seq % len(self._slots)
+            scan = self._slots[slot]
+            self._read_seq = self._seq
+            return LatestScan(self._seq, self._timestamps[slot], scan.distance.copy(),
+                              scan.quality.copy(), scan.valid.copy(), scan.count.copy(),
+                              self._infos[slot])
+
+
 class LidarControl:
-    def __init__(self, port=PORT_NAME, path='out.txt', stop_flag=False, metrics=None):
+    def __init__(self, port=PORT_NAME, path='out.txt', stop_flag=False, metrics=None,
+                 threaded=False, ring_size=4, telemetry=None, record_format='csv',
+                 record_quality=False, scan_type='normal', n_bins=LIDAR_RESOLUTION,
+                 reduce='last', record_timing=False, min_quality=None, serial_factory=None,
+                 scan_timeout=2.0, max_timeouts=3):
+        if record_format not in ('csv', 'binary'):
+            raise ValueError("record_format must be 'csv' or 'binary'")
         self.outfile = None
+        self.recorder = None
         self.lidar = None
         self.port = port
         self.path = path
@@ -25,38 +106,180 @@ class LidarControl:
         self.metrics = metrics
         if self.metrics is None:
             self.metrics = {'turn': 0.0, 'speed': 0.0}
-        self.lidar = RPLidar(self.port)
+        # In threaded mode a background thread keeps reading scans into
+        # the ring and read_line/record_line never wait for a rotation
+        self.threaded = threaded
+        self.ring = ScanRing(ring_size, n_bins) if threaded else None
+        # seconds read_line and record_line wait for the first scan of the
+        # thread (the motor has to spin up) before raising
+        self.scan_timeout = scan_timeout
+        # consecutive read timeouts after which the sensor is taken as
+        # stalled and the acquisition thread stops with the timeout
+        self.max_timeouts = max_timeouts
+        self._thread = None
+        self._last_scan = None
+        self._recorded_seq = 0
+        # rplidar.ScanInfo of the last scan returned by read_line/record_line
+        self.scan_info = None
+        # 'binary' appends fixed-size records through a background writer
+        # (scan_recording.ScanRecorder) instead of writing csv lines
+        self.record_format = record_format
+        self.record_quality = record_quality
+        # 'express' doubles the sample rate on sensors that support it
+        self.scan_type = scan_type
+        # angular binning of every rotation, see rplidar._bin_scan
+        self.n_bins = n_bins
+        self.reduce = reduce
+        # also write the timing of every rotation (binary recordings only)
+        self.record_timing = record_timing
+        # measures of lower quality are dropped before binning (not in express mode)
+        self.min_quality = min_quality
+        self.telemetry = telemetry
+        # e.g. lidar_sim.FakeSerial to run without a sensor, see RPLidar
+        self.lidar = RPLidar(self.port, serial_factory=serial_factory)
+        self.lidar.telemetry = telemetry
         self.lidar.get_info()
 
     def start(self):
-        self.outfile = open(self.path, 'w')
+        if self.record_format == 'binary':
+            self.recorder = ScanRecorder(self.path, self.n_bins, with_quality=self.record_quality,
+                                         with_timing=self.record_timing)
+        else:
+            self.outfile = open(self.path, 'w')
         self.lidar.connect()
         self.lidar.start_motor()
-        self.lidar.start()
+        self.lidar.start(self.scan_type)
+        if self.threaded:
+            self.stop_flag = False
+            self._thread = threading.Thread(target=self._acquire, name='lidar-acquisition',
+                                            daemon=True)
+            self._thread.start()
+
+    def _acquire(self):
+        """Acquisition thread: assembles complete scans into the ring.
+        Other errors than a dropped scan, and `max_timeouts` timeouts in a
+        row, stop the thread and are raised to the readers of the ring."""
+        timeouts = 0
+        try:
+            while not self.stop_flag:
+                try:
+                    quality, angle, distance = self.lidar._read_scan(self.scan_type,
+                                                                     min_quality=self.min_quality)
+                except RPLidarException as e:
+                    self.ring.dropped += 1
+                    if isinstance(e, RPLidarTimeoutException):
+                        timeouts += 1
+                        if timeouts >= self.max_timeouts:
+                            raise
+                    self.lidar.logger.warning('Scan dropped: %s', e)
+                    continue
+                timeouts = 0
+                timestamp = time.monotonic()
+                _bin_scan(angle, distance, quality, out=self.ring.write_slot(), reduce=self.reduce)
+                self.ring.publish(timestamp, self.lidar.last_scan_info)
+                if self.telemetry is not None:
+                    self.telemetry.record('scan_binning', time.monotonic() - timestamp)
+        except Exception as e:
+            self.lidar.logger.exception('Lidar acquisition failed')
+            self.ring.fail(e)
+
+    def latest_scan(self, timeout=None):
+        """Returns the freshest completed scan as a LatestScan tuple, or None
+        if there was none within `timeout` seconds (default: scan_timeout).
+        Raises the error the acquisition thread stopped on."""
+        self._last_scan = self.ring.latest(nvl(timeout, self.scan_timeout))
+        return self._last_scan
+
+    def _wait_scan(self):
+        scan = self.latest_scan()
+        if scan is None:
+            raise RPLidarException('No scan within %g seconds' % self.scan_timeout)
+        return scan
+
+    @property
+    def scan_seq(self):
+        """Sequence number of the last scan returned (0 before any)"""
+        return self._last_scan.seq if self._last_scan is not None else 0
+
+    @property
+    def scan_age(self):
+        """Seconds since the last returned scan was completed"""
+        if self._last_scan is None:
+            return None
+        return time.monotonic() - self._last_scan.timestamp
+
+    @property
+    def stats(self):
+        """Driver health statistics, see rplidar.DriverStats"""
+        return self.lidar.stats
+
+    @property
+    def scans_overwritten(self):
+        return self.ring.overwritten if self.ring is not None else 0
+
+    @property
+    def scans_dropped(self):
+        return self.ring.dropped if self.ring is not None else 0
 
     def record_line(self):
         """
         return a frame scan of 360 data points
+
+        The scan is returned as a float32 array; it is only formatted as a
+        csv line for the output file.
         """
-        print('Recording\n')
-        line = self.lidar.read_single_measure()
+        if self.threaded:
+            scan = self._wait_scan()
+            # the control loop may run faster than the sensor, only write new scans
+            if scan.seq == self._recorded_seq:
+                return scan.distance
+            self._recorded_seq = scan.seq
+            distance, quality, timestamp = scan.distance, scan.quality, scan.timestamp
+        else:
+            scan = self.lidar.read_scan(self.scan_type, with_quality=self.record_quality,
+                                        n_bins=self.n_bins, reduce=self.reduce,
+                                        min_quality=self.min_quality)
+            distance, quality, timestamp = scan.distance, scan.quality, time.monotonic()
+        self.scan_info = scan.info
+
+        if self.recorder is not None:
+            self.recorder.write(timestamp, distance, self.metrics['turn'],
+                                self.metrics['speed'], quality, scan.info)
+            return distance
+
+        line = scan_to_csv(distance)
         line += ",{:.2f}".format(self.metrics['turn']) + '\n'
         self.outfile.write(line)
 
-        return line
+        return distance
 
     def read_line(self):
-        return self.lidar.read_single_measure()
+        """
+        return a frame scan of 360 distances (float32, 0 where invalid)
+        """
+        if self.threaded:
+            scan = self._wait_scan()
+        else:
+            scan = self.lidar.read_scan(self.scan_type, n_bins=self.n_bins, reduce=self.reduce,
+                                        min_quality=self.min_quality)
+        self.scan_info = scan.info
+        return scan.distance
 
     def stop_record(self):
         """
-        stop recording and write to csv file
+        stop recording and close the output file
         """
         self.stop()
-        self.outfile.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.outfile is not None:
+            self.outfile.close()
 
     def stop(self):
         self.stop_flag = True
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
         self.lidar.stop()
         self.lidar.disconnect()
 
@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+"""Simulated RPLidar serial port, serial captures and their replay.
+
+`FakeSerial` stands in for serial.Serial. It answers the info, health and
+scan commands the way the sensor does, so RPLidar runs unchanged against a
+synthetic room (`SyntheticSource`) or a capture of a real sensor
+(`CaptureSource`), either in real time or as fast as the reader consumes
+the bytes. `PtySensor` serves the same emulation on a pseudo terminal for
+drivers that need a real file descriptor.
+
+Usage example:
+
+>>> from functools import partial
+>>> from rplidar import RPLidar
+>>> from lidar_sim import FakeSerial, SyntheticSource
+>>>
+>>> lidar = RPLidar('sim', serial_factory=partial(FakeSerial, source=SyntheticSource()))
+>>> scan = lidar.read_scan()
+
+Captures the serial traffic of a real sensor for 10 seconds:
+
+$ ./lidar_sim.py /dev/ttyUSB0 capture.rpcap --seconds 10
+"""
+import argparse
+import math
+import os
+import select
+import struct
+import threading
+import time
+import tty
+
+import numpy as np
+
+import rplidar
+from rplidar import (DESCRIPTOR_LEN, GET_HEALTH_BYTE, GET_INFO_BYTE, HEALTH_LEN,
+                     HEALTH_TYPE, INFO_LEN, INFO_TYPE, RESET_BYTE, SET_PWM_BYTE,
+                     STOP_BYTE, SYNC_BYTE, SYNC_BYTE2, _SCAN_TYPE)
+
+_NORMAL_DTYPE = np.dtype([('flags', 'u1'), ('angle', '<u2'), ('distance', '<u2')])
+
+CAPTURE_MAGIC = b'RPCAP001'
+_CAPTURE_RECORD = struct.Struct('<dBI')  # timestamp, direction, length
+RX, TX = 0, 1
+
+
+def encode_normal_packets(new_scan, quality, angle, distance):
+    """Encodes measures as a byte stream of 5-byte normal mode packets.
+    Angles are in degrees, distances in millimetres."""
+    new_scan = np.asarray(new_scan, dtype=bool)
+    packets = np.empty(len(new_scan), dtype=_NORMAL_DTYPE)
+    packets['flags'] = (np.asarray(quality, dtype=np.uint8) << 2) | (~new_scan << 1) | new_scan
+    packets['angle'] = (np.rint(np.asarray(angle) * 64).astype(np.uint16) << 1) | 1
+    packets['distance'] = np.rint(np.asarray(distance) * 4).astype(np.uint16)
+    return packets.tobytes()
+
+
+def encode_express_packet(start_angle, distance, angle_offset=None, new_scan=False):
+    """Encodes one 84-byte express packet of 32 measures.
+
+    Distances are whole millimetres (14 bits); `angle_offset` holds the
+    angle compensation of every measure in degrees (multiples of 1/8,
+    at most 31/8 in magnitude).
+    """
+    distance = np.asarray(distance, dtype=np.int64)
+    if angle_offset is None:
+        angle_offset = np.zeros(32)
+    offset = np.rint(np.abs(angle_offset) * 8).astype(np.int64)
+    sign = (np.asarray(angle_offset) < 0).astype(np.int64)
+    packet = bytearray(84)
+    struct.pack_into('<H', packet, 2, (int(round(start_angle * 64)) & 0x7fff) | (new_scan << 15))
+    for cabin in range(16):
+        i = 4 + cabin * 5
+        d1, d2 = distance[2 * cabin], distance[2 * cabin + 1]
+        o1, o2 = offset[2 * cabin], offset[2 * cabin + 1]
+        packet[i] = ((d1 & 0x3f) << 2) | (sign[2 * cabin] << 1) | ((o1 >> 4) & 1)
+        packet[i + 1] = (d1 >> 6) & 0xff
+        packet[i + 2] = ((d2 & 0x3f) << 2) | (sign[2 * cabin + 1] << 1) | ((o2 >> 4) & 1)
+        packet[i + 3] = (d2 >> 6) & 0xff
+        packet[i + 4] = (o1 & 0xf) | ((o2 & 0xf) << 4)
+    checksum = 0
+    for b in packet[2:]:
+        checksum ^= b
+    packet[0] = 0xa0 | (checksum & 0xf)
+    packet[1] = 0x50 | (checksum >> 4)
+    return bytes(packet)
+
+
+def _descriptor(dsize, is_single, dtype):
+    return SYNC_BYTE + SYNC_BYTE2 + struct.pack('<IB', dsize | ((not is_single) << 30), dtype)
+
+
+class SyntheticSource(object):
+    """Sensor in the middle of a rectangular room.
+
+    Parameters
+    ----------
+    rotation_hz : float
+        Rotations per second
+    sample_rate : float
+        Measures per second
+    room : tuple
+        (x_min, y_min, x_max, y_max) of the walls around the sensor in mm
+    dropout : float
+        Share of measures reported as invalid (distance and quality 0)
+    noise : float
+        Standard deviation of the distance noise in mm
+    rotations : int, optional
+        Stop after this many rotations (endless by default)
+    """
+
+    def __init__(self, rotation_hz=5.5, sample_rate=2000, room=(-2000, -1500, 3000, 1000),
+                 dropout=0.05, noise=5., rotations=None, seed=0):
+        self.rotation_hz = rotation_hz
+        self.sample_rate = sample_rate
+        self.room = room
+        self.dropout = dropout
+        self.noise = noise
+        self.rotations = rotations
+        self.seed = seed
+
+    def distances(self, angle):
+        """Distance to the walls in mm for headings in degrees"""
+        x_min, y_min, x_max, y_max = self.room
+        theta = np.radians(angle)
+        with np.errstate(divide='ignore'):
+            dx, dy = np.cos(theta), np.sin(theta)
+            tx = np.where(dx > 0, x_max, x_min) / dx
+            ty = np.where(dy > 0, y_max, y_min) / dy
+        return np.minimum(np.abs(tx), np.abs(ty))
+
+    def _rotation(self, rng, n):
+        """Returns angles, distances and qualities of one rotation"""
+        step = 360. / n
+        angle = rng.uniform(0, step) + step * np.arange(n)
+        distance = self.distances(angle) + rng.normal(0, self.noise, n)
+        distance = np.clip(distance, 0, 16000)
+        quality = np.full(n, 15, dtype=np.uint8)
+        invalid = rng.random(n) < self.dropout
+        distance[invalid] = 0
+        quality[invalid] = 0
+        return angle, distance, quality
+
+    def stream(self, scan_type='normal', chunk=32):
+        """Yields (seconds since scan start, bytes) in chunks of `chunk` packets"""
+        rng = np.random.default_rng(self.seed)
+        # rotation_hz is read for every rotation, it may change while streaming
+        n = int(round(self.sample_rate / self.rotation_hz))
+        rotation = 0
+        sent = 0
+        if _SCAN_TYPE[scan_type]['size'] == 5:
+            while self.rotations is None or rotation < self.rotations:
+                n = int(round(self.sample_rate / self.rotation_hz))
+                angle, distance, quality = self._rotation(rng, n)
+                new_scan = np.zeros(n, dtype=bool)
+                new_scan[0] = True
+                data = encode_normal_packets(new_scan, quality, angle, distance)
+                for begin in range(0, n, chunk):
+                    end = min(begin + chunk, n)
+                    sent += end - begin
+                    yield sent / self.sample_rate, data[begin * 5:end * 5]
+                rotation += 1
+            return
+
+        # express: 32 measures per packet, the measure angles are
+        # interpolated between the start angles of consecutive packets
+        start_angle = 0.
+        packets = []
+        while self.rotations is None or sent < self.rotations * n:
+            step = 360. * 32 * self.rotation_hz / self.sample_rate
+            angle = (start_angle + step * np.arange(1, 33) / 32) % 360
+            distance = np.rint(self.distances(angle) + rng.normal(0, self.noise, 32))
+            distance[rng.random(32) < self.dropout] = 0
+            packets.append(encode_express_packet(start_angle, np.clip(distance, 0, 16383),
+                                                 new_scan=sent == 0))
+            start_angle = (start_angle + step) % 360
+            sent += 32
+            if len(packets) * 32 >= chunk:
+                yield sent / self.sample_rate, b''.join(packets)
+                packets = []
+
+
+class CaptureWriter(object):
+    """Writes serial traffic with monotonic timestamps to a capture file"""
+
+    def __init__(self, path):
+        self._file = open(path, 'wb')
+        self._file.write(CAPTURE_MAGIC)
+        self._lock = threading.Lock()
+
+    def write(self, direction, data):
+        if not data:
+            return
+        with self._lock:
+            self._file.write(_CAPTURE_RECORD.pack(time.monotonic(), direction, len(data)))
+            self._file.write(data)
+
+    def close(self):
+        self._file.close()
+
+
+def read_capture(path):
+    """Returns the records of a capture file as (timestamp, direction, bytes)"""
+    with open(path, 'rb') as f:
+        if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError('Not a serial capture')
+        data = f.read()
+    records = []
+    pos = 0
+    while pos + _CAPTURE_RECORD.size <= len(data):
+        timestamp, direction, size = _CAPTURE_RECORD.unpack_from(data, pos)
+        pos += _CAPTURE_RECORD.size
+        records.append((timestamp, direction, data[pos:pos + size]))
+        pos += size
+    return records
+
+
+class CapturingSerial(object):
+    """Wraps a serial port and captures everything read from and written to it.
+
+    Use as the `serial_factory` of RPLidar:
+
+    >>> lidar = RPLidar('/dev/ttyUSB0', serial_factory=CapturingSerial.factory('out.rpcap'))
+    """
+
+    def __init__(self, port, *args, capture=None, **kwargs):
+        self._serial = rplidar.serial.Serial(port, *args, **kwargs)
+        self.capture = capture
+
+    @classmethod
+    def factory(cls, path):
+        capture = CaptureWriter(path)
+        return lambda port, *args, **kwargs: cls(port, *args, capture=capture, **kwargs)
+
+    def read(self, size=1):
+        data = self._serial.read(size)
+        self.capture.write(RX, data)
+        return data
+
+    def write(self, data):
+        self.capture.write(TX, data)
+        return self._serial.write(data)
+
+    def close(self):
+        self._serial.close()
+        self.capture.close()
+
+    def __getattr__(self, name):
+        return getattr(self._serial, name)
+
+
+class CaptureSource(object):
+    """Replays the scan data of a capture file.
+
+    The bytes the sensor sent after the last scan command (without its
+    response descriptor) are replayed with their original timing.
+    """
+
+    def __init__(self, path):
+        records = read_capture(path)
+        scan_bytes = {info['byte'] for info in _SCAN_TYPE.values()}
+        start = None
+        for i, (_, direction, data) in enumerate(records):
+            if direction == TX and data[:1] == SYNC_BYTE and data[1:2] in scan_bytes:
+                start = i
+        if start is None:
+            raise ValueError('No scan in capture %s' % path)
+        self.chunks = []
+        skip = DESCRIPTOR_LEN
+        t0 = None
+        for timestamp, direction, data in records[start + 1:]:
+            if direction != RX:
+                break
+            data, skip = data[skip:], max(0, skip - len(data))
+            if data:
+                t0 = timestamp if t0 is None else t0
+                self.chunks.append((timestamp - t0, data))
+
+    def stream(self, scan_type='normal', chunk=None):
+        return iter(self.chunks)
+
+
+class FakeSerial(object):
+    """Stand-in for serial.Serial emulating an RPLidar.
+
+    Accepts the arguments of serial.Serial so that it can be passed (e.g.
+    through functools.partial) as the `serial_factory` of RPLidar.
+
+    Parameters
+    ----------
+    source : SyntheticSource or CaptureSource
+        Provides the scan byte stream
+    realtime : bool
+        Release the scan bytes at the pace they were produced; otherwise they
+        are produced as fast as the reader consumes them
+    timeout : float
+        Read timeout in seconds, like serial.Serial
+    health : tuple
+        (status, error code) answered to the health command
+    hz_per_pwm : float, optional
+        Motor model: when given, PWM commands set the rotation rate of the
+        source to pwm * hz_per_pwm
+    """
+
+    def __init__(self, port=None, baudrate=115200, timeout=1, source=None, realtime=False,
+                 info=(24, (1, 29), 7, b'\x00' * 16), health=(0, 0), hz_per_pwm=None,
+                 **kwargs):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.source = source if source is not None else SyntheticSource()
+        self.realtime = realtime
+        self.info = info
+        self.health = health
+        self.hz_per_pwm = hz_per_pwm
+        self.dtr = False
+        self.pwm = None
+        self.commands = []
+        self.is_open = True
+        self._buffer = bytearray()
+        self._stream = None
+        self._next = None  # chunk of the stream not released yet
+        self._stream_start = 0.
+
+    # sensor side
+
+    def _answer(self, cmd, payload):
+        self.commands.append((cmd, payload))
+        if cmd == GET_INFO_BYTE:
+            model, (major, minor), hardware, serialnumber = self.info
+            self._buffer += _descriptor(INFO_LEN, True, INFO_TYPE)
+            self._buffer += struct.pack('<BBBB', model, minor, major, hardware) + serialnumber
+        elif cmd == GET_HEALTH_BYTE:
+            status, error_code = self.health
+            self._buffer += _descriptor(HEALTH_LEN, True, HEALTH_TYPE)
+            self._buffer += struct.pack('>BH', status, error_code)
+        elif cmd in (STOP_BYTE, RESET_BYTE):
+            self._stream = self._next = None
+        elif cmd == SET_PWM_BYTE:
+            self.pwm, = struct.unpack('<H', payload)
+            if self.hz_per_pwm and self.pwm:
+                self.source.rotation_hz = self.pwm * self.hz_per_pwm
+        else:
+            for scan_type, info in _SCAN_TYPE.items():
+                if cmd == info['byte']:
+                    self._buffer += _descriptor(info['size'], False, info['response'])
+                    self._stream = iter(self.source.stream(scan_type))
+                    self._next = None
+                    self._stream_start = time.monotonic()
+
+    def _pull(self, size):
+        """Moves stream bytes into the buffer until `size` bytes are waiting
+        or, in real time, until the bytes produced so far are released"""
+        while self._stream is not None and len(self._buffer) < size:
+            if self._next is None:
+                self._next = next(self._stream, None)
+                if self._next is None:
+                    self._stream = None
+                    break
+            timestamp, data = self._next
+            if self.realtime and timestamp > time.monotonic() - self._stream_start:
+                break
+            self._buffer += data
+            self._next = None
+
+    # serial.Serial interface
+
+    def write(self, data):
+        data = bytes(data)
+        written = len(data)
+        while len(data) >= 2 and data[:1] == SYNC_BYTE:
+            cmd = data[1:2]
+            if data[1] & 0x80:  # command with payload: size, payload, checksum
+                size = data[2]
+                payload, data = data[3:3 + size], data[4 + size:]
+            else:
+                payload, data = b'', data[2:]
+            self._answer(cmd, payload)
+        return written
+
+    def inWaiting(self):
+        # in real time everything produced so far is waiting, otherwise the
+        # stream is produced one chunk at a time as it is consumed
+        self._pull(math.inf if self.realtime else 1)
+        return len(self._buffer)
+
+    in_waiting = property(inWaiting)
+
+    def read(self, size=1):
+        deadline = time.monotonic() + self.timeout
+        self._pull(size)
+        while self.realtime and len(self._buffer) < size and self._stream is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            wait = remaining
+            if self._next is not None:
+                wait = min(wait, self._next[0] - (time.monotonic() - self._stream_start))
+            time.sleep(max(wait, 0.0005))
+            self._pull(size)
+        if len(self._buffer) < size and self._stream is None and not self.realtime:
+            time.sleep(self.timeout)  # nothing more will come, block like a port
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def setDTR(self, value=True):
+        self.dtr = value
+
+    def flushInput(self):
+        self._buffer.clear()
+
+    reset_input_buffer = flushInput
+
+    def close(self):
+        self.is_open = False
+
+
+class PtySensor(object):
+    """Serves a FakeSerial sensor on a pseudo terminal.
+
+    A thread answers the commands written to `port` and writes the scan bytes
+    in real time. Like a UART, bytes the reader does not consume before the
+    terminal buffer is full are lost.
+
+    Parameters
+    ----------
+    sensor : FakeSerial, optional
+        Emulated sensor (the default is a real time FakeSerial)
+    """
+
+    def __init__(self, sensor=None):
+        self.sensor = sensor if sensor is not None else FakeSerial(realtime=True)
+        self.sensor.timeout = 0
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        os.set_blocking(self._master, False)
+        self.port = os.ttyname(self._slave)
+        self.bytes_lost = 0
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        while self._running:
+            readable, _, _ = select.select([self._master], [], [], 0.002)
+            if readable:
+                try:
+                    self.sensor.write(os.read(self._master, 4096))
+                except OSError:  # nothing opened the terminal yet
+                    pass
+            data = self.sensor.read(self.sensor.inWaiting())
+            if data:
+                try:
+                    self.bytes_lost += len(data) - os.write(self._master, data)
+                except BlockingIOError:
+                    self.bytes_lost += len(data)
+
+    def close(self):
+        self._running = False
+        self._thread.join()
+        os.close(self._master)
+        os.close(self._slave)
+
+
+def capture(port, path, seconds, scan_type='normal'):
+    """Captures the serial traffic of a real sensor scanning for `seconds`"""
+    lidar = rplidar.RPLidar(port, serial_factory=CapturingSerial.factory(path))
+    try:
+        print(lidar.get_info())
+        lidar.start_motor()
+        end = time.monotonic() + seconds
+        scans = 0
+        while time.monotonic() < end:
+            lidar.read_scan(scan_type, max_buf_meas=False)
+            scans += 1
+        print('%d scans captured to %s' % (scans, path))
+    finally:
+        lidar.stop()
+        lidar.stop_motor()
+        lidar.disconnect()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Capture the serial traffic of an RPLidar')
+    parser.add_argument('port')
+    parser.add_argument('path')
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+    capture(args.port, args.path, args.seconds)
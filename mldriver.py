@@ -1,23 +1,87 @@
 import pickle
-import pandas as pd
-from io import StringIO
+import numpy as np
+
+from compiled_forest import CompiledForest, compile_model
 
 selected_feature_indices = [24, 29, 31, 35, 38, 39, 40, 41, 42, 43, 44, 45, 47, 50, 54, 55, 57, 302,
                             304, 312, 314, 315, 316, 318, 319, 321, 324, 326, 328, 330]
 
 filename = 'self_driving_model_0.2.pkl'
-# Load the model from disk
-with open(filename, 'rb') as file:
-    model = pickle.load(file)
 
 
-def predict_dir(in_str):
-    # Read the string into a DataFrame
-    ar = pd.read_csv(StringIO(in_str), sep=',', header=None)
-    df = ar.iloc[:, selected_feature_indices]
+class SteeringPredictor:
+    """Predicts the turn value straight from 360 degree distance arrays.
+
+    The selected features are gathered with a precomputed index into a
+    preallocated float32 buffer (the dtype the trees work in), so a
+    prediction does no parsing and no DataFrame work before the model runs.
+    Random forests are evaluated by a CompiledForest unless `compiled` is
+    False; other models fall back to their own predict.
+    """
+
+    def __init__(self, model, feature_indices=None, max_batch=1, compiled=True):
+        if feature_indices is None:
+            feature_indices = selected_feature_indices
+        self.model = model
+        self.engine = compile_model(model) if compiled else None
+        self._predict = self.engine.predict if self.engine is not None else model.predict
+        self.feature_indices = np.asarray(feature_indices, dtype=np.intp)
+        self._features = np.zeros((max_batch, len(self.feature_indices)), dtype=np.float32)
+
+    def _buffer(self, n):
+        if n > len(self._features):
+            self._features = np.zeros((n, len(self.feature_indices)), dtype=np.float32)
+        return self._features[:n]
+
+    def predict(self, scan):
+        """Returns the predicted turn for a single scan as a float"""
+        features = self._buffer(1)
+        np.take(np.asarray(scan, dtype=np.float32), self.feature_indices, out=features[0])
+        return float(self._predict(features)[0])
+
+    def predict_batch(self, scans):
+        """Returns the predicted turns for an (n, 360) array of scans"""
+        scans = np.asarray(scans, dtype=np.float32)
+        features = self._buffer(len(scans))
+        np.take(scans, self.feature_indices, axis=1, out=features)
+        return self._predict(features)
+
+
+def load_predictor(path=filename, max_batch=1, compiled=True):
+    """Loads a pickled model into a SteeringPredictor.
+
+    Accepts both a bare model and the dictionary saved by the visualizer's
+    RegressionModelTrainer, in which case its feature indices are used, as
+    well as a forest saved with CompiledForest.save (.npz).
+    """
+    if path.endswith('.npz'):
+        return SteeringPredictor(CompiledForest.load(path), max_batch=max_batch)
+    with open(path, 'rb') as file:
+        model = pickle.load(file)
+    feature_indices = None
+    if isinstance(model, dict):
+        feature_indices = model.get('feature_indices')
+        model = model['model']
+    return SteeringPredictor(model, feature_indices, max_batch, compiled)
+
+
+# The model is loaded on first use so that the module can be imported
+# without the model file being present
+_predictor = None
+
+
+def get_predictor():
+    global _predictor
+    if _predictor is None:
+        _predictor = load_predictor(filename)
+    return _predictor
+
 
-    # Make predictions on the testing data
-    return model.predict(df)
+def predict_dir(scan):
+    """Predicts the turn for one scan given as an array or a csv line"""
+    if isinstance(scan, str):
+        scan = np.array(scan.split(','), dtype=np.float32)
+    return np.array([get_predictor().predict(scan)])
 
 
 if __name__ == '__main__':
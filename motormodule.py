@@ -1,54 +1,128 @@
-import RPi.GPIO as GPIO
-from time import sleep
 import math
-
-GPIO.setmode(GPIO.BOARD)
-GPIO.setwarnings(False)
+import time
+from time import sleep
 
 epsilon = 0.1
 turn_rate = math.pi * 1.3
 
+# Levels of the In1A, In2A, In1B, In2B pins for every direction
+DIRECTIONS = {
+    "UP": (False, True, False, True),
+    "DOWN": (True, False, True, False),
+    "LEFT": (False, True, True, False),
+    "RIGHT": (True, False, False, True),
+    "STOP": (False, False, False, False),
+}
+
+
+def rpi_gpio():
+    """Returns RPi.GPIO set up for board pin numbering. Imported on first
+    use so that the module also loads off the Pi."""
+    import RPi.GPIO as GPIO
+    GPIO.setmode(GPIO.BOARD)
+    GPIO.setwarnings(False)
+    return GPIO
+
+
+class FakePWM:
+    def __init__(self, gpio, pin, frequency):
+        self.gpio = gpio
+        self.pin = pin
+        self.frequency = frequency
+        self.duty = None
+
+    def start(self, duty):
+        self.duty = duty
+
+    def ChangeDutyCycle(self, duty):
+        self.duty = duty
+        self.gpio.calls.append(('duty', self.pin, duty))
+
+    def stop(self):
+        self.duty = None
+
+
+class FakeGPIO:
+    """In-memory stand-in for RPi.GPIO recording every output call"""
+
+    OUT = 0
+    IN = 1
+    BOARD = 10
+
+    def __init__(self):
+        self.levels = {}
+        self.pwms = {}
+        self.calls = []
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, mode):
+        self.levels[pin] = False
+
+    def output(self, pin, value):
+        self.levels[pin] = value
+        self.calls.append(('output', pin, value))
+
+    def PWM(self, pin, frequency):
+        self.pwms[pin] = FakePWM(self, pin, frequency)
+        return self.pwms[pin]
+
+    def cleanup(self):
+        self.levels.clear()
+
 
 class Motor:
-    def __init__(self, EnaA, In1A, In2A, EnaB, In1B, In2B):
+    """Drives the two motors through an H-bridge.
+
+    The duty cycles and direction pins last written are cached and GPIO is
+    only touched for the values that change, so calling `move` with the same
+    command on every loop iteration costs no GPIO writes. `writes` and
+    `skipped` count the GPIO calls issued and avoided.
+
+    gpio is the GPIO backend (RPi.GPIO by default, FakeGPIO off the Pi).
+    With a `min_interval` in seconds, commands that change the outputs
+    sooner than that after the last change are held back and applied by
+    the first `move` once the interval has passed (counted in `deferred`);
+    `stop` is always applied at once.
+    """
+
+    def __init__(self, EnaA, In1A, In2A, EnaB, In1B, In2B, gpio=None, min_interval=0.):
         self.EnaA = EnaA
         self.In1A = In1A
         self.In2A = In2A
         self.EnaB = EnaB
         self.In1B = In1B
         self.In2B = In2B
-        GPIO.setup(self.EnaA, GPIO.OUT)
-        GPIO.setup(self.In1A, GPIO.OUT)
-        GPIO.setup(self.In2A, GPIO.OUT)
-        GPIO.setup(self.EnaB, GPIO.OUT)
-        GPIO.setup(self.In1B, GPIO.OUT)
-        GPIO.setup(self.In2B, GPIO.OUT)
-        self.pwmA = GPIO.PWM(self.EnaA, 100)
+        self.gpio = gpio if gpio is not None else rpi_gpio()
+        self.min_interval = min_interval
+        for pin in (EnaA, In1A, In2A, EnaB, In1B, In2B):
+            self.gpio.setup(pin, self.gpio.OUT)
+        self.pwmA = self.gpio.PWM(self.EnaA, 100)
         self.pwmA.start(0)
-        self.pwmB = GPIO.PWM(self.EnaB, 100)
+        self.pwmB = self.gpio.PWM(self.EnaB, 100)
         self.pwmB.start(0)
-
-    def move(self, speed=0.5, turn=0.0, t=0):
+        # last applied duty A, duty B and direction pin levels (None: unknown)
+        self._duty = [0, 0]
+        self._levels = [None, None, None, None]
+        self._last_change = -math.inf
+        self._pending = None
+        self.writes = 0
+        self.skipped = 0
+        self.deferred = 0
+
+    @staticmethod
+    def command(speed=0.5, turn=0.0):
+        """Returns the (duty A, duty B, direction) for a speed and turn"""
         axis1, axis2 = turn, speed
         a = int(max(abs(axis1), abs(axis2)) * 100)
         b = 1
         if abs(axis2) >= epsilon:
             b = int(math.atan(abs(axis1) / abs(axis2)) / turn_rate * a)
-        if axis2 > epsilon:
-            if axis1 < 0 - epsilon:
-                outRight = a
-                outLeft = b
-            elif axis1 > epsilon:
-                outLeft = a
-                outRight = b
-            else:
-                outLeft = int(axis2 * 100)
-                outRight = outLeft
-
-            self.pwmA.ChangeDutyCycle(int(outLeft))
-            self.pwmB.ChangeDutyCycle(int(outRight))
-            self.move_dir("DOWN")
-        elif axis2 < 0 - epsilon:
+        if abs(axis2) > epsilon:
             if axis1 < 0 - epsilon:
                 outRight = a
                 outLeft = b
@@ -58,46 +132,72 @@ class Motor:
             else:
                 outLeft = int(abs(axis2) * 100)
                 outRight = outLeft
+            return outLeft, outRight, "DOWN" if axis2 > 0 else "UP"
 
-            self.pwmA.ChangeDutyCycle(outLeft)
-            self.pwmB.ChangeDutyCycle(outRight)
-            self.move_dir("UP")
-        elif abs(axis2) <= epsilon:
-            outRight = int(abs(axis1) * 100)
-            outLeft = outRight
-            self.pwmA.ChangeDutyCycle(outLeft)
-            self.pwmB.ChangeDutyCycle(outRight)
-
-            if axis1 > epsilon:
-                self.move_dir("LEFT")
-            elif axis1 < 0 - epsilon:
-                self.move_dir("RIGHT")
-            else:
-                self.move_dir("STOP")
+        outRight = int(abs(axis1) * 100)
+        outLeft = outRight
+        if axis1 > epsilon:
+            return outLeft, outRight, "LEFT"
+        elif axis1 < 0 - epsilon:
+            return outLeft, outRight, "RIGHT"
+        return outLeft, outRight, "STOP"
 
+    def move(self, speed=0.5, turn=0.0, t=0):
+        self._request(*self.command(speed, turn))
         sleep(t)
 
     def move_dir(self, direction):
-        if direction == "UP":
-            self._motor_out(False, True, False, True)
-        elif direction == "DOWN":
-            self._motor_out(True, False, True, False)
-        elif direction == "LEFT":
-            self._motor_out(False, True, True, False)
-        elif direction == "RIGHT":
-            self._motor_out(True, False, False, True)
-        else:
-            self._motor_out(False, False, False, False)
+        self._request(self._duty[0], self._duty[1], direction)
+
+    def _request(self, dutyA, dutyB, direction):
+        state = (dutyA, dutyB, DIRECTIONS.get(direction, DIRECTIONS["STOP"]))
+        if state[:2] == tuple(self._duty) and list(state[2]) == self._levels:
+            self._pending = None
+            self.skipped += 6
+            return
+        now = time.monotonic()
+        if now - self._last_change < self.min_interval:
+            self._pending = state
+            self.deferred += 1
+            return
+        self._apply(state)
+        self._last_change = now
+
+    def _apply(self, state):
+        dutyA, dutyB, levels = state
+        self._pending = None
+        self._set_duty(dutyA, dutyB)
+        self._motor_out(*levels)
+
+    def _set_duty(self, dutyA, dutyB):
+        for i, (pwm, duty) in enumerate(((self.pwmA, dutyA), (self.pwmB, dutyB))):
+            if self._duty[i] != duty:
+                pwm.ChangeDutyCycle(duty)
+                self._duty[i] = duty
+                self.writes += 1
+            else:
+                self.skipped += 1
+
+    def flush(self):
+        """Applies a command held back by `min_interval`, if any"""
+        if self._pending is not None:
+            self._apply(self._pending)
+            self._last_change = time.monotonic()
 
     def _motor_out(self, in1, in2, in3, in4):
-        GPIO.output(self.In1A, in1)
-        GPIO.output(self.In2A, in2)
-        GPIO.output(self.In1B, in3)
-        GPIO.output(self.In2B, in4)
+        for i, (pin, level) in enumerate(((self.In1A, in1), (self.In2A, in2),
+                                          (self.In1B, in3), (self.In2B, in4))):
+            if self._levels[i] != level:
+                self.gpio.output(pin, level)
+                self._levels[i] = level
+                self.writes += 1
+            else:
+                self.skipped += 1
 
     def stop(self, t=0):
-        self.pwmA.ChangeDutyCycle(0)
-        self.pwmB.ChangeDutyCycle(0)
+        self._pending = None
+        self._set_duty(0, 0)
+        self._last_change = time.monotonic()
         sleep(t)
 
 
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""Drives several RPLidar units at once and fuses their scans into one
+frame around the vehicle.
+
+Every sensor is read by its own acquisition thread into a ScanRing (see
+lidar_control), so the control loop only ever picks up the latest scans
+and reading a second sensor does not add to its latency. Usage example:
+
+>>> lidars = MultiLidar([MountedLidar('front', '/dev/ttyUSB0', x=150),
+...                      MountedLidar('rear', '/dev/ttyUSB1', angle=180, x=-200)])
+>>> lidars.start()
+>>> frame = lidars.frame()
+>>> print(frame.sources, lidars.status())
+>>> lidars.stop()
+
+$ ./multi_lidar.py front=/dev/ttyUSB0 rear=/dev/ttyUSB1:180:-200:0
+"""
+import argparse
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from lidar_control import LIDAR_RESOLUTION, ScanRing
+from rplidar import RPLidar, RPLidarException, Scan, _bin_scan
+
+
+class MountedLidar(namedtuple('MountedLidar', 'name port angle x y serial_factory',
+                              defaults=(0., 0., 0., None))):
+    """Sensor and its mounting on the vehicle.
+
+    `angle` is the vehicle heading, in degrees clockwise like the sensor
+    angles, of the sensor's 0 degree direction. `x` (forward) and `y` (to
+    the right) place the sensor centre in millimetres from the vehicle
+    origin. `serial_factory` is passed to RPLidar (e.g. lidar_sim.FakeSerial).
+    """
+
+
+FusedFrame = namedtuple('FusedFrame', 'timestamp distance valid sources seqs')
+
+
+def fuse_scans(scans, mounts, out=None, n_bins=LIDAR_RESOLUTION):
+    """Moves binned scans into the vehicle frame and combines them.
+
+    Every valid bin of every scan is placed by its mounting, then the points
+    are binned again around the vehicle origin keeping the nearest one.
+
+    Parameters
+    ----------
+    scans : sequence of Scan or LatestScan
+        Binned scans (only `distance` and `valid` are used)
+    mounts : sequence of MountedLidar
+        Mounting of the sensor of every scan
+    out : Scan, optional
+        Preallocated scan (see `Scan.empty`) to fill in place
+
+    Returns
+    -------
+    Scan
+    """
+    angles, distances = [], []
+    for scan, mount in zip(scans, mounts):
+        idx = np.flatnonzero(scan.valid)
+        distance = scan.distance[idx].astype(np.float64)
+        theta = np.radians(idx * (360. / len(scan.distance)) + mount.angle)
+        forward = mount.x + distance * np.cos(theta)
+        right = mount.y + distance * np.sin(theta)
+        angles.append(np.degrees(np.arctan2(right, forward)) % 360.)
+        distances.append(np.hypot(forward, right))
+    if out is None:
+        out = Scan.empty(n_bins, with_count=True)
+    if not angles:
+        angles, distances = [np.zeros(0)], [np.zeros(0)]
+    return _bin_scan(np.concatenate(angles), np.concatenate(distances), out=out,
+                     reduce='min')
+
+
+class LidarDevice:
+    """One sensor of a MultiLidar and its acquisition thread"""
+
+    def __init__(self, mount, scan_type='normal', n_bins=LIDAR_RESOLUTION, reduce='last',
+                 ring_size=4, timeout=1):
+        self.mount = mount
+        self.scan_type = scan_type
+        self.reduce = reduce
+        self.ring = ScanRing(ring_size, n_bins)
+        self.lidar = RPLidar(mount.port, timeout=timeout, serial_factory=mount.serial_factory)
+        self.errors = 0
+        self.last_error = None
+        self.error = None  # exception the acquisition thread stopped on
+        self.last_scan_time = None
+        self.started = None
+        self._stop = False
+        self._thread = None
+
+    @property
+    def name(self):
+        return self.mount.name
+
+    def start(self):
+        self.lidar.start_motor()
+        self.lidar.start(self.scan_type)
+        self._stop = False
+        self.started = time.monotonic()
+        self._thread = threading.Thread(target=self._acquire, daemon=True,
+                                        name='lidar-acquisition-%s' % self.name)
+        self._thread.start()
+
+    def _acquire(self):
+        """Acquisition thread. Other errors than a dropped scan stop it and
+        are raised by MultiLidar.frame, see ScanRing.fail"""
+        try:
+            while not self._stop:
+                try:
+                    quality, angle, distance = self.lidar._read_scan(self.scan_type)
+                except RPLidarException as e:
+                    self.errors += 1
+                    self.last_error = str(e)
+                    continue
+                _bin_scan(angle, distance, quality, out=self.ring.write_slot(), reduce=self.reduce)
+                self.last_scan_time = time.monotonic()
+                self.ring.publish(self.last_scan_time, self.lidar.last_scan_info)
+        except Exception as e:
+            self.errors += 1
+            self.last_error = str(e)
+            self.error = e
+            self.ring.fail(e)
+
+    def stop(self):
+        self._stop = True
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.lidar.stop()
+        self.lidar.stop_motor()
+        self.lidar.disconnect()
+
+
+class MultiLidar:
+    """Reads several sensors concurrently and fuses their latest scans.
+
+    Parameters
+    ----------
+    mounts : sequence of MountedLidar
+    scan_type, n_bins, reduce
+        Passed to every sensor, see LidarControl
+    max_skew : float
+        Scans completed more than `max_skew` seconds before the newest one
+        are left out of the fused frame
+    stall_timeout : float
+        A sensor is stalled when it has not completed a scan for that long
+    timeout : float
+        Serial timeout of every sensor
+    """
+
+    def __init__(self, mounts, scan_type='normal', n_bins=LIDAR_RESOLUTION, reduce='last',
+                 max_skew=0.1, stall_timeout=0.5, ring_size=4, timeout=1):
+        names = [mount.name for mount in mounts]
+        if len(set(names)) != len(names):
+            raise ValueError('Sensor names must be unique: %s' % names)
+        self.devices = [LidarDevice(mount, scan_type, n_bins, reduce, ring_size, timeout)
+                        for mount in mounts]
+        self.n_bins = n_bins
+        self.max_skew = max_skew
+        self.stall_timeout = stall_timeout
+
+    def start(self):
+        for device in self.devices:
+            device.start()
+
+    def stop(self):
+        for device in self.devices:
+            device.stop()
+
+    def frame(self, timeout=None, out=None):
+        """Fuses the latest scan of every sensor into a FusedFrame.
+
+        Waits up to `timeout` seconds for every sensor's first scan. The
+        frame is timestamped with the end of the newest scan; scans older
+        than `max_skew` and sensors without any scan are left out of it.
+        Raises the error a sensor's acquisition thread stopped on.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        latest = []
+        for device in self.devices:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            scan = device.ring.latest(remaining)
+            if scan is not None:
+                end = scan.info.end_time if scan.info is not None else scan.timestamp
+                latest.append((end, device, scan))
+        timestamp = max(end for end, _, _ in latest) if latest else None
+        aligned = [(device, scan) for end, device, scan in latest
+                   if end >= timestamp - self.max_skew]
+        fused = fuse_scans([scan for _, scan in aligned],
+                           [device.mount for device, _ in aligned],
+                           out=out, n_bins=self.n_bins)
+        return FusedFrame(timestamp, fused.distance, fused.valid,
+                          tuple(device.name for device, _ in aligned),
+                          {device.name: scan.seq for device, scan in aligned})
+
+    def status(self):
+        """Returns the rate and health of every sensor by name"""
+        now = time.monotonic()
+        status = {}
+        for device in self.devices:
+            last = device.last_scan_time
+            age = now - last if last is not None else None
+            since = last if last is not None else device.started
+            status[device.name] = {
+                'scans_per_second': device.lidar.stats.scans_per_second,
+                'samples_per_second': device.lidar.stats.samples_per_second,
+                'scans': device.ring.seq,
+                'age': age,
+                'stalled': since is not None and now - since > self.stall_timeout,
+                'errors': device.errors,
+                'failed': device.error is not None,
+                'resyncs': device.lidar.resyncs,
+                'overflows': device.lidar.overflows,
+            }
+        return status
+
+    def stalled(self):
+        """Names of the sensors that stopped delivering scans"""
+        return [name for name, status in self.status().items() if status['stalled']]
+
+
+def parse_mount(text):
+    """Parses name=port[:angle[:x[:y]]]"""
+    name, _, spec = text.partition('=')
+    port, *numbers = spec.split(':')
+    return MountedLidar(name, port, *map(float, numbers))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Print the status of several lidars')
+    parser.add_argument('sensors', nargs='+', type=parse_mount,
+                        help='name=port[:angle[:x[:y]]], mounting in degrees and mm')
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+    lidars = MultiLidar(args.sensors)
+    lidars.start()
+    try:
+        end = time.monotonic() + args.seconds
+        while time.monotonic() < end:
+            time.sleep(1)
+            frame = lidars.frame(timeout=1)
+            print('%d points from %s' % (frame.valid.sum(), ', '.join(frame.sources)))
+            for name, status in lidars.status().items():
+                print('  %s: %.1f scans/s%s' % (name, status['scans_per_second'],
+                                               ' STALLED' if status['stalled'] else ''))
+    finally:
+        lidars.stop()
@@ -1,63 +1,116 @@
-from motormodule import Motor
-from joystickmodule import get_joystick
+import argparse
+from functools import partial
+
+from car_hal import RealHardware, SimHardware
+from car_session import SessionRecorder
 from lidar_control import LidarControl
-from mldriver import predict_dir
-
-motor = Motor(3, 5, 7, 15, 13, 11)
-metrics = {'turn': 0.0, 'speed': 0.0}
-lidarControl = None
-recording = False
-auto = False
-
-while True:
-    joystick = get_joystick()
-    if joystick['b'] == 1:
-        if lidarControl is None:
-            lidarControl = LidarControl(port='/dev/ttyUSB0', metrics=metrics)
-            lidarControl.start()
-            recording = True
-        print('Button b pressed')
-    elif joystick['a'] == 1:
-        recording = False
-        lidarControl.stop_record()
-        lidarControl = None
-        print('Button a pressed')
-    elif joystick['L2'] == 1:
-        print('L2 pressed! RobotCar in self-driving mode!')
-        if lidarControl is None:
-            lidarControl = LidarControl(port='/dev/ttyUSB0', metrics=metrics)
-            lidarControl.start()
-        auto = True
-    elif joystick['R2'] == 1:
-        print('R2 pressed! RobotCar in manual mode!')
-        auto = False
-        lidarControl.stop()
-        lidarControl = None
-    elif joystick['x'] == 1:
-        recording = False
-        if lidarControl is not None:
-            lidarControl.stop_record()
-            lidarControl = None
-        break
-
-    speed = 0 - joystick['hat1']  # Reverse the sign, depend on the joystick specs
-    turn = joystick['hat0']
-    if joystick['axis1'] != 0:
-        speed = joystick['axis1']
-    if joystick['axis0'] != 0:
-        turn = joystick['axis0']
-
-    metrics['speed'] = speed
-    metrics['turn'] = turn
-
-    if recording:  # When in recording data mode
-        lidarControl.record_line()
-    elif auto:  # When in auto mode
-        measure = lidarControl.read_line()
-        speed = -0.9
-        turn = predict_dir(measure)
-
-    if abs(speed) < 0.1 and abs(turn) < 0.1:
-        motor.stop()
-    else:
-        motor.move(speed, turn, 0)
+from mldriver import filename as model_filename, load_predictor
+from rplidar import BIN_REDUCTIONS, DriverStats, MotorSpeedController
+from car_pipeline import DrivePipeline
+from telemetry import MetricsExporter, Telemetry
+
+
+def start_lidar(metrics, telemetry=None, record_format='csv', scan_type='normal',
+                reduce='last', motor_hz=None, min_quality=None, hardware=None):
+    if hardware is None:
+        hardware = RealHardware()
+    path = 'out.bin' if record_format == 'binary' else 'out.txt'
+    lidar_control = LidarControl(port=hardware.lidar_port, path=path, metrics=metrics,
+                                 telemetry=telemetry, record_format=record_format,
+                                 scan_type=scan_type, reduce=reduce,
+                                 record_timing=record_format == 'binary',
+                                 record_quality=record_format == 'binary',
+                                 min_quality=min_quality,
+                                 serial_factory=hardware.serial_factory)
+    if telemetry is not None:
+        stats = lidar_control.stats
+        for name in DriverStats.METRICS:
+            telemetry.gauge('lidar_' + name, partial(getattr, stats, name))
+    if motor_hz:
+        controller = MotorSpeedController(motor_hz)
+        lidar_control.lidar.speed_controller = controller
+        if telemetry is not None:
+            for name in MotorSpeedController.METRICS:
+                telemetry.gauge('lidar_motor_' + name, partial(getattr, controller, name))
+    lidar_control.start()
+    return lidar_control
+
+
+_predictor = None
+
+
+def get_predictor(path):
+    """Loads the model on first use, the car can drive manually without it"""
+    global _predictor
+    if _predictor is None:
+        _predictor = load_predictor(path)
+    return _predictor
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Drive the robot car')
+    parser.add_argument('--rate', type=float, default=50,
+                        help='motor update rate in Hz (default: 50)')
+    parser.add_argument('--metrics-file', default='car_metrics.prom',
+                        help='file the stage latencies are written to (default: car_metrics.prom)')
+    parser.add_argument('--metrics-interval', type=float, default=5,
+                        help='seconds between metrics file updates (default: 5)')
+    parser.add_argument('--record-format', choices=('csv', 'binary'), default='csv',
+                        help='format of recorded scans; binary recordings are written by a '
+                             'background thread and converted with scan_recording.py '
+                             '(default: csv)')
+    parser.add_argument('--scan-type', choices=('normal', 'express'), default='normal',
+                        help='lidar scan mode; express has a higher sample rate on '
+                             'sensors that support it (default: normal)')
+    parser.add_argument('--bin-reduce', choices=BIN_REDUCTIONS, default='last',
+                        help='how the measures falling into the same degree are combined '
+                             '(default: last, as the model was trained)')
+    parser.add_argument('--motor-hz', type=float, default=None,
+                        help='hold the lidar at this many rotations per second by adjusting '
+                             'the motor PWM (default: fixed PWM)')
+    parser.add_argument('--min-quality', type=int, default=None,
+                        help='drop lidar measures of lower quality (0-63) before binning; '
+                             'ignored in express mode (default: keep all)')
+    parser.add_argument('--sim', type=float, metavar='SECONDS', default=None,
+                        help='drive on simulated hardware (lidar, joystick and motor) for '
+                             'this many seconds, in self-driving mode')
+    parser.add_argument('--record-session', metavar='PATH', default=None,
+                        help='record the scans, joystick states and motor commands of the '
+                             'drive to PATH (.npz) for replay with car_session.py')
+    parser.add_argument('--model', default=model_filename,
+                        help='steering model for self-driving (default: %(default)s)')
+    args = parser.parse_args()
+
+    telemetry = Telemetry()
+    exporter = MetricsExporter(telemetry, args.metrics_file, args.metrics_interval)
+    exporter.start()
+
+    hardware = SimHardware(seconds=args.sim) if args.sim else RealHardware()
+    motor = hardware.motor()
+    for name in ('writes', 'skipped', 'deferred'):
+        telemetry.gauge('motor_gpio_' + name, partial(getattr, motor, name))
+    get_joystick = hardware.joystick()
+    lidar_factory = partial(start_lidar, telemetry=telemetry, record_format=args.record_format,
+                            scan_type=args.scan_type, reduce=args.bin_reduce,
+                            motor_hz=args.motor_hz, min_quality=args.min_quality,
+                            hardware=hardware)
+    recorder = None
+    if args.record_session:
+        recorder = SessionRecorder()
+        motor = recorder.motor(motor)
+        get_joystick = recorder.joystick(get_joystick)
+        lidar_factory = recorder.lidar_factory(lidar_factory)
+    pipeline = DrivePipeline(motor, get_joystick, lidar_factory,
+                             lambda scan: get_predictor(args.model).predict(scan),
+                             actuator_rate=args.rate, telemetry=telemetry)
+    try:
+        pipeline.run()
+    finally:
+        exporter.stop()
+        exporter.join()
+        if recorder is not None:
+            recorder.save(args.record_session)
+
+
+if __name__ == '__main__':
+    main()
@@ -70,6 +70,10 @@ class RPLidarException(Exception):
     """Basic exception class for RPLidar"""
 
 
+class RPLidarTimeoutException(RPLidarException):
+    """Raised when the sensor does not send the expected bytes in time"""
+
+
 def _b2i(byte):
     """Converts byte to integer (for Python 2 compatability)"""
     return byte if int(sys.version[0]) == 3 else ord(byte)
@@ -84,6 +88,47 @@ def nvl(value, default):
     return value if value is not None else default
 
 
+def _parse_descriptor(descriptor):
+    """Returns the data size, single response flag and data type announced
+    by a response descriptor"""
+    if len(descriptor) != DESCRIPTOR_LEN:
+        raise RPLidarException('Descriptor length mismatch')
+    elif not descriptor.startswith(SYNC_BYTE + SYNC_BYTE2):
+        raise RPLidarException('Incorrect descriptor starting bytes')
+    is_single = _b2i(descriptor[-2]) == 0
+    return _b2i(descriptor[2]), is_single, _b2i(descriptor[-1])
+
+
+def _check_response(descriptor, size, single, dtype):
+    """Raises RPLidarException if a parsed descriptor does not announce the
+    expected response"""
+    if descriptor[0] != size:
+        raise RPLidarException('Wrong get_info reply length')
+    if descriptor[1] != single:
+        raise RPLidarException('Not a single response mode' if single
+                               else 'Not a multiple response mode')
+    if descriptor[2] != dtype:
+        raise RPLidarException('Wrong response data type')
+    return descriptor
+
+
+def _parse_info(raw):
+    serialnumber = codecs.encode(raw[4:], 'hex').upper()
+    serialnumber = codecs.decode(serialnumber, 'ascii')
+    return {
+        'model': _b2i(raw[0]),
+        'firmware': (_b2i(raw[2]), _b2i(raw[1])),
+        'hardware': _b2i(raw[3]),
+        'serialnumber': serialnumber,
+    }
+
+
+def _parse_health(raw):
+    status = _HEALTH_STATUSES[_b2i(raw[0])]
+    error_code = (_b2i(raw[1]) << 8) + _b2i(raw[2])
+    return status, error_code
+
+
 def _process_scan(raw):
     """Processes input raw data and returns measurement data"""
     new_scan = bool(_b2i(raw[0]) & 0b1)
@@ -99,19 +144,408 @@ def _process_scan(raw):
     return new_scan, quality, angle, distance
 
 
-def _process_express_scan(data, new_angle, trame):
-    new_scan = (new_angle < data.start_angle) & (trame == 1)
-    angle = (data.start_angle + (
-            (new_angle - data.start_angle) % 360
-    ) / 32 * trame - data.angle[trame - 1]) % 360
-    distance = data.distance[trame - 1]
-    return new_scan, None, angle, distance
+# Normal/force mode response packet: quality and start flags in the first
+# byte, check bit + Q6 angle in the next two, Q2 distance in the last two
+_SCAN_PACKET_DTYPE = np.dtype([
+    ('flags', 'u1'),
+    ('angle', '<u2'),
+    ('distance', '<u2'),
+])
+
+
+def _process_scan_bulk(raw):
+    """Vectorized counterpart of `_process_scan` for a buffer holding any
+    number of whole 5-byte packets. Returns `new_scan`, `quality`, `angle`
+    and `distance` as NumPy arrays with one element per packet."""
+    packets = np.frombuffer(raw, dtype=_SCAN_PACKET_DTYPE,
+                            count=len(raw) // _SCAN_PACKET_DTYPE.itemsize)
+    flags = packets['flags']
+    new_scan = (flags & 0b1).astype(bool)
+    inversed_new_scan = ((flags >> 1) & 0b1).astype(bool)
+    if np.any(new_scan == inversed_new_scan):
+        raise RPLidarException('New scan flags mismatch')
+    angle_field = packets['angle']
+    if np.any((angle_field & 0b1) != 1):
+        raise RPLidarException('Check bit not equal to 1')
+    quality = flags >> 2
+    angle = (angle_field >> 1) / 64.
+    distance = packets['distance'] / 4.
+    return new_scan, quality, angle, distance
+
+
+class ScanInfo(namedtuple('scan_info', 'start_time end_time samples invalid')):
+    """Timing and sample counts of one assembled rotation.
+
+    start_time, end_time : float
+        time.monotonic() when the first and the last measure of the rotation
+        were read from the serial port
+    samples : int
+        Number of measures in the rotation
+    invalid : int
+        Number of those measures with a zero distance
+    """
+    __slots__ = ()
+
+    @property
+    def duration(self):
+        return self.end_time - self.start_time
+
+
+class Scan(namedtuple('scan', 'distance quality valid count info', defaults=(None, None))):
+    """One complete rotation binned into equal angular bins (integer
+    degrees by default).
+
+    distance : numpy.ndarray of float32
+        Distance in millimeters for every bin, 0 where there is no valid
+        measure
+    quality : numpy.ndarray of uint8 or None
+        Quality of the measure kept in every bin (only if requested)
+    valid : numpy.ndarray of bool
+        True for the bins holding a measure with a non-zero distance
+    count : numpy.ndarray of uint16 or None
+        Number of valid measures that fell into every bin (only if requested)
+    info : ScanInfo or None
+        Timing and sample counts of the rotation (set by `RPLidar.read_scan`)
+    """
+    __slots__ = ()
+
+    @classmethod
+    def empty(cls, n_bins=360, with_quality=False, with_count=False):
+        """Allocates a scan that can be filled in place by `_bin_scan`"""
+        quality = np.zeros(n_bins, dtype=np.uint8) if with_quality else None
+        count = np.zeros(n_bins, dtype=np.uint16) if with_count else None
+        return cls(np.zeros(n_bins, dtype=np.float32), quality,
+                   np.zeros(n_bins, dtype=bool), count)
+
+
+BIN_REDUCTIONS = ('last', 'min', 'mean', 'median', 'nearest')
+
+
+def _bin_scan(angle, distance, quality=None, n_bins=360, out=None, reduce='last'):
+    """Places every measure of a rotation into `n_bins` equal angular bins
+    centred on multiples of 360 / n_bins degrees. Fills and returns `out` if
+    given (its size then sets the number of bins).
+
+    `reduce` selects how the measures of a bin are combined:
+
+    last
+        The last measure received, like the original per-packet loop
+        (measures past the last bin centre stay in the last bin)
+    min, mean, median
+        Over the valid measures of the bin; the quality is the highest one
+        in the bin
+    nearest
+        The valid measure whose angle is closest to the bin centre
+    """
+    if out is None:
+        out = Scan.empty(n_bins, quality is not None)
+    n_bins = len(out.distance)
+    position = np.asarray(angle) * (n_bins / 360.)
+    out.distance[:] = 0
+    if out.quality is not None:
+        out.quality[:] = 0
+
+    if reduce == 'last':
+        idx = np.minimum(np.rint(position).astype(np.intp), n_bins - 1)
+        # np.unique on the reversed indices gives the last occurrence of each bin
+        bins, rev_pos = np.unique(idx[::-1], return_index=True)
+        src = len(idx) - 1 - rev_pos
+        out.distance[bins] = distance[src]
+        if out.quality is not None and quality is not None:
+            out.quality[bins] = quality[src]
+        valid = distance > 0
+        idx, distance = idx[valid], distance[valid]
+    else:
+        valid = distance > 0
+        nearest = np.rint(position[valid])
+        idx = nearest.astype(np.intp) % n_bins
+        distance = distance[valid]
+        if quality is not None:
+            quality = quality[valid]
+        count = np.bincount(idx, minlength=n_bins)
+        filled = count > 0
+        if reduce == 'mean':
+            out.distance[filled] = np.bincount(idx, distance, n_bins)[filled] / count[filled]
+        elif reduce == 'min':
+            reduced = np.full(n_bins, np.inf)
+            np.minimum.at(reduced, idx, distance)
+            out.distance[filled] = reduced[filled]
+        elif reduce == 'median':
+            ordered = distance[np.lexsort((distance, idx))]
+            first = (np.cumsum(count) - count)[filled]
+            n = count[filled]
+            out.distance[filled] = (ordered[first + (n - 1) // 2] + ordered[first + n // 2]) / 2
+        elif reduce == 'nearest':
+            order = np.lexsort((np.abs(position[valid] - nearest), idx))
+            src = order[np.flatnonzero(np.diff(idx[order], prepend=-1))]
+            out.distance[idx[src]] = distance[src]
+            if out.quality is not None and quality is not None:
+                out.quality[idx[src]] = quality[src]
+        else:
+            raise ValueError('reduce must be one of %s' % ', '.join(BIN_REDUCTIONS))
+        if out.quality is not None and quality is not None and reduce != 'nearest':
+            np.maximum.at(out.quality, idx, quality)
+
+    out.valid[:] = out.distance > 0
+    if out.count is not None:
+        out.count[:] = np.bincount(idx, minlength=n_bins)
+    return out
+
+
+def _filter_quality(quality, distance, min_quality):
+    """Returns `distance` with the measures of quality below `min_quality`
+    set to 0 (invalid). Express scans report quality 0 for every measure and
+    must not be filtered."""
+    return np.where(quality >= min_quality, distance, 0)
+
+
+def scan_to_csv(distance, valid=None):
+    """Formats binned distances as a csv line, bins that are not valid are
+    written as 0 like the original recordings. Only meant for the recording
+    boundary."""
+    if valid is not None:
+        distance = np.where(valid, distance, 0)
+    return ','.join(str(v) if v else '0' for v in distance.tolist())
+
+
+def _process_express_bulk(raw):
+    """Decodes any number of whole 84-byte express packets at once.
+
+    Returns
+    -------
+    new_scan : numpy.ndarray of bool
+        Start flag of every packet
+    start_angle : numpy.ndarray
+        Start angle of every packet in degrees
+    distance : numpy.ndarray of uint16, shape (n, 32)
+        Distances of the 32 measures of every packet in millimetres
+    angle_offset : numpy.ndarray, shape (n, 32)
+        Angle compensation of every measure in degrees
+    """
+    packets = np.frombuffer(raw, dtype=np.uint8,
+                            count=len(raw) - len(raw) % 84).reshape(-1, 84)
+    if np.any((packets[:, 0] >> 4) != ExpressPacket.sync1) or \
+            np.any((packets[:, 1] >> 4) != ExpressPacket.sync2):
+        raise RPLidarException('Express packet sync bits mismatch')
+    checksum = (packets[:, 0] & 0b1111) | ((packets[:, 1] & 0b1111) << 4)
+    if np.any(np.bitwise_xor.reduce(packets[:, 2:], axis=1) != checksum):
+        raise RPLidarException('Express packet checksum mismatch')
+
+    head = packets[:, 2].astype(np.uint16) | (packets[:, 3].astype(np.uint16) << 8)
+    new_scan = (head >> 15).astype(bool)
+    start_angle = (head & 0x7fff) / 64.
+
+    cabins = packets[:, 4:].reshape(-1, 16, 5).astype(np.uint16)
+    distance = np.empty((len(packets), 32), dtype=np.uint16)
+    distance[:, 0::2] = (cabins[..., 0] >> 2) | (cabins[..., 1] << 6)
+    distance[:, 1::2] = (cabins[..., 2] >> 2) | (cabins[..., 3] << 6)
+    offset = np.empty((len(packets), 32), dtype=np.uint16)
+    offset[:, 0::2] = (cabins[..., 4] & 0b1111) | ((cabins[..., 0] & 0b1) << 4)
+    offset[:, 1::2] = (cabins[..., 4] >> 4) | ((cabins[..., 2] & 0b1) << 4)
+    sign = np.empty((len(packets), 32), dtype=np.uint16)
+    sign[:, 0::2] = (cabins[..., 0] >> 1) & 0b1
+    sign[:, 1::2] = (cabins[..., 2] >> 1) & 0b1
+    angle_offset = offset / 8. * (1. - 2. * sign)
+    return new_scan, start_angle, distance, angle_offset
+
+
+_EXPRESS_STEPS = np.arange(1, 33) / 32.
+
+
+def _express_measures(start_angle, distance, angle_offset, next_start_angle):
+    """Interpolates the angles of all measures of consecutive express packets.
+
+    The measures of a packet are spread between its start angle and the
+    start angle of the packet that follows it (`next_start_angle`), less
+    their angle compensation. A new scan starts at the first measure of the
+    packet during which the start angle wraps around.
+
+    Returns `new_scan`, `angle` and `distance` with one element per measure.
+    """
+    span = (next_start_angle - start_angle) % 360
+    angle = (start_angle[:, None] + span[:, None] * _EXPRESS_STEPS - angle_offset) % 360
+    new_scan = np.zeros(distance.shape, dtype=bool)
+    new_scan[:, 0] = next_start_angle < start_angle
+    return new_scan.ravel(), angle.ravel(), distance.ravel().astype(float)
+
+
+# number of consecutive plausible packets that must follow a candidate
+# packet boundary before the stream is considered resynchronised
+_RESYNC_PACKETS = {5: 8, 84: 3}
+
+
+def _valid_packets(raw, dsize):
+    """Checks every whole packet of `raw`: the new scan flag pair and the
+    check bit of normal packets, the sync bits and checksum of express
+    packets. Returns a boolean array with one element per packet."""
+    packets = np.frombuffer(raw, dtype=np.uint8,
+                            count=len(raw) - len(raw) % dsize).reshape(-1, dsize)
+    if dsize != _SCAN_TYPE['express']['size']:
+        return (((packets[:, 0] ^ (packets[:, 0] >> 1)) & packets[:, 1] & 0b1)).astype(bool)
+    checksum = (packets[:, 0] & 0b1111) | ((packets[:, 1] & 0b1111) << 4)
+    return (((packets[:, 0] >> 4) == ExpressPacket.sync1)
+            & ((packets[:, 1] >> 4) == ExpressPacket.sync2)
+            & (np.bitwise_xor.reduce(packets[:, 2:], axis=1) == checksum))
+
+
+def _find_packet_boundary(raw, dsize):
+    """Returns the first offset in `raw` from which enough consecutive
+    packets look valid (see `_RESYNC_PACKETS`), or None if there is none."""
+    n_packets = _RESYNC_PACKETS[dsize]
+    data = np.frombuffer(raw, dtype=np.uint8)
+    if len(data) < n_packets * dsize:
+        return None
+    # could a packet start at this byte?
+    if dsize == _SCAN_TYPE['express']['size']:
+        start = ((data[:-1] >> 4) == ExpressPacket.sync1) & ((data[1:] >> 4) == ExpressPacket.sync2)
+    else:
+        start = ((data[:-1] ^ (data[:-1] >> 1)) & data[1:] & 0b1).astype(bool)
+    n = len(data) - n_packets * dsize + 1
+    run = start[:n].copy()
+    for k in range(1, n_packets):
+        run &= start[k * dsize:k * dsize + n]
+    found = np.flatnonzero(run)
+    return int(found[0]) if len(found) else None
+
+
+class DriverStats(object):
+    """Rolling health statistics of an RPLidar driver.
+
+    Rates are computed over the last `window` scans when they are read;
+    updating the statistics only stores a few numbers per scan, so the
+    attributes can be polled cheaply from any thread.
+    """
+
+    METRICS = ('scans_per_second', 'samples_per_second', 'scans', 'bytes_discarded',
+               'resyncs', 'overflows', 'max_backlog', 'scans_dropped')
+
+    def __init__(self, window=32):
+        self._end_times = np.zeros(window)
+        self._samples = np.zeros(window, dtype=np.int64)
+        self.scans = 0
+        self.samples = 0
+        self.invalid = 0
+        self.bytes_discarded = 0
+        self.resyncs = 0
+        self.overflows = 0
+        self.max_backlog = 0
+        # complete rotations replaced by a newer one before they were read
+        self.scans_dropped = 0
+
+    def add_scan(self, info):
+        slot = self.scans % len(self._end_times)
+        self._end_times[slot] = info.end_time
+        self._samples[slot] = info.samples
+        self.scans += 1
+        self.samples += info.samples
+        self.invalid += info.invalid
+
+    def observe_backlog(self, size):
+        if size > self.max_backlog:
+            self.max_backlog = size
+
+    def _window(self):
+        n = min(self.scans, len(self._end_times))
+        last = (self.scans - 1) % len(self._end_times)
+        first = (self.scans - n) % len(self._end_times)
+        return n, self._end_times[last] - self._end_times[first], first
+
+    @property
+    def scans_per_second(self):
+        n, span, _ = self._window()
+        return (n - 1) / span if n > 1 and span > 0 else 0.
+
+    @property
+    def samples_per_second(self):
+        n, span, first = self._window()
+        if n < 2 or span <= 0:
+            return 0.
+        # the samples of the first scan in the window were read before its end time
+        return (self._samples[:n].sum() - self._samples[first]) / span
+
+    def snapshot(self):
+        """Returns all metrics as a dictionary"""
+        return {name: getattr(self, name) for name in self.METRICS}
+
+
+class MotorSpeedController(object):
+    """Closed-loop motor control holding a target scan rate.
+
+    The rotation rate of the motor at a given PWM drifts with the battery
+    voltage. Attached to a driver as `RPLidar.speed_controller`, the
+    controller is updated with the timing of every scan and corrects
+    `RPLidar.motor_speed` in proportion to the rate error whenever the error
+    exceeds `tolerance`. Without it the PWM is left as set (open loop).
+
+    Parameters
+    ----------
+    target_hz : float
+        Rotations per second to hold
+    tolerance : float
+        Rate error in Hz that is not corrected
+    gain : float
+        PWM change per Hz of rate error
+    window : int
+        Number of scan periods the rate is measured over
+    settle_scans : int
+        Scans ignored after a PWM change while the motor speed settles
+    min_pwm, max_pwm : int
+        Range of the PWM
+    """
+
+    METRICS = ('rate_hz', 'target_hz', 'error_hz', 'pwm', 'adjustments')
+
+    def __init__(self, target_hz, tolerance=0.1, gain=60., window=4, settle_scans=2,
+                 min_pwm=200, max_pwm=MAX_MOTOR_PWM):
+        self.target_hz = target_hz
+        self.tolerance = tolerance
+        self.gain = gain
+        self.window = window
+        self.settle_scans = settle_scans
+        self.min_pwm = min_pwm
+        self.max_pwm = max_pwm
+        self.rate_hz = 0.
+        self.error_hz = 0.
+        self.pwm = None
+        self.adjustments = 0
+        self._skip = settle_scans
+        self._end_times = []
+
+    def update(self, lidar, info):
+        """Takes the timing of a new scan and adjusts the PWM of `lidar`"""
+        self.pwm = lidar.motor_speed
+        if self._skip:
+            self._skip -= 1
+            return
+        self._end_times.append(info.end_time)
+        if len(self._end_times) <= self.window:
+            return
+        span = self._end_times[-1] - self._end_times[0]
+        self._end_times = self._end_times[-1:]
+        if span <= 0:
+            return
+        self.rate_hz = self.window / span
+        self.error_hz = self.target_hz - self.rate_hz
+        if abs(self.error_hz) <= self.tolerance:
+            return
+        pwm = int(round(min(max(self.pwm + self.gain * self.error_hz, self.min_pwm),
+                            self.max_pwm)))
+        if pwm != self.pwm:
+            lidar.motor_speed = self.pwm = pwm
+            self.adjustments += 1
+            self._skip = self.settle_scans
+            self._end_times = []
+
+    def snapshot(self):
+        """Returns all metrics as a dictionary"""
+        return {name: getattr(self, name) for name in self.METRICS}
 
 
 class RPLidar(object):
     """Class for communicating with RPLidar rangefinder scanners"""
 
-    def __init__(self, port, baudrate=115200, timeout=1, logger=None):
+    def __init__(self, port, baudrate=115200, timeout=1, logger=None,
+                 serial_factory=None, auto_connect=True):
         """Initialize RPLidar object for communicating with the sensor.
 
         Parameters
@@ -121,31 +555,60 @@ class RPLidar(object):
         baudrate : int, optional
             Baudrate for serial connection (the default is 115200)
         timeout : float, optional
-            Serial port connection timeout in seconds (the default is 1)
+            Serial port connection timeout in seconds (the default is 1). It
+            is also the default deadline for every response read.
         logger : logging.Logger instance, optional
             Logger instance, if none is provided new instance is created
+        serial_factory : callable, optional
+            Called with the arguments of serial.Serial to open the port
+            (the default is serial.Serial). lidar_sim provides a simulated
+            sensor and a capturing wrapper.
+        auto_connect : bool, optional
+            Open the port right away (the default is True)
         """
         self._serial = None
         self.port = port
         self.baudrate = baudrate
         self.timeout = timeout
+        self.serial_factory = serial_factory
         self._motor_speed = DEFAULT_MOTOR_PWM
         self.scanning = [False, 0, 'normal']
-        self.express_trame = 32
-        self.express_data = False
         self.motor_running = None
+        # measures decoded past the end of the last rotation, and the last
+        # express packet, which is decoded once the next one has arrived
+        self._pending = None
+        self._express_last = None
+        # measures of the rotation being assembled and its first and last
+        # read times
+        self._chunks = []
+        self._scan_times = None
+        # bytes of an incomplete packet, kept until the rest arrives
+        self._partial = b''
+        self._resyncing = False
+        self.stats = DriverStats()
+        self.last_scan_info = None
+        # Optional MotorSpeedController adjusting motor_speed after every scan
+        self.speed_controller = None
+        self.last_read_wait = 0.
+        self.read_wait_total = 0.
+        self.read_count = 0
+        # Optional telemetry.Telemetry (anything with a record(name, seconds)
+        # method) receiving the serial wait and scan assembly latencies
+        self.telemetry = None
         if logger is None:
             logger = logging.getLogger('rplidar')
         self.logger = logger
-        self.connect()
+        if auto_connect:
+            self.connect()
 
     def connect(self):
         """Connects to the serial port with the name `self.port`. If it was
         connected to another serial port disconnects from it first."""
         if self._serial is not None:
             self.disconnect()
+        factory = self.serial_factory or serial.Serial
         try:
-            self._serial = serial.Serial(
+            self._serial = factory(
                 self.port, self.baudrate,
                 parity=serial.PARITY_NONE, stopbits=serial.STOPBITS_ONE,
                 timeout=self.timeout)
@@ -159,6 +622,18 @@ class RPLidar(object):
             return
         self._serial.close()
 
+    @property
+    def resyncs(self):
+        return self.stats.resyncs
+
+    @property
+    def overflows(self):
+        return self.stats.overflows
+
+    @property
+    def bytes_discarded(self):
+        return self.stats.bytes_discarded
+
     def _set_pwm(self, pwm):
         payload = struct.pack("<H", pwm)
         self._send_payload_cmd(SET_PWM_BYTE, payload)
@@ -213,25 +688,229 @@ class RPLidar(object):
 
     def _read_descriptor(self):
         """Reads descriptor packet"""
-        descriptor = self._serial.read(DESCRIPTOR_LEN)
+        descriptor = self._read_response(DESCRIPTOR_LEN)
         self.logger.debug('Received descriptor: %s', _showhex(descriptor))
-        if len(descriptor) != DESCRIPTOR_LEN:
-            raise RPLidarException('Descriptor length mismatch')
-        elif not descriptor.startswith(SYNC_BYTE + SYNC_BYTE2):
-            raise RPLidarException('Incorrect descriptor starting bytes')
-        is_single = _b2i(descriptor[-2]) == 0
-        return _b2i(descriptor[2]), is_single, _b2i(descriptor[-1])
-
-    def _read_response(self, dsize):
-        """Reads response packet with length of `dsize` bytes"""
+        return _parse_descriptor(descriptor)
+
+    def _read_response(self, dsize, timeout=None):
+        """Reads response packet with length of `dsize` bytes.
+
+        Blocks inside the serial read until the bytes arrive instead of
+        polling the buffer. The time spent waiting is stored in
+        `last_read_wait` and accumulated in `read_wait_total`.
+
+        Parameters
+        ----------
+        dsize : int
+            Number of bytes to read
+        timeout : float, optional
+            Deadline for the whole read in seconds (defaults to `timeout`)
+
+        Raises
+        ------
+        RPLidarTimeoutException
+            If fewer than `dsize` bytes arrived before the deadline
+        """
         self.logger.debug('Trying to read response: %d bytes', dsize)
-        while self._serial.inWaiting() < dsize:
-            time.sleep(0.001)
-        data = self._serial.read(dsize)
-        # print('data: {}'.format(data))
+        if timeout is None:
+            timeout = self.timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        port_timeout = self._serial.timeout
+        data = bytearray()
+        try:
+            now = start
+            while True:
+                # a single read must not block past the deadline either
+                left = max(deadline - now, 0)
+                self._serial.timeout = left if port_timeout is None else min(left, port_timeout)
+                data += self._serial.read(dsize - len(data))
+                now = time.monotonic()
+                if len(data) >= dsize or now >= deadline:
+                    break
+        finally:
+            self._serial.timeout = port_timeout
+        data = bytes(data)
+        self.last_read_wait = time.monotonic() - start
+        self.read_wait_total += self.last_read_wait
+        self.read_count += 1
+        if self.telemetry is not None:
+            self.telemetry.record('serial_wait', self.last_read_wait)
+        if len(data) < dsize:
+            raise RPLidarTimeoutException(
+                'Timed out after %.3f s waiting for response: got %d of %d '
+                'bytes' % (self.last_read_wait, len(data), dsize))
         self.logger.debug('Received data: %s', _showhex(data))
         return data
 
+    def _read_packets(self, dsize):
+        """Reads every whole packet currently waiting in the input buffer
+        (at least one) in a single call."""
+        waiting = self._serial.inWaiting()
+        self.stats.observe_backlog(waiting)
+        return self._read_response(max(waiting // dsize, 1) * dsize)
+
+    def _decode_packets(self, raw, dsize):
+        """Decodes whole packets of the running scan into measures.
+
+        Corrupted packets do not stop the scan: the stream is resynchronised
+        on the next offset from which several consecutive packets are valid
+        and the bytes skipped are counted in `stats.bytes_discarded`. Bytes of an
+        incomplete packet are kept for the next call.
+
+        Returns
+        -------
+        new_scan, quality, angle, distance : numpy.ndarray
+            One element per measure. Express packets carry no quality, it is
+            reported as 0.
+        """
+        raw = self._partial + raw
+        self._partial = b''
+        segments = []
+        while raw:
+            whole = len(raw) - len(raw) % dsize
+            bad = np.flatnonzero(~_valid_packets(raw[:whole], dsize))
+            if not len(bad):
+                segments.append(raw[:whole])
+                self._partial = raw[whole:]
+                break
+            segments.append(raw[:bad[0] * dsize])
+            raw = raw[bad[0] * dsize:]
+            if not self._resyncing:  # not still searching since the last read
+                self.stats.resyncs += 1
+                self.logger.warning('Corrupted packet, resynchronising the stream')
+            # the express packet held back is not followed by the next one
+            segments.append(None)
+            offset = _find_packet_boundary(raw[1:], dsize)
+            if offset is None:
+                # keep the bytes that may still hold the start of a boundary
+                keep = min(len(raw) - 1, _RESYNC_PACKETS[dsize] * dsize - 1)
+                self.stats.bytes_discarded += len(raw) - keep
+                self._partial = raw[len(raw) - keep:]
+                self._resyncing = True
+                break
+            self._resyncing = False
+            self.stats.bytes_discarded += offset + 1
+            raw = raw[offset + 1:]
+
+        if dsize != _SCAN_TYPE['express']['size']:
+            decoded = [_process_scan_bulk(segment) for segment in segments if segment]
+        else:
+            decoded = []
+            for segment in segments:
+                if segment is None:
+                    self._express_last = None
+                elif segment:
+                    decoded.append(self._decode_express(segment))
+        if len(decoded) == 1:
+            return decoded[0]
+        if not decoded:
+            return (np.zeros(0, dtype=bool), np.zeros(0, dtype=np.uint8),
+                    np.zeros(0), np.zeros(0))
+        return tuple(np.concatenate(c) for c in zip(*decoded))
+
+    def _decode_express(self, raw):
+        _, start_angle, distance, angle_offset = _process_express_bulk(raw)
+        if self._express_last is not None:
+            last_start, last_distance, last_offset = self._express_last
+            start_angle = np.concatenate(([last_start], start_angle))
+            distance = np.concatenate((last_distance[None], distance))
+            angle_offset = np.concatenate((last_offset[None], angle_offset))
+        # the last packet waits for the start angle of the next one
+        self._express_last = start_angle[-1], distance[-1], angle_offset[-1]
+        new_scan, angle, distance = _express_measures(
+            start_angle[:-1], distance[:-1], angle_offset[:-1], start_angle[1:])
+        return new_scan, np.zeros(len(distance), dtype=np.uint8), angle, distance
+
+    def _discard_backlog(self, dsize):
+        """Throws away the stale backlog of the input buffer with a single
+        read. Only whole packets are discarded so that the stream stays
+        aligned on packet boundaries."""
+        backlog = self._serial.inWaiting()
+        # bytes completing the packet of which we already hold the start
+        tail = (dsize - len(self._partial)) % dsize
+        if backlog < tail:
+            # the rest of the packet has not arrived: keep its start so
+            # that the next read stays aligned
+            size = 0
+        else:
+            size = tail + (backlog - tail) // dsize * dsize
+            self.stats.bytes_discarded += len(self._partial)
+            self._partial = b''
+        if size:
+            self._serial.read(size)
+        self.stats.overflows += 1
+        self.stats.bytes_discarded += size
+        self._pending = None
+        self._express_last = None
+        self._chunks = []
+        self.logger.warning('Too many bytes in the input buffer, discarded %d', size)
+
+    def _assemble_scan(self, read_time, measures):
+        """Adds decoded measures read at `read_time` to the rotation being
+        assembled.
+
+        Returns
+        -------
+        quality, angle, distance : numpy.ndarray or None
+            Measures of the rotation once it is complete, starting with the
+            one that carries the new scan flag, otherwise None. Measures past
+            the end of the rotation are kept in `_pending` and the timing of
+            the rotation is stored in `last_scan_info`.
+        """
+        new_scan, quality, angle, distance = measures
+        starts = np.flatnonzero(new_scan)
+        begin = 0
+        if not self._chunks:
+            if not len(starts):
+                return None
+            begin, starts = starts[0], starts[1:]
+            self._scan_times = [read_time, read_time]
+        if len(starts):
+            end = starts[0]
+            if end > begin:
+                self._scan_times[1] = read_time
+            self._chunks.append((quality[begin:end], angle[begin:end], distance[begin:end]))
+            self._pending = read_time, (new_scan[end:], quality[end:], angle[end:],
+                                        distance[end:])
+            measures = tuple(np.concatenate(c) for c in zip(*self._chunks))
+            self._chunks = []
+            distance = measures[2]
+            self.last_scan_info = ScanInfo(self._scan_times[0], self._scan_times[1],
+                                           len(distance),
+                                           len(distance) - np.count_nonzero(distance))
+            self.stats.add_scan(self.last_scan_info)
+            if self.speed_controller is not None:
+                self.speed_controller.update(self, self.last_scan_info)
+            return measures
+        if len(distance) > begin:
+            self._scan_times[1] = read_time
+        self._chunks.append((quality[begin:], angle[begin:], distance[begin:]))
+        return None
+
+    def _read_scan_measures(self, dsize):
+        """Reads packets until one complete rotation has been received.
+
+        Returns
+        -------
+        quality, angle, distance : numpy.ndarray
+            Measures of the rotation, see `_assemble_scan`
+        """
+        start, waited = time.monotonic(), self.read_wait_total
+        while True:
+            if self._pending is None:
+                measures = self._decode_packets(self._read_packets(dsize), dsize)
+                read_time = time.monotonic()
+            else:
+                (read_time, measures), self._pending = self._pending, None
+            measures = self._assemble_scan(read_time, measures)
+            if measures is not None:
+                if self.telemetry is not None:
+                    # decoding time only, the serial waits are recorded apart
+                    self.telemetry.record('scan_decode', time.monotonic() - start
+                                          - (self.read_wait_total - waited))
+                return measures
+
     def get_info(self):
         """Get device information
 
@@ -244,23 +923,8 @@ class RPLidar(object):
             return ('Data in buffer, you can\'t have info ! '
                     'Run clean_input() to emptied the buffer.')
         self._send_cmd(GET_INFO_BYTE)
-        dsize, is_single, dtype = self._read_descriptor()
-        if dsize != INFO_LEN:
-            raise RPLidarException('Wrong get_info reply length')
-        if not is_single:
-            raise RPLidarException('Not a single response mode')
-        if dtype != INFO_TYPE:
-            raise RPLidarException('Wrong response data type')
-        raw = self._read_response(dsize)
-        serialnumber = codecs.encode(raw[4:], 'hex').upper()
-        serialnumber = codecs.decode(serialnumber, 'ascii')
-        data = {
-            'model': _b2i(raw[0]),
-            'firmware': (_b2i(raw[2]), _b2i(raw[1])),
-            'hardware': _b2i(raw[3]),
-            'serialnumber': serialnumber,
-        }
-        return data
+        dsize, _, _ = _check_response(self._read_descriptor(), INFO_LEN, True, INFO_TYPE)
+        return _parse_info(self._read_response(dsize))
 
     def get_health(self):
         """Get device health state. When the core system detects some
@@ -282,25 +946,18 @@ class RPLidar(object):
                     'Run clean_input() to emptied the buffer.')
         self.logger.info('Asking for health')
         self._send_cmd(GET_HEALTH_BYTE)
-        dsize, is_single, dtype = self._read_descriptor()
-        if dsize != HEALTH_LEN:
-            raise RPLidarException('Wrong get_info reply length')
-        if not is_single:
-            raise RPLidarException('Not a single response mode')
-        if dtype != HEALTH_TYPE:
-            raise RPLidarException('Wrong response data type')
-        raw = self._read_response(dsize)
-        status = _HEALTH_STATUSES[_b2i(raw[0])]
-        error_code = (_b2i(raw[1]) << 8) + _b2i(raw[2])
-        return status, error_code
+        dsize, _, _ = _check_response(self._read_descriptor(), HEALTH_LEN, True, HEALTH_TYPE)
+        return _parse_health(self._read_response(dsize))
 
     def clean_input(self):
         """Clean input buffer by reading all available data"""
         if self.scanning[0]:
             return 'Cleaning not allowed during scanning process active !'
         self._serial.flushInput()
-        self.express_trame = 32
-        self.express_data = False
+        self._pending = None
+        self._express_last = None
+        self._chunks = []
+        self._partial = b''
 
     def stop(self):
         """Stops scanning process, disables laser diode and the measurement
@@ -344,13 +1001,8 @@ class RPLidar(object):
         else:
             self._send_cmd(cmd)
 
-        dsize, is_single, dtype = self._read_descriptor()
-        if dsize != _SCAN_TYPE[scan_type]['size']:
-            raise RPLidarException('Wrong get_info reply length')
-        if is_single:
-            raise RPLidarException('Not a multiple response mode')
-        if dtype != _SCAN_TYPE[scan_type]['response']:
-            raise RPLidarException('Wrong response data type')
+        dsize, _, _ = _check_response(self._read_descriptor(), _SCAN_TYPE[scan_type]['size'],
+                                      False, _SCAN_TYPE[scan_type]['response'])
         self.scanning = [True, dsize, scan_type]
 
     def reset(self):
@@ -361,6 +1013,77 @@ class RPLidar(object):
         time.sleep(2)
         self.clean_input()
 
+    def _read_scan(self, scan_type='normal', max_buf_meas=500, min_quality=None):
+        """Reads one complete rotation, see `read_single_measure`.
+
+        Parameters
+        ----------
+        min_quality : int, optional
+            Measures of lower quality are marked invalid (distance 0), see
+            `_filter_quality`
+
+        Returns
+        -------
+        quality, angle, distance : numpy.ndarray
+            Raw measures of the rotation in the order they were received
+        """
+        if not self.scanning[0]:
+            self.start(scan_type)
+
+        dsize = self.scanning[1]
+        if max_buf_meas and self._serial.inWaiting() > max_buf_meas:
+            self._discard_backlog(dsize)
+
+        quality, angle, distance = self._read_scan_measures(dsize)
+        if min_quality and self.scanning[2] != 'express':
+            distance = _filter_quality(quality, distance, min_quality)
+        return quality, angle, distance
+
+    def read_scan(self, scan_type='normal', max_buf_meas=500,
+                  with_quality=False, out=None, n_bins=360, reduce='last',
+                  with_count=False, min_quality=None):
+        """Reads exactly one complete rotation as numeric arrays.
+
+        Pre-requisite: start_motor before call this method
+        Auto-start the scanning process if it is not already started
+
+        Parameters
+        ----------
+        scan_type : {'normal', 'force'}
+        max_buf_meas : int or False
+            Maximum number of bytes allowed in the input buffer before the
+            stale backlog is dropped
+        with_quality : bool
+            Also return the quality of the measure kept in every bin
+        out : Scan, optional
+            Preallocated scan (see `Scan.empty`) to fill in place
+        n_bins : int
+            Number of angular bins (ignored if `out` is given)
+        reduce : {'last', 'min', 'mean', 'median', 'nearest'}
+            How the measures falling into the same bin are combined, see
+            `_bin_scan`
+        with_count : bool
+            Also return the number of valid measures in every bin
+        min_quality : int, optional
+            Drop the measures of lower quality before binning. Ignored in
+            express mode, which reports no quality.
+
+        Returns
+        -------
+        Scan
+            Distances, optional quality, validity mask and optional counts
+            for every bin, with the timing of the rotation in `info`
+        """
+        quality, angle, distance = self._read_scan(scan_type, max_buf_meas, min_quality)
+        if out is None:
+            out = Scan.empty(n_bins, with_quality, with_count)
+        if self.telemetry is None:
+            _bin_scan(angle, distance, quality, out=out, reduce=reduce)
+        else:
+            with self.telemetry.timer('scan_binning'):
+                _bin_scan(angle, distance, quality, out=out, reduce=reduce)
+        return out._replace(info=self.last_scan_info)
+
     def read_single_measure(self, scan_type='normal', max_buf_meas=500):
         """
         Pre-requisite: start_motor before call this method
@@ -370,41 +1093,8 @@ class RPLidar(object):
             Exact one complete scan cycle in csv starting with True new_scan flag
             Arranged into 360 degree data points
         """
-        if not self.scanning[0]:
-            self.start(scan_type)
-
-        dsize = self.scanning[1]
-        if max_buf_meas:
-            data_in_buf = self._serial.inWaiting()
-            if data_in_buf > max_buf_meas:
-                self.logger.warning(
-                    'Too many bytes in the input buffer: %d/%d. '
-                    'Cleaning buffer...',
-                    data_in_buf, max_buf_meas)
-                while self._serial.inWaiting() > dsize:
-                    # data_in_buf = self._serial.inWaiting()
-                    # print('Too many bytes in the input buffer: ', data_in_buf)
-                    self._read_response(dsize)  # Call this as a workaround to clean buffer
-                    # print(self.clean_input())  # This method doesn't work for RPLidar A1M8
-
-        breakFlag = False
-        line = ''
-        arr = np.empty(360, dtype=object)
-        while True:
-            raw = self._read_response(dsize)
-            new_scan, quality, angle, distance = _process_scan(raw)
-            # print('new scan:{}, angle: {}, distance: {} '.format(new_scan, angle, distance))
-            if new_scan:
-                if breakFlag:
-                    for v in arr:
-                        line += str(nvl(v, 0)) + ','
-                    return line[:-1]
-                else:
-                    arr = np.empty(360, dtype=object)
-                    arr[min(round(angle), 359)] = '{:.2f}'.format(distance)
-                    breakFlag = True
-            elif breakFlag:
-                arr[min(round(angle), 359)] = distance
+        scan = self.read_scan(scan_type, max_buf_meas)
+        return scan_to_csv(scan.distance)
 
     def iter_measures(self, scan_type='normal', max_buf_meas=3000):
         """Iterate over measures. Note that consumer must be fast enough,
@@ -435,43 +1125,16 @@ class RPLidar(object):
             self.start(scan_type)
         while True:
             dsize = self.scanning[1]
-            if max_buf_meas:
-                data_in_buf = self._serial.inWaiting()
-                if data_in_buf > max_buf_meas:
-                    self.logger.warning(
-                        'Too many bytes in the input buffer: %d/%d. '
-                        'Cleaning buffer...',
-                        data_in_buf, max_buf_meas)
-                    self.stop()
-                    self.start(self.scanning[2])
-
-            if self.scanning[2] == 'normal':
-                raw = self._read_response(dsize)
-                yield _process_scan(raw)
+            if max_buf_meas and self._serial.inWaiting() > max_buf_meas:
+                self._discard_backlog(dsize)
+
+            new_scan, quality, angle, distance = self._decode_packets(
+                self._read_packets(dsize), dsize)
             if self.scanning[2] == 'express':
-                if self.express_trame == 32:
-                    self.express_trame = 0
-                    if not self.express_data:
-                        self.logger.debug('reading first time bytes')
-                        self.express_data = ExpressPacket.from_string(
-                            self._read_response(dsize))
-
-                    self.express_old_data = self.express_data
-                    self.logger.debug('set old_data with start_angle %f',
-                                      self.express_old_data.start_angle)
-                    self.express_data = ExpressPacket.from_string(
-                        self._read_response(dsize))
-                    self.logger.debug('set new_data with start_angle %f',
-                                      self.express_data.start_angle)
-
-                self.express_trame += 1
-                self.logger.debug('process scan of frame %d with angle : '
-                                  '%f and angle new : %f', self.express_trame,
-                                  self.express_old_data.start_angle,
-                                  self.express_data.start_angle)
-                yield _process_express_scan(self.express_old_data,
-                                            self.express_data.start_angle,
-                                            self.express_trame)
+                quality = [None] * len(new_scan)
+            else:
+                quality = quality.tolist()
+            yield from zip(new_scan.tolist(), quality, angle.tolist(), distance.tolist())
 
     def iter_scans(self, scan_type='normal', max_buf_meas=3000, min_len=5):
         """Iterate over scans. Note that consumer must be fast enough,
@@ -494,15 +1157,18 @@ class RPLidar(object):
             format: (quality, angle, distance). For values description please
             refer to `iter_measures` method's documentation.
         """
-        scan_list = []
-        iterator = self.iter_measures(scan_type, max_buf_meas)
-        for new_scan, quality, angle, distance in iterator:
-            if new_scan:
-                if len(scan_list) > min_len:
-                    yield scan_list
-                scan_list = []
-            if distance > 0:
-                scan_list.append((quality, angle, distance))
+        self.start_motor()
+        if not self.scanning[0]:
+            self.start(scan_type)
+        while True:
+            dsize = self.scanning[1]
+            if max_buf_meas and self._serial.inWaiting() > max_buf_meas:
+                self._discard_backlog(dsize)
+            quality, angle, distance = self._read_scan_measures(dsize)
+            valid = distance > 0
+            if np.count_nonzero(valid) > min_len:
+                yield list(zip(quality[valid].tolist(), angle[valid].tolist(),
+                               distance[valid].tolist()))
 
 
 class ExpressPacket(namedtuple('express_packet',
@@ -513,26 +1179,11 @@ class ExpressPacket(namedtuple('express_packet',
 
     @classmethod
     def from_string(cls, data):
-        packet = bytearray(data)
-
-        if (packet[0] >> 4) != cls.sync1 or (packet[1] >> 4) != cls.sync2:
-            raise ValueError('try to parse corrupted data ({})'.format(packet))
-
-        checksum = 0
-        for b in packet[2:]:
-            checksum ^= b
-        if checksum != (packet[0] & 0b00001111) + ((packet[1] & 0b00001111) << 4):
-            raise ValueError('Invalid checksum ({})'.format(packet))
-
-        new_scan = packet[3] >> 7
-        start_angle = (packet[2] + ((packet[3] & 0b01111111) << 8)) / 64
-
-        d = a = ()
-        for i in range(0, 80, 5):
-            d += ((packet[i + 4] >> 2) + (packet[i + 5] << 6),)
-            a += (((packet[i + 8] & 0b00001111)
-                   + ((packet[i + 4] & 0b00000001) << 4)) / 8 * cls.sign[(packet[i + 4] & 0b00000010) >> 1],)
-            d += ((packet[i + 6] >> 2) + (packet[i + 7] << 6),)
-            a += (((packet[i + 8] >> 4)
-                   + ((packet[i + 6] & 0b00000001) << 4)) / 8 * cls.sign[(packet[i + 6] & 0b00000010) >> 1],)
-        return cls(d, a, new_scan, start_angle)
+        try:
+            new_scan, start_angle, distance, angle = _process_express_bulk(data[:84])
+        except RPLidarException as err:
+            raise ValueError('try to parse corrupted data ({}): {}'.format(bytearray(data), err))
+        if len(new_scan) != 1:
+            raise ValueError('try to parse corrupted data ({})'.format(bytearray(data)))
+        return cls(tuple(distance[0].tolist()), tuple(angle[0].tolist()),
+                   int(new_scan[0]), float(start_angle[0]))
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""Binary scan recordings written by a background thread.
+
+A recording is a small header followed by chunks of fixed-size records:
+
+    b'LIDREC01' | uint32 header length | header (JSON schema)
+    b'CHNK' | uint32 record count | records ...
+    b'CHNK' | ...
+
+Every record holds the monotonic timestamp of the scan, the distances as
+uint16 in quarter millimetres (the sensor's own resolution, so nothing is
+lost), the turn and speed at the time of the scan and optionally the quality
+of every bin and the timing of the rotation (monotonic times of its first
+and last measure, sample and invalid sample counts). A chunk cut short by a
+crash is read up to its last whole record.
+
+Converts a recording to the 361-column csv format used by the visualizer;
+the quality of the bins, if recorded, goes to a .quality.npy file next to
+the csv (see `quality_path`). Usage example:
+
+$ ./scan_recording.py out.bin out.txt"""
+import json
+import os
+import queue
+import struct
+import sys
+import threading
+
+import numpy as np
+
+from rplidar import scan_to_csv
+
+MAGIC = b'LIDREC01'
+CHUNK_MAGIC = b'CHNK'
+VERSION = 1
+# distances are stored as uint16 in 1/DISTANCE_SCALE millimetres
+DISTANCE_SCALE = 4
+
+
+TIMING_FIELDS = [('scan_start', '<f8'), ('scan_end', '<f8'), ('samples', '<u2'),
+                 ('invalid', '<u2')]
+
+
+def record_dtype(n_bins=360, with_quality=False, with_timing=False):
+    """Returns the numpy dtype of one record"""
+    fields = [('timestamp', '<f8'), ('distance', '<u2', (n_bins,)),
+              ('turn', '<f4'), ('speed', '<f4')]
+    if with_quality:
+        fields.append(('quality', 'u1', (n_bins,)))
+    if with_timing:
+        fields.extend(TIMING_FIELDS)
+    return np.dtype(fields)
+
+
+def _schema(dtype, n_bins):
+    return {'version': VERSION, 'n_bins': n_bins, 'distance_scale': DISTANCE_SCALE,
+            'record_size': dtype.itemsize,
+            'fields': [[name, dtype.fields[name][0].base.str,
+                        list(dtype.fields[name][0].shape)] for name in dtype.names]}
+
+
+class ScanRecorder(object):
+    """Appends scans to a binary recording without blocking the caller.
+
+    `write` only puts the scan on a bounded queue; a writer thread packs the
+    records into chunks of `chunk_records` and writes each chunk with a
+    single call. A partial chunk is written as soon as the queue runs dry
+    for `flush_interval` seconds, so little is lost if the car loses power.
+    When the queue is full the scan is dropped and counted in `dropped`
+    rather than stalling the control loop.
+    """
+
+    def __init__(self, path, n_bins=360, with_quality=False, chunk_records=64,
+                 queue_size=256, flush_interval=0.5, with_timing=False):
+        self.path = path
+        self.n_bins = n_bins
+        self.with_quality = with_quality
+        self.with_timing = with_timing
+        self.dtype = record_dtype(n_bins, with_quality, with_timing)
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self._chunk = np.zeros(chunk_records, dtype=self.dtype)
+        self._count = 0
+        self._queue = queue.Queue(queue_size)
+        self._file = open(path, 'wb')
+        header = json.dumps(_schema(self.dtype, n_bins)).encode('ascii')
+        self._file.write(MAGIC + struct.pack('<I', len(header)) + header)
+        self._thread = threading.Thread(target=self._run, name='scan-recorder', daemon=True)
+        self._thread.start()
+
+    def write(self, timestamp, distance, turn=0., speed=0., quality=None, info=None):
+        """Queues one scan. Returns False if it was dropped.
+
+        `info` is the rplidar.ScanInfo of the scan, written when the recorder
+        was created `with_timing`.
+
+        The arrays are packed later by the writer thread, so they must not
+        be modified after the call.
+        """
+        try:
+            self._queue.put_nowait((timestamp, distance, turn, speed, quality, info))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._flush()
+                continue
+            if item is None:
+                break
+            self._add(*item)
+        self._flush()
+
+    def _add(self, timestamp, distance, turn, speed, quality, info):
+        chunk, i = self._chunk, self._count
+        chunk['timestamp'][i] = timestamp
+        np.multiply(distance, DISTANCE_SCALE, out=chunk['distance'][i], casting='unsafe')
+        chunk['turn'][i] = turn
+        chunk['speed'][i] = speed
+        if self.with_quality:
+            chunk['quality'][i] = quality if quality is not None else 0
+        if self.with_timing:
+            if info is None:
+                info = (0., 0., 0, 0)
+            start_time, end_time, samples, invalid = info
+            chunk['scan_start'][i] = start_time
+            chunk['scan_end'][i] = end_time
+            chunk['samples'][i] = min(samples, 0xffff)
+            chunk['invalid'][i] = min(invalid, 0xffff)
+        self._count += 1
+        if self._count == len(self._chunk):
+            self._flush()
+
+    def _flush(self):
+        if not self._count:
+            return
+        self._file.write(CHUNK_MAGIC + struct.pack('<I', self._count))
+        self._file.write(self._chunk[:self._count].tobytes())
+        self._file.flush()
+        self.written += self._count
+        self._count = 0
+
+    def close(self):
+        """Writes the queued scans and closes the file"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self._file.close()
+
+
+def read_header(f):
+    """Reads the header of an open recording and returns the schema dict"""
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError('Not a scan recording')
+    size, = struct.unpack('<I', f.read(4))
+    return json.loads(f.read(size).decode('ascii'))
+
+
+def read_recording(path):
+    """Reads a recording.
+
+    Returns
+    -------
+    header : dict
+        The schema stored in the file
+    records : numpy.ndarray
+        Structured array with the fields of `record_dtype`; distances are
+        still in 1/distance_scale mm
+    """
+    with open(path, 'rb') as f:
+        header = read_header(f)
+        data = f.read()
+    names = [name for name, _, _ in header['fields']]
+    dtype = record_dtype(header['n_bins'], 'quality' in names, 'scan_start' in names)
+    if dtype.itemsize != header['record_size']:
+        raise ValueError('Unsupported record layout')
+    chunks = []
+    pos = 0
+    while pos + 8 <= len(data):
+        if data[pos:pos + 4] != CHUNK_MAGIC:
+            raise ValueError('Corrupted chunk at byte %d' % pos)
+        count, = struct.unpack_from('<I', data, pos + 4)
+        pos += 8
+        available = (len(data) - pos) // dtype.itemsize
+        chunks.append(np.frombuffer(data, dtype, min(count, available), pos))
+        if count > available:
+            break  # truncated last chunk
+        pos += count * dtype.itemsize
+    records = np.concatenate(chunks) if chunks else np.zeros(0, dtype)
+    return header, records
+
+
+def distances_mm(header, records):
+    """Returns the distances of `records` as a float32 (n, n_bins) array"""
+    return records['distance'].astype(np.float32) / header['distance_scale']
+
+
+def quality_path(csv_path):
+    """Path of the quality file of a csv recording: the quality of every bin
+    of every line as a (lines, n_bins) uint8 .npy array"""
+    return os.path.splitext(csv_path)[0] + '.quality.npy'
+
+
+def convert_to_csv(src, dst):
+    """Writes a recording as csv lines of distances followed by the turn,
+    and the quality of the bins to `quality_path(dst)` if it was recorded.
+    Returns the number of lines written."""
+    header, records = read_recording(src)
+    distances = distances_mm(header, records)
+    with open(dst, 'w') as f:
+        for distance, turn in zip(distances, records['turn']):
+            f.write(scan_to_csv(distance) + ",{:.2f}\n".format(turn))
+    if 'quality' in records.dtype.names:
+        np.save(quality_path(dst), records['quality'])
+    return len(records)
+
+
+if __name__ == '__main__':
+    print('%d scans written to %s' % (convert_to_csv(sys.argv[1], sys.argv[2]), sys.argv[2]))
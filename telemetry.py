@@ -0,0 +1,161 @@
+"""Lightweight latency instrumentation for the driving loop.
+
+Every stage records its durations into a rolling window kept in a
+preallocated NumPy array, so recording a sample is a single array store and
+can stay enabled on the car. Percentiles are only computed when metrics are
+read or exported.
+
+Usage example:
+
+>>> telemetry = Telemetry()
+>>> with telemetry.timer('inference'):
+...     turn = predictor.predict(scan)
+>>> telemetry.snapshot()['inference']['p95']
+>>> MetricsExporter(telemetry, 'car_metrics.prom').start()
+
+The exported file is in the Prometheus text format, one sample per line:
+
+    car_stage_latency_seconds{stage="inference",quantile="0.95"} 0.000412
+
+Stage boundaries stored with mark() are exported as the seconds since they
+were last crossed, which shows a stalled stage:
+
+    car_stage_mark_age_seconds{mark="prediction"} 0.012000000
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class LatencyHistogram(object):
+    """Rolling window of the last `window` latency samples in seconds"""
+
+    def __init__(self, window=1024):
+        self._samples = np.zeros(window)
+        self.count = 0
+        self.total = 0.
+
+    def record(self, seconds):
+        self._samples[self.count % len(self._samples)] = seconds
+        self.count += 1
+        self.total += seconds
+
+    def summary(self):
+        """Returns count, mean, p50, p95, p99 and max of the current window"""
+        samples = self._samples[:min(self.count, len(self._samples))]
+        if not len(samples):
+            return {'count': 0, 'mean': 0., 'p50': 0., 'p95': 0., 'p99': 0., 'max': 0.}
+        p50, p95, p99 = np.percentile(samples, [q * 100 for q in QUANTILES])
+        return {'count': self.count, 'mean': float(samples.mean()), 'p50': float(p50),
+                'p95': float(p95), 'p99': float(p99), 'max': float(samples.max())}
+
+
+class _Timer(object):
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.record(time.monotonic() - self.start)
+
+
+class Telemetry(object):
+    """Named latency histograms, stage-boundary timestamps and gauges"""
+
+    def __init__(self, window=1024):
+        self.window = window
+        self.histograms = {}
+        self.marks = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, LatencyHistogram(self.window))
+        return histogram
+
+    def record(self, name, seconds):
+        """Adds one latency sample (seconds) to the histogram `name`"""
+        self.histogram(name).record(seconds)
+
+    def timer(self, name):
+        """Context manager recording the duration of its block"""
+        return _Timer(self.histogram(name))
+
+    def mark(self, name, timestamp=None):
+        """Stores the monotonic time a stage boundary was crossed"""
+        if timestamp is None:
+            timestamp = time.monotonic()
+        self.marks[name] = timestamp
+        return timestamp
+
+    def gauge(self, name, func):
+        """Registers a callable whose value is exported as `name`"""
+        self._gauges[name] = func
+
+    def snapshot(self):
+        """Returns the summary of every histogram, keyed by name"""
+        return {name: histogram.summary() for name, histogram in list(self.histograms.items())}
+
+    def format_metrics(self, prefix='car'):
+        """Renders all metrics as Prometheus text format lines"""
+        lines = []
+        metric = prefix + '_stage_latency_seconds'
+        for name, summary in sorted(self.snapshot().items()):
+            for q in QUANTILES:
+                lines.append('%s{stage="%s",quantile="%g"} %.9f'
+                             % (metric, name, q, summary['p%d' % round(q * 100)]))
+            lines.append('%s_max{stage="%s"} %.9f' % (metric, name, summary['max']))
+            lines.append('%s_count{stage="%s"} %d' % (metric, name, summary['count']))
+            lines.append('%s_sum{stage="%s"} %.9f'
+                         % (metric, name, self.histograms[name].total))
+        now = time.monotonic()
+        for name, timestamp in sorted(self.marks.items()):
+            lines.append('%s_stage_mark_age_seconds{mark="%s"} %.9f'
+                         % (prefix, name, now - timestamp))
+        for name, func in sorted(self._gauges.items()):
+            try:
+                lines.append('%s_%s %s' % (prefix, name, float(func())))
+            except Exception:
+                continue  # a broken gauge must not stop the export
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsExporter(threading.Thread):
+    """Periodically writes the metrics of a Telemetry to a text file.
+
+    The file is replaced atomically so scrapers never read a partial file.
+    """
+
+    def __init__(self, telemetry, path, interval=5.0, prefix='car'):
+        super().__init__(name='metrics-exporter', daemon=True)
+        self.telemetry = telemetry
+        self.path = path
+        self.interval = interval
+        self.prefix = prefix
+        self._stop_event = threading.Event()
+
+    def export(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.telemetry.format_metrics(self.prefix))
+        os.replace(tmp_path, self.path)
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.export()
+        self.export()
+
+    def stop(self):
+        self._stop_event.set()
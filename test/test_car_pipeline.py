@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Test the threaded driving pipeline with stand-ins for the car hardware
+"""
+
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from car_pipeline import DrivePipeline, Mailbox, Pipeline
+
+BUTTONS = {'y': 0, 'b': 0, 'a': 0, 'x': 0, 'L1': 0, 'R1': 0, 'L2': 0, 'R2': 0,
+           'axis0': 0., 'axis1': 0., 'hat0': 0., 'hat1': 0.}
+
+
+class FakeMotor:
+    def __init__(self):
+        self.commands = []
+
+    def move(self, speed, turn, t=0):
+        self.commands.append((time.monotonic(), speed, turn))
+
+    def stop(self, t=0):
+        self.commands.append((time.monotonic(), 0, 0))
+
+
+class FakeLidarControl:
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.recorded = 0
+        self.stopped = False
+
+    def read_line(self):
+        time.sleep(0.01)  # one rotation
+        return np.full(360, 1000., dtype=np.float32)
+
+    def record_line(self):
+        self.recorded += 1
+        return self.read_line()
+
+    def stop_record(self):
+        self.stopped = True
+
+
+def test_mailbox_keeps_latest_value():
+    """Readers see the newest value and can wait for the next one"""
+    box = Mailbox()
+    assert box.get() == (0, None)
+    box.put(1)
+    box.put(2)
+    assert box.get() == (2, 2)
+    assert box.wait_newer(2, timeout=0.01) is None
+
+    threading.Timer(0.02, box.put, args=(3,)).start()
+    assert box.wait_newer(2, timeout=1) == (3, 3)
+    print("✓ Mailbox keeps the latest value")
+
+
+def test_fixed_rate_stage():
+    """A fixed-rate stage ticks at its rate without drifting"""
+    pipeline = Pipeline()
+    stage = pipeline.add_stage('tick', lambda: None, rate_hz=100)
+    pipeline.start()
+    time.sleep(0.3)
+    pipeline.stop()
+    pipeline.join()
+    assert 20 <= stage.ticks <= 40, stage.ticks
+    print(f"✓ Fixed-rate stage ticked {stage.ticks} times in 0.3 s at 100 Hz")
+
+
+def test_drive_pipeline_modes_and_shutdown():
+    """Self-driving uses the newest prediction and 'x' shuts everything down"""
+    joystick = dict(BUTTONS)
+    motor = FakeMotor()
+    lidars = []
+
+    def lidar_factory(metrics):
+        lidars.append(FakeLidarControl(metrics))
+        return lidars[-1]
+
+    pipeline = DrivePipeline(motor, lambda: joystick, lidar_factory,
+                             predict=lambda scan: 0.5, actuator_rate=50)
+    runner = threading.Thread(target=pipeline.run, daemon=True)
+    runner.start()
+
+    joystick['axis1'] = 0.6
+    time.sleep(0.1)
+    assert motor.commands[-1][1:] == (0.6, 0.)
+    assert not lidars  # the lidar is only started when needed
+
+    joystick['axis1'] = 0.
+    joystick['L2'] = 1
+    time.sleep(0.2)
+    joystick['L2'] = 0
+    assert len(lidars) == 1
+    assert motor.commands[-1][1:] == (-0.9, 0.5)
+
+    joystick['b'] = 1
+    time.sleep(0.1)
+    joystick['b'] = 0
+    assert lidars[0].recorded > 0
+
+    joystick['x'] = 1
+    runner.join(2)
+    assert not runner.is_alive()
+    assert lidars[0].stopped
+    assert motor.commands[-1][1:] == (0, 0)
+    marks = pipeline.telemetry.marks
+    assert sorted(marks) == ['actuation', 'prediction', 'scan']
+    assert max(marks.values()) <= time.monotonic()
+
+    ticks = [t for t, _, _ in motor.commands]
+    rate = (len(ticks) - 1) / (ticks[-1] - ticks[0])
+    assert 30 < rate < 70, rate
+    print(f"✓ Drive pipeline switched modes and shut down, actuator at {rate:.0f} Hz")
+
+
+def test_stale_prediction_stops_the_car():
+    """Without fresh predictions the car does not keep driving"""
+    joystick = dict(BUTTONS, L2=1)
+    motor = FakeMotor()
+
+    class StalledLidarControl(FakeLidarControl):
+        def read_line(self):
+            time.sleep(0.3)
+            return np.zeros(360, dtype=np.float32)
+
+    pipeline = DrivePipeline(motor, lambda: joystick, StalledLidarControl,
+                             predict=lambda scan: 0.5, max_prediction_age=0.1)
+    pipeline.start()
+    time.sleep(0.2)
+    assert all(speed == 0 for _, speed, _ in motor.commands)
+    assert 'prediction' not in pipeline.telemetry.marks and 'actuation' in pipeline.telemetry.marks
+    pipeline.stop()
+    pipeline.join()
+    print("✓ Car stops when no fresh prediction is available")
+
+
+if __name__ == "__main__":
+    test_mailbox_keeps_latest_value()
+    test_fixed_rate_stage()
+    test_drive_pipeline_modes_and_shutdown()
+    test_stale_prediction_stops_the_car()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Test that the array-based forest engine matches sklearn predictions
+"""
+
+import os
+import pickle
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from compiled_forest import CompiledForest, compile_model, load_compiled_forest
+
+
+def make_data(seed=0, n=300, k=30):
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(0, 4000, (n, k)).astype(np.float32)
+    X[rng.random(X.shape) < 0.2] = 0  # invalid readings, like real scans
+    y = np.tanh((X[:, 3] - X[:, 20]) / 2000) + rng.normal(0, 0.05, n)
+    return X, y
+
+
+def test_matches_sklearn_models():
+    """Single samples and batches agree with model.predict"""
+    from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+    from sklearn.tree import DecisionTreeRegressor
+
+    X, y = make_data()
+    X_test, _ = make_data(seed=1, n=100)
+    models = [RandomForestRegressor(n_estimators=25, random_state=42),
+              ExtraTreesRegressor(n_estimators=10, random_state=42),
+              DecisionTreeRegressor(max_depth=6, random_state=42)]
+    for model in models:
+        model.fit(X, y)
+        forest = CompiledForest.from_sklearn(model)
+        expected = model.predict(X_test)
+        assert np.allclose(forest.predict(X_test), expected, rtol=0, atol=1e-12)
+        assert np.allclose(forest.predict(X_test[0]), expected[:1], rtol=0, atol=1e-12)
+        # thresholds hit exactly must follow sklearn's <= rule
+        assert np.allclose(forest.predict(X), model.predict(X), rtol=0, atol=1e-12)
+        print(f"✓ {type(model).__name__} matches sklearn")
+
+
+def test_save_load_and_trainer_pickles():
+    """Compiled forests survive save/load and trainer pickles are accepted"""
+    from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+    X, y = make_data(2)
+    model = RandomForestRegressor(n_estimators=5, random_state=0).fit(X, y)
+    indices = np.arange(30) * 2
+    with tempfile.TemporaryDirectory() as tmp:
+        npz_path = os.path.join(tmp, 'forest.npz')
+        CompiledForest.from_sklearn(model).save(npz_path)
+        loaded, no_indices = load_compiled_forest(npz_path)
+        assert no_indices is None
+        assert np.allclose(loaded.predict(X), model.predict(X))
+
+        pkl_path = os.path.join(tmp, 'model.pkl')
+        with open(pkl_path, 'wb') as f:
+            pickle.dump({'model': model, 'feature_indices': indices}, f)
+        forest, feature_indices = load_compiled_forest(pkl_path)
+        assert np.array_equal(feature_indices, indices)
+        assert np.allclose(forest.predict(X), model.predict(X))
+
+    classifier = RandomForestClassifier(n_estimators=3).fit(X, y > 0)
+    assert compile_model(classifier) is None
+    assert compile_model(object()) is None
+    try:
+        forest.predict(X[:, :10])
+        assert False, "feature count mismatch not detected"
+    except ValueError:
+        pass
+    print("✓ Save/load and trainer pickles work")
+
+
+def test_visualizer_uses_trainer_feature_indices(tmp_path, monkeypatch):
+    """The visualizer feeds a trainer model the features it selected and
+    refuses a trainer pickle without them"""
+    import pytest
+    pytest.importorskip('matplotlib')  # imported by the visualizer package
+    from sklearn.ensemble import RandomForestRegressor
+    from visualizer import ai_model
+
+    X, y = make_data(3)
+    model = RandomForestRegressor(n_estimators=5, random_state=0).fit(X, y)
+    indices = np.arange(30) * 7
+    scan = np.zeros(360, dtype=np.float32)
+    scan[indices] = X[0]
+    path = str(tmp_path / 'model.pkl')
+    with open(path, 'wb') as f:
+        pickle.dump({'model': model, 'feature_indices': indices}, f)
+    manager = ai_model.AIModelManager()
+    assert manager.load_model(path)
+    assert np.array_equal(manager.prepare_input_data(scan), X[0])
+    assert np.isclose(manager.predict_direction(scan), model.predict(X[:1])[0])
+
+    errors = []
+    monkeypatch.setattr(ai_model.messagebox, 'showerror', lambda *args: errors.append(args))
+    with open(path, 'wb') as f:
+        pickle.dump({'model': model}, f)
+    assert not manager.load_model(path)
+    assert errors and not manager.is_model_loaded()
+    print("✓ Trainer models get their selected features")
+
+
+if __name__ == "__main__":
+    test_matches_sklearn_models()
+    test_save_load_and_trainer_pickles()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test the progressive background loading of data files
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+pytest.importorskip('matplotlib')  # imported by the visualizer package
+
+from visualizer import config, file_loader
+from visualizer.data_input import DataManager, LazyLines
+from visualizer.file_loader import FileLoader
+from visualizer.frame_store import FrameStore
+
+
+def frame_line(distance, label):
+    return ','.join([str(distance)] * 360 + [str(label)]) + '\n'
+
+
+def write_frames(path, n, final_newline=True):
+    header = ','.join(['lidar_%d' % i for i in range(360)] + ['angular_velocity']) + '\n'
+    lines = [header] + [frame_line(1000 + i, i) for i in range(n)]
+    text = ''.join(lines)
+    with open(path, 'w') as f:
+        f.write(text if final_newline else text.rstrip('\n'))
+    return text.splitlines(keepends=True) if final_newline else text.rstrip('\n').splitlines(True)
+
+
+def open_progressive(path, tmp_path, monkeypatch, lazy=False):
+    monkeypatch.setattr(config, 'LOAD_BLOCK_MB', 16 / 1024)  # about 8 frames
+    return DataManager(path, str(tmp_path / '_out.txt'), False, lazy=lazy, progressive=True)
+
+
+def load(loader, timeout=10.0):
+    end = time.monotonic() + timeout
+    while loader.poll():
+        assert time.monotonic() < end, 'timed out'
+        time.sleep(0.01)
+
+
+def test_first_frames_then_the_rest(tmp_path, monkeypatch):
+    """The first frames are there at once, the loader adds the others"""
+    path = str(tmp_path / 'out.txt')
+    expected = write_frames(path, 200, final_newline=False)
+    manager = open_progressive(path, tmp_path, monkeypatch)
+    assert manager.loading and not manager.fully_loaded
+    assert 1 < len(manager.lines) < 20 and manager._data_start_line == 1
+    assert manager.dataframe[360] == '0'
+    assert manager.frame_table().labels.tolist() == list(range(len(manager.lines) - 1))
+
+    loader = FileLoader(manager, 4096)
+    counts = []
+    while loader.poll():
+        counts.append(len(manager.lines))
+        manager.next()
+        time.sleep(0.001)
+    assert counts == sorted(counts) and loader.done and loader.progress == 1
+    assert manager.fully_loaded and isinstance(manager.lines, FrameStore)
+    assert list(manager.lines) == expected
+    assert manager.frame_table().labels[-1] == 199
+    assert manager.save_to_original_file()
+    manager.close()
+    print("✓ First frames shown at once, the rest loaded in the background")
+
+
+def test_edits_while_loading(tmp_path, monkeypatch):
+    """Lines changed before the loading ends stay read from the file"""
+    path = str(tmp_path / 'out.txt')
+    expected = write_frames(path, 100)
+    manager = open_progressive(path, tmp_path, monkeypatch, lazy=False)
+    manager.update_current_frame(manager.dataframe[:360] + ['0.5'])
+    del manager.lines[2]
+    del expected[2]
+    loader = FileLoader(manager, 4096)
+    load(loader)
+    assert isinstance(manager.lines, LazyLines)
+    assert list(manager.lines[2:]) == expected[2:] and len(manager.lines) == 100
+    assert manager.frame(1)[0][0] == 1000 and manager.frame(1)[1] == 0.5
+    assert manager.frame_table().labels[:2].tolist() == [0.5, 2]
+    manager.close()
+    print("✓ Edits made while loading are kept")
+
+
+def test_cancel_keeps_indexed_frames(tmp_path, monkeypatch):
+    """A cancelled load keeps the frames indexed so far and cannot be saved"""
+    path = str(tmp_path / 'out.txt')
+    write_frames(path, 400)
+    manager = open_progressive(path, tmp_path, monkeypatch, lazy=True)
+    indexed = len(manager.lines)
+
+    # hold the worker in its second block until the load is cancelled
+    in_block = threading.Event()
+    cancelled = threading.Event()
+    line_ends = file_loader.line_ends
+    blocks = []
+
+    def held_line_ends(data, start, stop):
+        blocks.append(start)
+        if len(blocks) == 2:
+            in_block.set()
+            cancelled.wait(5)
+        return line_ends(data, start, stop)
+    monkeypatch.setattr(file_loader, 'line_ends', held_line_ends)
+
+    loader = FileLoader(manager, 4096)
+    assert in_block.wait(5)
+    loader.cancel()
+    cancelled.set()
+    loader.join(5)
+    assert not loader._thread.is_alive() and len(blocks) == 2
+    assert loader.cancelled and not manager.loading and not manager.fully_loaded
+    assert indexed <= len(manager.lines) < 401
+    assert not loader.poll() and manager.frame_table().labels[0] == 0
+    assert not manager.save_to_original_file()
+    with open(path) as f:
+        assert len(f.readlines()) == 401
+    manager.close()
+    print("✓ Cancelled load keeps the indexed frames")
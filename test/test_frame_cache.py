@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test the parsed-frame sidecar cache of the visualizer
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+pytest.importorskip('matplotlib')  # imported by the visualizer package
+
+from visualizer import frame_cache
+from visualizer.frame_cache import cache_paths, load_frame_table
+
+
+def frame_line(distance, label, invalid=()):
+    values = [str(distance)] * 360 + [str(label)]
+    for i, value in invalid:
+        values[i] = value
+    return ','.join(values) + '\n'
+
+
+def write_frames(path, lines):
+    with open(path, 'w') as f:
+        f.writelines(lines)
+
+
+def test_parse_and_cache(tmp_path, monkeypatch):
+    """The file is parsed once, later loads memory-map the sidecar"""
+    path = str(tmp_path / 'out.txt')
+    write_frames(path, [frame_line(1000, 0.5),
+                        frame_line(1200.25, -0.3, invalid=[(3, '0'), (4, 'inf'), (5, '')]),
+                        '1,2,3\n',
+                        frame_line(800, 'nan')])
+    table = load_frame_table(path)
+    assert len(table) == 4 and all(os.path.exists(p) for p in cache_paths(path))
+    assert table.complete.tolist() == [True, True, False, True]
+    assert table.frames[1, 0] == 1200.25 and np.isclose(table.labels[1], -0.3)
+    assert np.isnan(table.frames[1, 5]) and np.all(np.isnan(table.frames[2]))
+    assert table.valid_counts().tolist() == [360, 357, 0, 360]
+    assert np.flatnonzero(~table.valid(1)).tolist() == [3, 4, 5]
+
+    def no_parse(*args):
+        raise AssertionError('parsed again')
+
+    monkeypatch.setattr(frame_cache, '_parse_chunk', no_parse)
+    cached = load_frame_table(path)
+    assert isinstance(cached.frames, np.memmap)
+    assert np.array_equal(cached.frames, table.frames, equal_nan=True)
+
+    # only the modification time changed: the content hash keeps the cache
+    os.utime(path, ns=(0, 0))
+    assert np.array_equal(load_frame_table(path).valid_counts(), table.valid_counts())
+    print("✓ Frames parsed once and memory-mapped afterwards")
+
+
+def test_cache_invalidated_by_changes(tmp_path):
+    """Any change of the content or of the header rebuilds the table"""
+    path = str(tmp_path / 'out.txt')
+    write_frames(path, [frame_line(1000, 0.5), frame_line(1000, 0.5)])
+    stat = os.stat(path)
+    assert load_frame_table(path).labels.tolist() == [0.5, 0.5]
+
+    # same size and modification time, only the hash tells
+    write_frames(path, [frame_line(1000, 0.5), frame_line(2000, 0.5)])
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert load_frame_table(path).frames[1, 0] == 2000
+
+    write_frames(path, [frame_line(1000, 0.5)] * 3)
+    assert len(load_frame_table(path)) == 3
+    assert len(load_frame_table(path, skip=1)) == 2
+    print("✓ Frame cache invalidated when the file changes")
+
+
+def test_data_manager_frame_table(tmp_path):
+    """The frames of DataManager follow the edits of its lines"""
+    from visualizer.data_input import DataManager
+    from visualizer.data_statistics import DataAnalyzer
+
+    path = str(tmp_path / 'out.txt')
+    header = ','.join(['lidar_%d' % i for i in range(360)] + ['angular_velocity']) + '\n'
+    write_frames(path, [header] + [frame_line(1000 + i, i / 10) for i in range(4)])
+    manager = DataManager(path, str(tmp_path / '_out.txt'), False)
+    table = manager.frame_table()
+    assert len(table) == 4 and table.frames[0, 0] == 1000
+
+    manager.lines[2] = frame_line(500, 0.9, invalid=[(0, '0')])
+    table = manager.frame_table()
+    assert table.frames[1, 1] == 500 and np.isclose(table.labels[1], 0.9)
+    assert table.valid_counts(1) == 359
+    assert load_frame_table(path, skip=1).frames[1, 1] == 1001  # cache untouched
+
+    del manager.lines[1]
+    assert manager.frame_table().frames[:, 1].tolist() == [500, 1002, 1003]
+
+    stats = DataAnalyzer().analyze_data_file(path)
+    assert stats['has_headers'] and stats['total_frames'] == 4
+    assert stats['total_invalid_count'] == 0
+    assert np.allclose(stats['angular_velocities'], [0, 0.1, 0.2, 0.3])
+    manager.close()
+    print("✓ DataManager frames follow the edits")
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test the parsed-frame LRU cache and prefetcher of DataManager
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+pytest.importorskip('matplotlib')  # imported by the visualizer package
+
+from visualizer.data_input import DataManager
+from visualizer.frame_lru import FrameLRU, FramePrefetcher, split_line, values_size
+
+
+def frame_line(distance, label):
+    return ','.join([str(distance)] * 360 + [str(label)]) + '\n'
+
+
+def wait_for(condition, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, 'timed out'
+        time.sleep(0.005)
+
+
+def test_lru_budget_and_versions():
+    """Least recently used frames are evicted, a new version empties the cache"""
+    values = split_line(frame_line(1000, 0.5))
+    size = values_size(values)
+    cache = FrameLRU(3 * size)
+    cache.sync(0)
+    for i in range(3):
+        cache.put(i, values, 0)
+    assert cache.get(0) == values and cache.get(5) is None
+    cache.put(3, values, 0)
+    assert 1 not in cache and 0 in cache and len(cache) == 3 and cache.nbytes == 3 * size
+
+    copy = cache.get(3)
+    copy[360] = 'changed'
+    assert cache.get(3)[360] == '0.5'
+    cache.put(4, values, version=1)  # parsed from other lines
+    assert 4 not in cache
+    cache.sync(1)
+    assert len(cache) == 0 and cache.nbytes == 0
+    assert cache.stats()['hits'] == 3 and cache.stats()['misses'] == 1
+    print("✓ LRU budget, copies and versions")
+
+
+def test_prefetcher_parses_ahead():
+    """The worker parses the next frames in the requested direction"""
+    lines = [frame_line(1000 + i, 0) for i in range(20)]
+    cache = FrameLRU(1 << 24)
+    cache.sync(0)
+    prefetcher = FramePrefetcher(cache, lines.__getitem__, 4)
+    prefetcher.request(10, -1, -1, 0)
+    wait_for(lambda: prefetcher.prefetched == 4)
+    assert sorted(cache._frames) == [6, 7, 8, 9]
+    prefetcher.request(17, 1, len(lines), 0)
+    wait_for(lambda: prefetcher.prefetched == 6)
+    assert 18 in cache and 19 in cache and 20 not in cache
+    prefetcher.close()
+    assert not prefetcher._thread.is_alive()
+    print("✓ Prefetcher parses ahead of navigation")
+
+
+def test_data_manager_navigation_hits(tmp_path):
+    """Playback and stepping back find their frames in the cache"""
+    path = str(tmp_path / 'out.txt')
+    with open(path, 'w') as f:
+        f.writelines(frame_line(1000 + i, i) for i in range(60))
+    manager = DataManager(path, str(tmp_path / '_out.txt'), False)
+    for i in range(30):
+        assert manager.dataframe[360] == str(i)
+        wait_for(lambda: i + 1 in manager.frame_lru or i + 1 >= 60)
+        manager.next()
+    for i in reversed(range(30)):
+        manager.prev()
+        assert manager.dataframe[360] == str(i)
+    stats = manager.frame_cache_stats()
+    assert stats['misses'] == 1 and stats['hits'] == 59 and stats['prefetched'] >= 29
+
+    # edits are seen at once and the frame is parsed again
+    manager.dataframe[360] = 'not saved'
+    manager.update_current_frame(manager.dataframe[:360] + ['0.5'])
+    manager.next()
+    manager.prev()
+    assert manager.dataframe[360] == '0.5'
+    manager.close()
+    print("✓ DataManager navigation served from the cache")
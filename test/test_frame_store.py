@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Test the compact frame store behind the in-memory DataManager
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+pytest.importorskip('matplotlib')  # imported by the visualizer package
+
+from visualizer.data_input import DataManager, LazyLines
+from visualizer.frame_cache import FrameTable
+from visualizer.frame_store import FrameStore, format_frame, parse_frame
+
+
+def frame_line(distances, label):
+    return ','.join([str(d) for d in distances] + [str(label)]) + '\n'
+
+
+def make_store(lines):
+    table = FrameTable.from_lines(lines)
+    return FrameStore(table, lines_source(lines))
+
+
+def values(lines):
+    """Numbers of the frame lines, text of the others"""
+    result = []
+    for line in lines:
+        try:
+            distances, label = parse_frame(line)
+            result.append(distances.tolist() + [float(label)])
+        except ValueError:
+            result.append(line)
+    return result
+
+
+class lines_source(list):
+    """Stand-in for the LazyLines of a file"""
+
+    def close(self):
+        pass
+
+
+def test_quantized_store_round_trip():
+    """Quarter-millimetre distances are stored as uint16, text comes back unchanged"""
+    rng = np.random.default_rng(0)
+    lines = [frame_line(rng.integers(0, 4 * 12000, 360) / 4, round(i * 0.37 - 2, 3))
+             for i in range(50)]
+    lines[10] = frame_line([0.0, 0] + [500.25] * 358, 0.1)
+    lines.insert(5, 'not a frame\n')
+    store = make_store(lines)
+    assert store.quantized and store.distances.dtype == np.uint16
+    assert list(store) == lines and store[-1] == lines[-1]
+    assert store.nbytes * 3 < sum(sys.getsizeof(line) for line in lines)
+
+    distances, label = store.frame(11)
+    assert distances[0] == 0 and distances[1] == 0 and distances[2] == 500.25
+    with pytest.raises(ValueError):
+        store.frame(5)
+
+    store.set_frame(2, distances * 2, -label)
+    assert parse_frame(store[2])[0][2] == 1000.5 and store.edited == {2}
+    store[3] = lines[0]
+    assert store.frame(3)[0].tolist() == parse_frame(lines[0])[0].tolist()
+    assert store[4] == lines[4] and store[5] == lines[5]
+    print("✓ Quantized frames read back as the original lines")
+
+
+def test_fallback_and_layout_changes():
+    """Values finer than the quantization switch the store to float32"""
+    lines = [frame_line([1000 + i] * 360, i / 10) for i in range(6)]
+    store = make_store(lines)
+    assert store.quantized
+    store.set_frame(1, np.full(360, 123.456, dtype=np.float32), 0.5)
+    assert not store.quantized and store.distances.dtype == np.float32
+    assert store.frame(1)[0][0] == np.float32(123.456)
+    assert store.frame(4)[0][0] == 1004 and store[4] == lines[4]
+
+    # lines written as text are kept as numbers and formatted again
+    expected = list(store)
+    for change in (lambda l: l.__delitem__(0),
+                   lambda l: l.insert(2, 'header\n'),
+                   lambda l: l.append(lines[5]),
+                   lambda l: l.__setitem__(slice(1, 3), [lines[0]])):
+        change(store)
+        change(expected)
+        assert values(store) == values(expected)
+    assert store.layout == 4
+
+    table = store.frame_table(first=1)
+    assert len(table) == len(expected) - 1
+    assert table.frames[:, 0].tolist() == [parse_frame(line)[0][0] for line in expected[1:]]
+    assert format_frame(*parse_frame(expected[1])) == store[1]
+
+    inf_lines = [frame_line(['inf'] + [1000] * 359, 0)]
+    assert not make_store(inf_lines).quantized and make_store(inf_lines)[0] == inf_lines[0]
+    print("✓ Float fallback and moved lines")
+
+
+def test_data_manager_store_and_save(tmp_path, monkeypatch):
+    """DataManager keeps its lines in a FrameStore and saves them back"""
+    path = str(tmp_path / 'out.txt')
+    lines = [frame_line([1000 + i] * 360, i / 10) for i in range(8)]
+    with open(path, 'w') as f:
+        f.writelines(lines)
+    manager = DataManager(path, str(tmp_path / '_out.txt'), False, lazy=False)
+    assert isinstance(manager.lines, FrameStore)
+
+    manager.next()
+    manager.next()
+    distances, label = manager.frame(manager.pointer)
+    manager.set_frame(manager.pointer, distances[::-1] + 0.25, -label)
+    assert manager.dataframe[0] == '1002.25' and manager.dataframe[360] == '-0.2'
+    assert manager.frame_table().frames[2, 0] == 1002.25
+    del manager.lines[0]
+
+    # the file is closed before it is replaced, which Windows requires
+    source = manager.lines.source
+    replace = os.replace
+
+    def replace_closed(src, dst):
+        assert dst != path or source._file.closed
+        replace(src, dst)
+    monkeypatch.setattr(os, 'replace', replace_closed)
+    assert manager.save_to_original_file()
+    assert isinstance(manager.lines.source, LazyLines) and manager.lines.source is not source
+    assert manager.frame_table().frames[1, 0] == 1002.25
+    manager.close()
+    with open(path) as f:
+        saved = f.readlines()
+    assert saved[0] == lines[1] and saved[2:] == lines[3:]
+    assert parse_frame(saved[1])[0][0] == 1002.25
+    print("✓ DataManager frames edited and saved")
+
+
+def test_frame_table_reads_the_store(tmp_path):
+    """DataManager.frame_table() serves a FrameStore without copying it"""
+    path = str(tmp_path / 'out.txt')
+    lines = [frame_line([1000 + i] * 360, i / 10) for i in range(4)]
+    lines.insert(2, 'not a frame\n')
+    with open(path, 'w') as f:
+        f.writelines(lines)
+    manager = DataManager(path, str(tmp_path / '_out.txt'), False, lazy=False)
+    table = manager.frame_table()
+    expected = manager.lines.frame_table()
+    assert len(table) == len(expected) == 5
+    assert table.complete.tolist() == expected.complete.tolist()
+    np.testing.assert_array_equal(table.frames[:], expected.frames)
+    np.testing.assert_array_equal(table.labels, expected.labels)
+    np.testing.assert_array_equal(table.valid_counts(np.arange(5)), expected.valid_counts(np.arange(5)))
+    assert table.distances[[0, -1], 5].tolist() == [1000, 1003]
+
+    # edits, deletions and insertions show without building the table again
+    manager.set_frame(0, np.full(360, 1500.5, dtype=np.float32), 0.5)
+    del manager.lines[1]
+    manager.lines.insert(0, frame_line([2000] * 360, 1))
+    assert manager.frame_table() is table
+    assert table.frames[0, 0] == 2000 and table.frames[1, 0] == 1500.5 and table.labels[1] == 0.5
+    assert not table.complete[2] and np.isnan(table.frames[2, 0]) and not table.valid(2).any()
+    manager.close()
+    print("✓ Frame table read from the store")
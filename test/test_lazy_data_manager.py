@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Test the lazy, offset-indexed mode of DataManager
+"""
+
+import os
+import sys
+import tracemalloc
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+pytest.importorskip('matplotlib')  # imported by the visualizer package
+
+from visualizer.data_input import DataManager, LazyLines
+from visualizer.frame_navigation import FrameNavigator
+
+
+def frame_line(distance, label):
+    return ','.join([str(distance)] * 360 + [str(label)]) + '\n'
+
+
+def write_frames(path, n, header=False, final_newline=True):
+    lines = [frame_line(1000 + i, round(i / 100, 2)) for i in range(n)]
+    if header:
+        lines.insert(0, ','.join(['lidar_%d' % i for i in range(360)] + ['angular_velocity']) + '\n')
+    text = ''.join(lines)
+    with open(path, 'w') as f:
+        f.write(text if final_newline else text.rstrip('\n'))
+    return text.splitlines(keepends=True) if final_newline else text.rstrip('\n').splitlines(True)
+
+
+def test_lazy_lines_behave_like_a_list(tmp_path):
+    """Reads and edits of LazyLines match a list of the lines"""
+    path = str(tmp_path / 'out.txt')
+    expected = write_frames(path, 6, final_newline=False)
+    lines = LazyLines(path)
+    assert list(lines) == expected and lines[-1] == expected[-1]
+    assert len(lines.offsets) == 7 and lines.offsets.dtype == np.uint64
+
+    for change in (lambda l: l.__setitem__(1, 'a\n'),
+                   lambda l: l.__setitem__(slice(2, 2), ['b\n', 'c\n']),
+                   lambda l: l.__delitem__(0),
+                   lambda l: l.__delitem__(slice(-2, None)),
+                   lambda l: l.insert(-1, 'd\n'),
+                   lambda l: l.append('e\n'),
+                   lambda l: l.__setitem__(slice(1, 3), ['f\n'])):
+        change(lines)
+        change(expected)
+        assert list(lines) == expected and lines[1:4] == expected[1:4]
+    with pytest.raises(IndexError):
+        lines[len(expected)]
+    lines.close()
+
+    open(path, 'w').close()
+    assert len(LazyLines(path)) == 0
+    print("✓ LazyLines behave like a list")
+
+
+def walk_and_edit(manager):
+    """Labels seen while navigating, then the frame labels after two edits"""
+    seen = [manager.dataframe[360]]
+    for step in ('next', 'next', 'prev', 'last', 'first', 'prev'):
+        getattr(manager, step)()
+        seen.append(manager.dataframe[360])
+    FrameNavigator(manager).move_to_frame(7)
+    seen.append(manager.dataframe[0])
+    assert manager.has_next() and manager.has_prev()
+    manager.update_current_frame(manager.dataframe[:360] + ['0.5'])
+    del manager.lines[3]
+    return seen, manager.frame_table().labels.tolist()
+
+
+def test_lazy_navigation_matches_eager(tmp_path):
+    """Navigation, edits and saving give the same results in both modes"""
+    path = str(tmp_path / 'out.txt')
+    write_frames(path, 20, header=True)
+    eager = DataManager(path, str(tmp_path / '_out.txt'), False, lazy=False)
+    lazy = DataManager(path, str(tmp_path / '_out.txt'), False, lazy=True)
+    assert lazy.lazy and isinstance(lazy.lines, LazyLines)
+    seen, labels = walk_and_edit(lazy)
+    assert (seen, labels) == walk_and_edit(eager)
+    assert seen[:7] == ['0.0', '0.01', '0.02', '0.01', '0.19', '0.0', '0.0']
+
+    assert lazy.save_to_original_file()
+    lazy.close()
+    eager.close()
+    reloaded = DataManager(path, str(tmp_path / '_out.txt'), False, lazy=False)
+    assert len(reloaded.lines) == 20 and reloaded.lines[6].endswith(',0.5\n')
+    reloaded.close()
+    print("✓ Lazy navigation matches the in-memory mode")
+
+
+def test_lazy_memory_use(tmp_path, monkeypatch):
+    """Opening and walking a file costs the offset index, not the text"""
+    from visualizer import config
+    monkeypatch.setattr(config, 'PARSED_FRAME_CACHE_MB', 0)  # bounded apart, see test_frame_lru
+    monkeypatch.setattr(config, 'PREFETCH_FRAMES', 0)
+    path = str(tmp_path / 'out.txt')
+    write_frames(path, 4000)
+    size = os.path.getsize(path)
+    tracemalloc.start()
+    manager = DataManager(path, str(tmp_path / '_out.txt'), False, lazy=True)
+    while manager.has_next():
+        manager.dataframe
+        manager.next()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    manager.close()
+    assert peak < size / 4, (peak, size)
+    print("✓ Lazy mode memory: %.0f KB peak for a %.0f KB file" % (peak / 1024, size / 1024))
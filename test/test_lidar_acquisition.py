@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Test the background acquisition thread and scan ring of LidarControl
+"""
+
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+from unittest import mock
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import rplidar
+from lidar_control import LidarControl, ScanRing
+from lidar_sim import FakeSerial, SyntheticSource
+from test_rplidar_decode import StreamSerial
+
+
+def test_scan_ring_counters():
+    """The ring hands out the newest scan and counts unread ones"""
+    ring = ScanRing(size=3, resolution=4)
+    assert ring.latest(timeout=0.01) is None
+
+    for seq in range(1, 6):
+        ring.write_slot().distance[:] = seq
+        ring.publish(float(seq))
+
+    scan = ring.latest()
+    assert scan.seq == 5
+    assert np.all(scan.distance == 5)
+    assert ring.overwritten == 4  # scans 1-4 were never read
+
+    ring.write_slot().distance[:] = 6
+    assert np.all(ring.latest().distance == 5)  # slot being written is not visible
+    ring.publish(6.)
+    assert ring.latest().seq == 6
+    assert ring.overwritten == 4
+    print("✓ ScanRing keeps the latest scan and counts overwritten scans")
+
+
+@contextmanager
+def threaded_control(read_scan, **kwargs):
+    """A started threaded LidarControl whose scans come from `read_scan`"""
+    with mock.patch.object(rplidar.serial, 'Serial',
+                           lambda *args, **kwargs: StreamSerial(b'')), \
+            mock.patch.object(rplidar.RPLidar, 'get_info'):
+        control = LidarControl(port='/dev/null', path=os.devnull, threaded=True, **kwargs)
+    with mock.patch.object(control.lidar, 'start'), \
+            mock.patch.object(control.lidar, 'start_motor'), \
+            mock.patch.object(control.lidar, 'connect'), \
+            mock.patch.object(control.lidar, '_read_scan', read_scan):
+        control.start()
+        yield control
+    control.outfile.close()
+
+
+def test_threaded_read_line_does_not_block():
+    """read_line returns immediately with the freshest scan"""
+    produced = []
+    gate = threading.Event()
+    parked = threading.Event()
+
+    def fake_read_scan(*args, **kwargs):
+        if not gate.is_set():
+            parked.set()
+        gate.wait()
+        time.sleep(0.005)
+        produced.append(len(produced) + 1)
+        angle = np.arange(360, dtype=float)
+        return np.zeros(360), angle, np.full(360, float(len(produced)))
+
+    with threaded_control(fake_read_scan) as control:
+        gate.set()
+        scan = control.read_line()  # waits for the first scan only
+        assert scan.shape == (360,) and scan.dtype == np.float32
+        time.sleep(0.1)
+
+        # with the sensor held between rotations, read_line hands out the
+        # latest scan rather than waiting for the next one
+        gate.clear()
+        parked.clear()
+        assert parked.wait(1)
+        seq = control.ring.seq
+        scan = control.read_line()
+        assert control.scan_seq == seq > 1
+        assert scan[0] == control.scan_seq
+        assert control.scan_age < 0.1
+        assert control.scans_overwritten > 0
+        assert control.scans_dropped == 0
+
+        control.stop_flag = True
+        gate.set()
+        control._thread.join()
+    print("✓ Threaded read_line returns the freshest scan without blocking")
+
+
+def test_acquisition_failure_reaches_the_reader():
+    """An error stopping the acquisition thread is raised by read_line
+    instead of the last scan being returned forever"""
+    calls = []
+
+    def failing_read_scan(*args, **kwargs):
+        calls.append(1)
+        if len(calls) > 1:
+            raise OSError('port closed')
+        return np.zeros(360), np.arange(360, dtype=float), np.full(360, 1000.)
+
+    with threaded_control(failing_read_scan) as control:
+        control._thread.join(1)
+        assert not control._thread.is_alive() and control.ring.seq == 1
+        with pytest.raises(OSError, match='port closed'):
+            control.read_line()
+        with pytest.raises(OSError):
+            control.latest_scan()
+    print("✓ Acquisition errors are raised to the reader")
+
+
+def test_read_line_waits_for_the_first_scan_in_bounds():
+    """Without any scan read_line raises after scan_timeout"""
+    stalled = threading.Event()
+
+    def stalled_read_scan(*args, **kwargs):
+        stalled.wait()
+        raise rplidar.RPLidarException('stopped')
+
+    with threaded_control(stalled_read_scan, scan_timeout=0.05) as control:
+        assert control.latest_scan(timeout=0.01) is None
+        with pytest.raises(rplidar.RPLidarException, match='No scan'):
+            control.read_line()
+        control.stop_flag = True
+        stalled.set()
+        control._thread.join()
+    print("✓ read_line does not wait forever for a scan")
+
+
+def test_stalled_sensor_is_reported():
+    """A sensor that stops sending after its first scans stops the thread
+    with the timeout instead of the last scan being returned forever"""
+    source = SyntheticSource(dropout=0, noise=0, rotations=2)
+    control = LidarControl(port='sim', path=os.devnull, threaded=True, max_timeouts=2,
+                           serial_factory=partial(FakeSerial, source=source))
+    control.lidar.timeout = 0.05
+    control.start()
+    control._thread.join(2)
+    assert not control._thread.is_alive() and control.ring.seq >= 1
+    assert control.scans_dropped >= 2
+    with pytest.raises(rplidar.RPLidarTimeoutException):
+        control.read_line()
+    control.stop_record()
+    print("✓ Stalled sensor raised to the reader")
+
+
+if __name__ == "__main__":
+    test_scan_ring_counters()
+    test_threaded_read_line_does_not_block()
+    test_acquisition_failure_reaches_the_reader()
+    test_read_line_waits_for_the_first_scan_in_bounds()
+    test_stalled_sensor_is_reported()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Test the numeric steering prediction path of mldriver
+"""
+
+import os
+import pickle
+import sys
+import tempfile
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import mldriver
+from mldriver import SteeringPredictor, load_predictor, selected_feature_indices
+
+
+def make_model(seed=0):
+    from sklearn.ensemble import RandomForestRegressor
+    rng = np.random.default_rng(seed)
+    scans = rng.uniform(0, 4000, (200, 360)).astype(np.float32)
+    turns = (scans[:, 40] - scans[:, 320]) / 4000
+    model = RandomForestRegressor(n_estimators=10, random_state=seed)
+    model.fit(scans[:, selected_feature_indices], turns)
+    return model, scans
+
+
+def test_predictor_matches_legacy_path():
+    """Numeric predictions equal the csv + pandas predictions"""
+    model, scans = make_model()
+    predictor = SteeringPredictor(model)
+    for scan in scans[:20]:
+        line = ','.join(map(str, scan.tolist()))
+        ar = pd.read_csv(StringIO(line), sep=',', header=None)
+        expected = model.predict(ar.iloc[:, selected_feature_indices])[0]
+        assert abs(predictor.predict(scan) - expected) < 1e-9
+
+    batch = predictor.predict_batch(scans[:50])
+    assert np.allclose(batch, [predictor.predict(s) for s in scans[:50]])
+    print("✓ SteeringPredictor matches the legacy predict_dir")
+
+
+def test_predict_dir_wraps_predictor():
+    """predict_dir accepts arrays and csv lines and loads trainer pickles"""
+    model, scans = make_model(1)
+    indices = np.array(selected_feature_indices)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'model.pkl')
+        with open(path, 'wb') as f:
+            pickle.dump({'model': model, 'feature_indices': indices}, f)
+        predictor = load_predictor(path)
+    assert np.array_equal(predictor.feature_indices, indices)
+
+    old_predictor = mldriver._predictor
+    mldriver._predictor = predictor
+    try:
+        from_array = mldriver.predict_dir(scans[0])
+        from_csv = mldriver.predict_dir(','.join(map(str, scans[0].tolist())))
+    finally:
+        mldriver._predictor = old_predictor
+    assert from_array.shape == (1,)
+    assert from_array[0] == from_csv[0] == predictor.predict(scans[0])
+    print("✓ predict_dir is a thin wrapper over SteeringPredictor")
+
+
+if __name__ == "__main__":
+    test_predictor_matches_legacy_path()
+    test_predict_dir_wraps_predictor()
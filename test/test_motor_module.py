@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Test the GPIO write caching of motormodule.Motor on the in-memory GPIO
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from motormodule import DIRECTIONS, FakeGPIO, Motor
+
+
+def make_motor(**kwargs):
+    gpio = FakeGPIO()
+    return Motor(3, 5, 7, 15, 13, 11, gpio=gpio, **kwargs), gpio
+
+
+def test_commands_match_original_mapping():
+    """Duty cycles and directions follow the original move() branches"""
+    assert Motor.command(0.6, 0) == (60, 60, "DOWN")
+    assert Motor.command(-0.5, 0) == (50, 50, "UP")
+    assert Motor.command(0.5, 0.5)[0] == 50 and Motor.command(0.5, 0.5)[2] == "DOWN"
+    assert Motor.command(0.5, -0.5)[1] == 50
+    assert Motor.command(0, 0.4) == (40, 40, "LEFT")
+    assert Motor.command(0, -0.4) == (40, 40, "RIGHT")
+    assert Motor.command(0, 0) == (0, 0, "STOP")
+    print("✓ Motor commands keep the original mapping")
+
+
+def test_unchanged_commands_skip_gpio():
+    """Repeating a command writes nothing; a change writes only what differs"""
+    motor, gpio = make_motor()
+    motor.move(0.6, 0)
+    assert len(gpio.calls) == 6 and motor.writes == 6
+    for _ in range(100):
+        motor.move(0.6, 0)
+    assert len(gpio.calls) == 6 and motor.skipped == 600
+
+    motor.move(-0.6, 0)  # same duty, every direction pin flips
+    assert len(gpio.calls) == 10
+    motor.move(-0.7, 0)  # same direction, new duty
+    assert gpio.calls[-2:] == [('duty', 3, 70), ('duty', 15, 70)]
+    assert [gpio.levels[pin] for pin in (5, 7, 13, 11)] == list(DIRECTIONS["UP"])
+
+    motor.stop()
+    motor.stop()
+    assert gpio.pwms[3].duty == gpio.pwms[15].duty == 0
+    assert len(gpio.calls) == 14 and motor.writes == 14
+    print("✓ Motor only writes GPIO on change")
+
+
+def test_min_interval_coalesces_commands():
+    """Changes within the interval are held back and the latest one applied"""
+    motor, gpio = make_motor(min_interval=0.05)
+    motor.move(0.5, 0)
+    motor.move(0.6, 0)
+    motor.move(0.7, 0)
+    assert gpio.pwms[3].duty == 50 and motor.deferred == 2
+    time.sleep(0.06)
+    motor.move(0.8, 0)
+    assert gpio.pwms[3].duty == 80
+    motor.move(0.9, 0)
+    motor.flush()
+    assert gpio.pwms[3].duty == 90
+    motor.move(0.3, 0)
+    motor.stop()  # never held back
+    assert gpio.pwms[3].duty == 0 and motor.flush() is None and gpio.pwms[3].duty == 0
+    print("✓ Motor coalesces commands within the minimum interval")
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Test the closed-loop motor speed control of rplidar.RPLidar
+"""
+
+import os
+import sys
+from functools import partial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lidar_sim import FakeSerial, SyntheticSource
+from rplidar import DEFAULT_MOTOR_PWM, MotorSpeedController, RPLidar
+
+
+def sim_lidar(hz_at_default_pwm):
+    """Sensor whose motor turns at `hz_at_default_pwm` with the default PWM"""
+    source = SyntheticSource(rotation_hz=hz_at_default_pwm, sample_rate=8000)
+    lidar = RPLidar('sim', timeout=0.5, serial_factory=partial(
+        FakeSerial, source=source, realtime=True,
+        hz_per_pwm=hz_at_default_pwm / DEFAULT_MOTOR_PWM))
+    lidar.start_motor()
+    return lidar, source
+
+
+def test_controller_holds_target_rate():
+    """A sagging motor is brought back to the target rate"""
+    lidar, source = sim_lidar(16.)
+    controller = MotorSpeedController(20., tolerance=0.3, gain=40.)
+    lidar.speed_controller = controller
+    for _ in range(40):
+        lidar.read_scan(max_buf_meas=False)
+    assert abs(source.rotation_hz - 20.) < 0.6
+    assert lidar._serial.pwm == lidar.motor_speed == controller.pwm > DEFAULT_MOTOR_PWM
+    assert abs(controller.rate_hz - 20.) < 1 and controller.adjustments >= 1
+    assert set(controller.snapshot()) == set(MotorSpeedController.METRICS)
+    print("✓ Motor speed controller holds the target rate")
+
+
+def test_open_loop_by_default():
+    """Without a controller the PWM is never changed"""
+    lidar, source = sim_lidar(16.)
+    for _ in range(10):
+        lidar.read_scan(max_buf_meas=False)
+    assert lidar._serial.pwm == DEFAULT_MOTOR_PWM and source.rotation_hz == 16.
+    pwm_commands = [c for c in lidar._serial.commands if c[0] == b'\xf0']
+    assert len(pwm_commands) == 1
+    print("✓ Motor stays open loop by default")
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test the multi-sensor manager and the fusion of mounted scans
+"""
+
+import os
+import sys
+import time
+from functools import partial
+from unittest import mock
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lidar_sim import FakeSerial, SyntheticSource
+from multi_lidar import MountedLidar, MultiLidar, fuse_scans, parse_mount
+from rplidar import Scan
+
+
+def single_point(bin_index, distance):
+    scan = Scan.empty(360)
+    scan.distance[bin_index] = distance
+    scan.valid[bin_index] = True
+    return scan
+
+
+def test_fuse_scans_applies_mounting():
+    """Scans are rotated and moved into the vehicle frame"""
+    fused = fuse_scans([single_point(10, 1000)], [MountedLidar('side', 'sim', angle=90)])
+    assert np.flatnonzero(fused.valid).tolist() == [100]
+    assert np.isclose(fused.distance[100], 1000)
+
+    # a rear sensor 300 mm behind the origin, looking backwards
+    fused = fuse_scans([single_point(0, 1000)],
+                       [MountedLidar('rear', 'sim', angle=180, x=-300)])
+    assert np.flatnonzero(fused.valid).tolist() == [180]
+    assert np.isclose(fused.distance[180], 1300)
+
+    # overlapping sensors keep the nearest point
+    fused = fuse_scans([single_point(0, 1000), single_point(0, 800)],
+                       [MountedLidar('a', 'sim'), MountedLidar('b', 'sim')])
+    assert fused.distance[0] == 800 and fused.count[0] == 2
+    assert parse_mount('rear=/dev/ttyUSB1:180:-200') == \
+        MountedLidar('rear', '/dev/ttyUSB1', 180., -200.)
+    print("✓ Scans are fused in the vehicle frame")
+
+
+def sim_mount(name, rotation_hz, rotations=None, **kwargs):
+    source = SyntheticSource(rotation_hz=rotation_hz, sample_rate=8000, dropout=0, noise=0,
+                             rotations=rotations)
+    return MountedLidar(name, 'sim', serial_factory=partial(FakeSerial, source=source,
+                                                            realtime=True), **kwargs)
+
+
+def test_manager_rates_and_stalls():
+    """Sensors are read concurrently; a silent sensor is reported and left out"""
+    lidars = MultiLidar([sim_mount('front', 20), sim_mount('rear', 10, angle=180),
+                         sim_mount('short', 20, rotations=3)],
+                        max_skew=0.2, stall_timeout=0.3, timeout=0.1)
+    lidars.start()
+    try:
+        time.sleep(0.8)
+        frame = lidars.frame(timeout=1)
+        status = lidars.status()
+    finally:
+        lidars.stop()
+
+    assert frame.sources == ('front', 'rear')
+    assert set(frame.seqs) == {'front', 'rear'}
+    assert frame.valid.sum() > 300
+    assert 15 < status['front']['scans_per_second'] < 25
+    assert 7 < status['rear']['scans_per_second'] < 13
+    assert not status['front']['stalled'] and not status['rear']['stalled']
+    assert status['short']['stalled'] and status['short']['errors'] > 0
+    print("✓ Sensors are read concurrently and stalls are reported")
+
+
+def test_failed_sensor_is_raised():
+    """An error ending a sensor's thread is raised by frame, not ignored"""
+    lidars = MultiLidar([sim_mount('front', 20), sim_mount('rear', 20, angle=180)],
+                        timeout=0.1)
+    rear = lidars.devices[1]
+    with mock.patch.object(rear.lidar, '_read_scan', side_effect=OSError('port closed')):
+        lidars.start()
+        try:
+            rear._thread.join(1)
+            with pytest.raises(OSError, match='port closed'):
+                lidars.frame(timeout=1)
+            status = lidars.status()
+        finally:
+            lidars.stop()
+    assert status['rear']['failed'] and not status['front']['failed']
+    assert status['rear']['errors'] == 1
+    print("✓ Failed sensor raised by the fusion")
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Test that scan quality is kept from the sensor to the visualizer
+"""
+
+import os
+import sys
+from functools import partial
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lidar_sim import FakeSerial, SyntheticSource
+from rplidar import RPLidar, _filter_quality
+from scan_recording import ScanRecorder, convert_to_csv, quality_path
+
+
+def sim_lidar():
+    source = SyntheticSource(dropout=0, noise=0, sample_rate=4000)
+    return RPLidar('sim', timeout=0.2, serial_factory=partial(FakeSerial, source=source))
+
+
+def test_quality_threshold():
+    """Weak returns are dropped before binning, except in express mode"""
+    quality = np.array([0, 10, 15, 63], dtype=np.uint8)
+    distance = np.array([100., 200., 300., 400.])
+    assert _filter_quality(quality, distance, 15).tolist() == [0, 0, 300, 400]
+
+    # the simulated sensor reports quality 15 for every return
+    scan = sim_lidar().read_scan(max_buf_meas=False, with_quality=True, min_quality=15)
+    assert scan.valid.sum() > 350 and np.all(scan.quality[scan.valid] == 15)
+    assert sim_lidar().read_scan(max_buf_meas=False, min_quality=16).valid.sum() == 0
+    scan = sim_lidar().read_scan('express', max_buf_meas=False, min_quality=16)
+    assert scan.valid.sum() > 350
+    print("✓ Quality threshold applied at assembly")
+
+
+def test_quality_reaches_visualizer(tmp_path):
+    """Recorded quality is converted next to the csv and loaded by DataManager"""
+    pytest.importorskip('matplotlib')  # imported by the visualizer package
+    from visualizer.data_input import DataManager
+
+    path = str(tmp_path / 'out.bin')
+    qualities = np.arange(3 * 360).reshape(3, 360) % 64
+    recorder = ScanRecorder(path, with_quality=True)
+    for i, quality in enumerate(qualities):
+        recorder.write(float(i), np.full(360, 1000., dtype=np.float32), quality=quality)
+    recorder.close()
+    csv_path = str(tmp_path / 'out.txt')
+    convert_to_csv(path, csv_path)
+    assert np.array_equal(np.load(quality_path(csv_path)), qualities)
+
+    manager = DataManager(csv_path, str(tmp_path / '_out.txt'), False)
+    assert np.array_equal(manager.quality, qualities[0])
+    manager.next()
+    manager.next()
+    assert np.array_equal(manager.quality, qualities[2])
+    manager.close()
+
+    # without a matching quality file frames have no quality
+    np.save(quality_path(csv_path), qualities[:2])
+    manager = DataManager(csv_path, str(tmp_path / '_out.txt'), False)
+    assert manager.qualities is None and manager.quality is None
+    manager.close()
+    print("✓ Quality loaded by the visualizer")
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_quality_follows_edits(tmp_path, lazy):
+    """Quality stays with its line through deletions, insertions, flips and saves"""
+    pytest.importorskip('matplotlib')  # imported by the visualizer package
+    from visualizer.data_input import DataManager
+
+    path = str(tmp_path / 'out.bin')
+    qualities = np.arange(4 * 360).reshape(4, 360) % 64
+    recorder = ScanRecorder(path, with_quality=True)
+    for i, quality in enumerate(qualities):
+        recorder.write(float(i), np.full(360, 1000. + i, dtype=np.float32), quality=quality)
+    recorder.close()
+    csv_path = str(tmp_path / 'out.txt')
+    convert_to_csv(path, csv_path)
+
+    manager = DataManager(csv_path, str(tmp_path / '_out.txt'), False, lazy=lazy)
+    start = manager._data_start_line
+    del manager.lines[start + 1]
+    manager.lines[start + 1:start + 1] = [manager.lines[start]]
+    manager.set_frame_quality(start + 1, qualities[0])
+    distances, label = manager.frame(start + 2)
+    manager.set_frame(start + 2, distances[::-1], -label, manager.frame_quality(start + 2)[::-1])
+    expected = [qualities[0], qualities[0], qualities[2][::-1], qualities[3]]
+    for i, quality in enumerate(expected):
+        assert np.array_equal(manager.frame_quality(start + i), quality)
+
+    assert manager.save_to_original_file()
+    assert np.array_equal(np.load(quality_path(csv_path)), expected)
+    assert np.array_equal(manager.frame_quality(start + 2), expected[2])
+
+    # a line without quality makes the saved quality file go away
+    manager.lines.append(manager.lines[start])
+    assert manager.frame_quality(start + 4) is None
+    assert manager.save_to_original_file()
+    assert not os.path.exists(quality_path(csv_path)) and manager.qualities is None
+    manager.close()
+
+    # the quality file must have one value per bin
+    np.save(quality_path(csv_path), np.zeros((5, 180), dtype=np.uint8))
+    manager = DataManager(csv_path, str(tmp_path / '_out.txt'), False, lazy=lazy)
+    assert manager.qualities is None and manager.quality is None
+    manager.close()
+    print("✓ Quality follows its line through edits and saves")
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Test the vectorized normal-mode packet decoder of rplidar.RPLidar
+"""
+
+import os
+import sys
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import rplidar
+from lidar_sim import FakeSerial, SyntheticSource, encode_express_packet, encode_normal_packets
+from rplidar import (RPLidar, RPLidarException, _process_express_bulk, _process_scan,
+                     _process_scan_bulk, scan_to_csv)
+
+
+def encode_rotations(n_rotations, samples=400, seed=0):
+    """Builds a byte stream of `n_rotations` full rotations"""
+    rng = np.random.default_rng(seed)
+    stream = b''
+    for _ in range(n_rotations):
+        new_scan = np.arange(samples) == 0
+        stream += encode_normal_packets(new_scan, rng.integers(0, 64, samples),
+                                        np.sort(rng.uniform(0, 360, samples)),
+                                        rng.integers(0, 16000, samples) / 4.)
+    return stream
+
+
+class StreamSerial:
+    """Minimal stand-in for serial.Serial serving a fixed byte stream"""
+
+    def __init__(self, stream, *args, timeout=None, **kwargs):
+        self.stream = stream
+        self.pos = 0
+        self.timeout = timeout
+
+    def inWaiting(self):
+        return len(self.stream) - self.pos
+
+    def read(self, size):
+        data = self.stream[self.pos:self.pos + size]
+        self.pos += len(data)
+        return data
+
+
+def make_lidar(stream):
+    """Creates an RPLidar that is already scanning over `stream`"""
+    with mock.patch.object(rplidar.serial, 'Serial',
+                           lambda *args, **kwargs: StreamSerial(stream)):
+        lidar = RPLidar('/dev/null')
+    lidar.scanning = [True, 5, 'normal']
+    return lidar
+
+
+def test_bulk_matches_per_packet():
+    """The bulk decoder must agree with _process_scan on every packet"""
+    stream = encode_rotations(3)
+    new_scan, quality, angle, distance = _process_scan_bulk(stream)
+    assert len(new_scan) == len(stream) // 5
+    for i in range(0, len(stream), 5):
+        expected = _process_scan(stream[i:i + 5])
+        got = (bool(new_scan[i // 5]), int(quality[i // 5]),
+               float(angle[i // 5]), float(distance[i // 5]))
+        assert got == expected, (i, got, expected)
+    print("✓ Bulk decoder matches per-packet decoder")
+
+
+def test_bulk_rejects_corrupted_packets():
+    """Flag and check bit errors are reported like the per-packet decoder"""
+    stream = bytearray(encode_rotations(1))
+    stream[10] |= 0b11  # both new scan flags set
+    try:
+        _process_scan_bulk(bytes(stream))
+        assert False, "flag mismatch not detected"
+    except RPLidarException as e:
+        assert 'flags' in str(e)
+
+    stream = bytearray(encode_rotations(1))
+    stream[6] &= 0b11111110  # clear check bit
+    try:
+        _process_scan_bulk(bytes(stream))
+        assert False, "check bit error not detected"
+    except RPLidarException as e:
+        assert 'Check bit' in str(e)
+    print("✓ Corrupted packets are rejected")
+
+
+def test_read_single_measure_on_bulk_path():
+    """read_single_measure returns one rotation per call, in order"""
+    stream = encode_rotations(3)
+    lidar = make_lidar(stream)
+    decoded = _process_scan_bulk(stream)
+    starts = np.flatnonzero(decoded[0])
+
+    for rotation in range(2):
+        line = lidar.read_single_measure(max_buf_meas=False)
+        values = [float(v) for v in line.split(',')]
+        assert len(values) == 360
+
+        begin, end = starts[rotation], starts[rotation + 1]
+        expected = np.zeros(360)
+        for angle, distance in zip(decoded[2][begin:end], decoded[3][begin:end]):
+            expected[min(round(angle), 359)] = distance
+        assert np.array_equal(np.array(values), expected)
+        # empty bins are written as 0 like in the original recordings
+        assert all(v != '0.0' for v in line.split(','))
+    assert scan_to_csv(np.array([0., 1234.5, 1000.], dtype=np.float32),
+                       np.array([True, True, False])) == '0,1234.5,0'
+    print("✓ read_single_measure assembles rotations from bulk reads")
+
+
+def test_read_scan_is_numeric():
+    """read_scan returns float32 distances, quality and a validity mask"""
+    stream = encode_rotations(3)
+    lidar = make_lidar(stream)
+    decoded = _process_scan_bulk(stream)
+    starts = np.flatnonzero(decoded[0])
+
+    scan = lidar.read_scan(max_buf_meas=False, with_quality=True)
+    assert scan.distance.dtype == np.float32 and scan.distance.shape == (360,)
+    assert scan.quality.dtype == np.uint8
+    assert np.array_equal(scan.valid, scan.distance > 0)
+
+    begin, end = starts[0], starts[1]
+    expected = np.zeros(360, dtype=np.uint8)
+    for quality, angle in zip(decoded[1][begin:end], decoded[2][begin:end]):
+        expected[min(round(angle), 359)] = quality
+    assert np.array_equal(scan.quality, expected)
+    assert lidar.read_scan(max_buf_meas=False).quality is None
+    print("✓ read_scan returns numeric arrays")
+
+
+def test_express_bulk_decode():
+    """Express packets decode in bulk and corrupted ones are rejected"""
+    rng = np.random.default_rng(1)
+    distances = rng.integers(0, 16384, (5, 32))
+    offsets = rng.integers(-31, 32, (5, 32)) / 8.
+    stream = b''.join(encode_express_packet(10. * i, distances[i], offsets[i], i == 0)
+                      for i in range(5))
+    new_scan, start_angle, distance, angle_offset = _process_express_bulk(stream)
+    assert new_scan.tolist() == [True, False, False, False, False]
+    assert np.array_equal(start_angle, 10. * np.arange(5))
+    assert np.array_equal(distance, distances)
+    assert np.array_equal(angle_offset, offsets)
+
+    corrupted = bytearray(stream)
+    corrupted[84 + 40] ^= 0xff
+    try:
+        _process_express_bulk(bytes(corrupted))
+        assert False, "checksum error not detected"
+    except RPLidarException as e:
+        assert 'checksum' in str(e)
+    print("✓ Express packets decode in bulk")
+
+
+def test_read_scan_express():
+    """Express rotations are assembled with interpolated angles"""
+    source = SyntheticSource(sample_rate=4000, dropout=0, noise=0)
+    lidar = RPLidar('sim', serial_factory=lambda *args, **kwargs: FakeSerial(source=source))
+    lidar.read_scan('express', max_buf_meas=False)
+    scan = lidar.read_scan('express', max_buf_meas=False)
+    assert scan.valid.all()
+    # measures are whole millimetres, taken up to half a degree off the bin centre
+    expected = source.distances(np.arange(360))
+    assert np.median(np.abs(scan.distance - expected)) < 10
+    print("✓ read_scan assembles express rotations")
+
+
+if __name__ == "__main__":
+    test_bulk_matches_per_packet()
+    test_bulk_rejects_corrupted_packets()
+    test_read_single_measure_on_bulk_path()
+    test_read_scan_is_numeric()
+    test_express_bulk_decode()
+    test_read_scan_express()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test the stream resynchronisation and backlog discarding of rplidar.RPLidar
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lidar_sim import SyntheticSource
+from rplidar import _find_packet_boundary, _process_scan_bulk
+from test_rplidar_decode import encode_rotations, make_lidar
+
+
+def test_find_packet_boundary():
+    """The boundary search skips garbage and needs several valid packets"""
+    stream = encode_rotations(1)
+    assert _find_packet_boundary(stream, 5) == 0
+    assert _find_packet_boundary(b'\x00\x00\x00' + stream, 5) == 3
+    assert _find_packet_boundary(stream[:20], 5) is None
+    print("✓ Packet boundaries are found")
+
+
+def test_corrupted_bytes_resync():
+    """A dropped and a corrupted byte cost a few packets, not the scan"""
+    stream = bytearray(encode_rotations(4))
+    del stream[1003]  # lose one byte in the first rotation
+    stream[3000] ^= 0b1  # break a check bit in the second
+    lidar = make_lidar(bytes(stream))
+
+    reference = _process_scan_bulk(encode_rotations(4))
+    starts = np.flatnonzero(reference[0])
+    scans = [lidar.read_scan(max_buf_meas=False) for _ in range(3)]
+    assert lidar.resyncs == 2
+    assert 0 < lidar.bytes_discarded < 100
+    # the third rotation arrives untouched
+    begin, end = starts[2], starts[3]
+    expected = np.zeros(360)
+    for angle, distance in zip(reference[2][begin:end], reference[3][begin:end]):
+        expected[min(round(angle), 359)] = distance
+    assert np.array_equal(scans[2].distance, expected)
+    print("✓ Corrupted bytes are skipped by resynchronising")
+
+
+def test_backlog_discarded_in_one_read():
+    """An overflowing buffer is emptied in one read and stays aligned"""
+    lidar = make_lidar(encode_rotations(6) + encode_rotations(3, seed=1))
+    lidar._partial = lidar._serial.read(2)  # start of a packet already held
+    reads = []
+    read = lidar._serial.read
+    lidar._serial.read = lambda size: reads.append(size) or read(size)
+
+    lidar._serial.stream = lidar._serial.stream[:-3 * 2000]
+    backlog = lidar._serial.inWaiting()
+    lidar._discard_backlog(5)
+    assert len(reads) == 1 and reads[0] % 5 == 3
+    assert lidar._serial.inWaiting() == backlog - reads[0] < 5
+    assert lidar.overflows == 1 and lidar.bytes_discarded == reads[0] + 2
+
+    lidar._serial.stream += encode_rotations(3, seed=1)
+    lidar.read_scan(max_buf_meas=False)
+    assert lidar.resyncs == 0
+    print("✓ Backlog discarded in a single aligned read")
+
+
+def test_short_backlog_keeps_partial_packet():
+    """Without the rest of the held packet nothing is dropped"""
+    stream = encode_rotations(2)
+    lidar = make_lidar(stream[2:4])
+    lidar._partial = stream[:2]
+    lidar._discard_backlog(5)
+    assert lidar._partial == stream[:2] and lidar._serial.inWaiting() == 2
+    assert lidar.overflows == 1 and lidar.bytes_discarded == 0
+
+    lidar._serial.stream += stream[4:]
+    lidar.read_scan(max_buf_meas=False)
+    assert lidar.resyncs == 0
+    print("✓ Short backlog keeps the packet being read")
+
+
+def test_express_resync():
+    """Express streams resynchronise on the packet sync bits"""
+    source = SyntheticSource(sample_rate=4000, dropout=0, noise=0, rotations=4)
+    stream = bytearray(b''.join(chunk for _, chunk in source.stream('express')))
+    del stream[84 * 30 + 10]
+    lidar = make_lidar(bytes(stream))
+    lidar.scanning = [True, 84, 'express']
+    lidar.read_scan('express', max_buf_meas=False)
+    scan = lidar.read_scan('express', max_buf_meas=False)
+    assert lidar.resyncs == 1
+    assert np.median(np.abs(scan.distance - source.distances(np.arange(360)))) < 10
+    print("✓ Express streams resynchronise")
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Test the deadline-based response reads of rplidar.RPLidar
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from rplidar import RPLidarTimeoutException
+from test_rplidar_decode import StreamSerial, encode_rotations, make_lidar
+
+
+class StalledSerial(StreamSerial):
+    """Serial stand-in that answers nothing, blocking like a real port"""
+
+    def __init__(self, timeout):
+        super().__init__(b'')
+        self.timeout = timeout
+
+    def read(self, size):
+        time.sleep(self.timeout)
+        return b''
+
+    def write(self, data):
+        pass
+
+
+def test_stalled_sensor_raises_timeout():
+    """get_health and scan reads fail cleanly when the sensor stalls"""
+    lidar = make_lidar(b'')
+    lidar._serial = StalledSerial(0.01)
+    lidar.timeout = 0.05
+
+    start = time.monotonic()
+    try:
+        lidar.get_health()
+        assert False, "get_health did not time out"
+    except RPLidarTimeoutException:
+        pass
+    assert time.monotonic() - start < 1.0
+
+    try:
+        lidar.read_single_measure(max_buf_meas=False)
+        assert False, "read_single_measure did not time out"
+    except RPLidarTimeoutException:
+        pass
+    print("✓ Stalled sensor raises RPLidarTimeoutException")
+
+
+def test_deadline_shorter_than_port_timeout():
+    """A read does not block for the whole port timeout past its deadline"""
+    lidar = make_lidar(b'')
+    lidar._serial = StalledSerial(1.0)
+
+    start = time.monotonic()
+    try:
+        lidar._read_response(10, timeout=0.05)
+        assert False, "read did not time out"
+    except RPLidarTimeoutException:
+        pass
+    assert time.monotonic() - start < 0.5
+    assert lidar._serial.timeout == 1.0  # port timeout restored
+    print("✓ Deadline enforced within a single read")
+
+
+def test_read_wait_is_reported():
+    """Every read records how long it waited"""
+    lidar = make_lidar(encode_rotations(2))
+    lidar.read_single_measure(max_buf_meas=False)
+    assert lidar.read_count > 0
+    assert lidar.last_read_wait >= 0
+    assert lidar.read_wait_total >= lidar.last_read_wait
+
+    try:
+        lidar._read_response(10 ** 6, timeout=0.01)
+        assert False, "short read did not time out"
+    except RPLidarTimeoutException as e:
+        assert 'of 1000000 bytes' in str(e)
+    assert lidar.last_read_wait >= 0.01
+    print("✓ Read wait times are reported")
+
+
+if __name__ == "__main__":
+    test_stalled_sensor_raises_timeout()
+    test_deadline_shorter_than_port_timeout()
+    test_read_wait_is_reported()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Test the angular binning reductions of rplidar._bin_scan
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from rplidar import BIN_REDUCTIONS, Scan, _bin_scan
+
+
+def make_rotation(samples=1500, seed=0):
+    rng = np.random.default_rng(seed)
+    angle = np.sort(rng.uniform(0, 360, samples))
+    distance = rng.integers(0, 8000, samples) / 4.
+    distance[rng.random(samples) < 0.1] = 0
+    quality = rng.integers(0, 64, samples).astype(np.uint8)
+    return angle, distance, quality
+
+
+def reference(angle, distance, quality, n_bins, reduce):
+    """Per-point reference implementation of the reductions"""
+    width = 360. / n_bins
+    bins = {}
+    for a, d, q in zip(angle, distance, quality):
+        if d > 0:
+            i = int(np.rint(a / width)) % n_bins
+            bins.setdefault(i, []).append((abs(a / width - np.rint(a / width)), d, q))
+    expected = np.zeros(n_bins)
+    expected_quality = np.zeros(n_bins, dtype=np.uint8)
+    count = np.zeros(n_bins, dtype=int)
+    for i, measures in bins.items():
+        offsets, values, qualities = zip(*measures)
+        count[i] = len(values)
+        expected_quality[i] = max(qualities)
+        if reduce == 'min':
+            expected[i] = min(values)
+        elif reduce == 'mean':
+            expected[i] = np.mean(values)
+        elif reduce == 'median':
+            expected[i] = np.median(values)
+        else:
+            expected[i] = values[int(np.argmin(offsets))]
+            expected_quality[i] = qualities[int(np.argmin(offsets))]
+    return expected, expected_quality, count
+
+
+def test_reductions_match_reference():
+    """Every reduction agrees with a per-point loop for several bin counts"""
+    angle, distance, quality = make_rotation()
+    for n_bins in (180, 360, 720):
+        for reduce in BIN_REDUCTIONS[1:]:
+            out = Scan.empty(n_bins, with_quality=True, with_count=True)
+            scan = _bin_scan(angle, distance, quality, out=out, reduce=reduce)
+            expected, expected_quality, count = reference(angle, distance, quality,
+                                                          n_bins, reduce)
+            assert np.allclose(scan.distance, expected, atol=1e-3), (n_bins, reduce)
+            assert np.array_equal(scan.quality, expected_quality), (n_bins, reduce)
+            assert np.array_equal(scan.count, count), (n_bins, reduce)
+            assert np.array_equal(scan.valid, count > 0)
+    print("✓ Bin reductions match the per-point reference")
+
+
+def test_last_keeps_original_behaviour():
+    """The default reduction keeps the last measure of every degree"""
+    angle, distance, quality = make_rotation(seed=1)
+    scan = _bin_scan(angle, distance, quality)
+    expected = np.zeros(360)
+    for a, d in zip(angle, distance):
+        expected[min(round(a), 359)] = d
+    assert np.array_equal(scan.distance, expected)
+    assert scan.count is None
+
+    try:
+        _bin_scan(angle, distance, reduce='max')
+        assert False, "unknown reduction accepted"
+    except ValueError:
+        pass
+    print("✓ 'last' reduction keeps the original behaviour")
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Test the binary scan recordings and their conversion to csv
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from rplidar import ScanInfo
+from scan_recording import ScanRecorder, convert_to_csv, distances_mm, read_recording
+
+
+def make_scans(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.integers(0, 16000 * 4, (n, 360)) / 4.).astype(np.float32)
+
+
+def test_round_trip_with_partial_chunks(tmp_path):
+    """Scans come back unchanged, including a partially filled last chunk"""
+    path = str(tmp_path / 'out.bin')
+    scans = make_scans(10)
+    recorder = ScanRecorder(path, with_quality=True, chunk_records=4)
+    for i, scan in enumerate(scans):
+        assert recorder.write(float(i), scan, turn=i / 10., speed=-0.9,
+                              quality=np.full(360, i, dtype=np.uint8))
+    recorder.close()
+    assert recorder.written == 10 and recorder.dropped == 0
+
+    header, records = read_recording(path)
+    assert header['n_bins'] == 360
+    assert np.array_equal(distances_mm(header, records), scans)
+    assert np.array_equal(records['timestamp'], np.arange(10.))
+    assert np.allclose(records['turn'], np.arange(10) / 10.)
+    assert np.all(records['quality'][:, 0] == np.arange(10))
+    print("✓ Binary recording round trip is lossless")
+
+
+def test_timing_fields(tmp_path):
+    """Scan timing is stored when the recorder is created with_timing"""
+    path = str(tmp_path / 'out.bin')
+    recorder = ScanRecorder(path, with_timing=True)
+    recorder.write(2.0, make_scans(1)[0], info=ScanInfo(1.8, 1.98, 362, 12))
+    recorder.write(3.0, make_scans(1)[0])
+    recorder.close()
+    _, records = read_recording(path)
+    assert records['scan_start'].tolist() == [1.8, 0.]
+    assert records['scan_end'][0] == 1.98
+    assert records['samples'].tolist() == [362, 0]
+    assert records['invalid'][0] == 12
+    print("✓ Scan timing is recorded")
+
+
+def test_truncated_file_keeps_whole_records(tmp_path):
+    """A recording cut off mid-record still yields its complete records"""
+    path = str(tmp_path / 'out.bin')
+    recorder = ScanRecorder(path, chunk_records=8)
+    for i, scan in enumerate(make_scans(8)):
+        recorder.write(float(i), scan)
+    recorder.close()
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 100)
+    _, records = read_recording(path)
+    assert len(records) == 7
+    print("✓ Truncated recording keeps its whole records")
+
+
+def test_convert_to_csv(tmp_path):
+    """The converter writes the 361-column csv the visualizer reads"""
+    path = str(tmp_path / 'out.bin')
+    scans = make_scans(3)
+    recorder = ScanRecorder(path)
+    for i, scan in enumerate(scans):
+        recorder.write(float(i), scan, turn=0.5)
+    recorder.close()
+
+    csv_path = str(tmp_path / 'out.txt')
+    assert convert_to_csv(path, csv_path) == 3
+    rows = [line.split(',') for line in open(csv_path).read().splitlines()]
+    assert all(len(row) == 361 for row in rows)
+    assert np.array_equal(np.array([row[:360] for row in rows], dtype=np.float32), scans)
+    assert rows[0][360] == '0.50'
+    print("✓ Recording converted to csv")
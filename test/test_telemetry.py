@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Test the latency histograms, the metrics export and the rplidar hooks
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from telemetry import LatencyHistogram, MetricsExporter, Telemetry
+from test_rplidar_decode import encode_rotations, make_lidar
+
+
+def test_histogram_rolling_window():
+    """Percentiles cover only the last `window` samples"""
+    histogram = LatencyHistogram(window=100)
+    assert histogram.summary()['count'] == 0
+    for value in np.linspace(1., 2., 100):
+        histogram.record(value)
+    for value in np.linspace(0., 0.099, 100):
+        histogram.record(value)
+    summary = histogram.summary()
+    assert summary['count'] == 200
+    assert summary['max'] == 0.099
+    assert np.isclose(summary['p50'], np.percentile(np.linspace(0., 0.099, 100), 50))
+    print("✓ Histogram keeps a rolling window")
+
+
+def test_export_text_format(tmp_path):
+    """The exporter writes one Prometheus line per quantile and stage"""
+    telemetry = Telemetry()
+    with telemetry.timer('inference'):
+        pass
+    telemetry.record('actuation', 0.002)
+    telemetry.gauge('scans_dropped', lambda: 3)
+    telemetry.mark('scan')
+    path = str(tmp_path / 'metrics.prom')
+    MetricsExporter(telemetry, path).export()
+
+    lines = open(path).read().splitlines()
+    assert 'car_stage_latency_seconds{stage="actuation",quantile="0.99"} 0.002000000' in lines
+    assert 'car_stage_latency_seconds_count{stage="inference"} 1' in lines
+    assert 'car_scans_dropped 3.0' in lines
+    age = [line for line in lines if line.startswith('car_stage_mark_age_seconds{mark="scan"} ')]
+    assert len(age) == 1 and 0 <= float(age[0].split()[1]) < 1
+    assert not os.path.exists(path + '.tmp')
+    print("✓ Metrics exported as text lines")
+
+
+def test_rplidar_records_serial_wait_and_decode():
+    """An RPLidar with telemetry reports its serial waits and assembly time"""
+    lidar = make_lidar(encode_rotations(3))
+    lidar.telemetry = Telemetry()
+    lidar.read_scan(max_buf_meas=False)
+    snapshot = lidar.telemetry.snapshot()
+    assert snapshot['serial_wait']['count'] == lidar.read_count
+    assert snapshot['scan_decode']['count'] == 1
+    assert snapshot['scan_binning']['count'] == 1
+    assert snapshot['scan_decode']['max'] >= 0
+    print("✓ RPLidar reports stage latencies")
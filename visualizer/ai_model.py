@@ -9,6 +9,17 @@ import numpy as np
 from tkinter import messagebox
 import traceback
 
+try:
+    # Array-based forest evaluation, lives next to mldriver at the repo root
+    from compiled_forest import compile_model
+except ImportError:
+    compile_model = None
+
+# LiDAR positions the bare pickled models were trained on; models saved by
+# RegressionModelTrainer carry their own feature indices
+DECISIVE_FRAME_POSITIONS = [24, 29, 31, 35, 38, 39, 40, 41, 42, 43, 44, 45, 47, 50, 54, 55, 57, 302,
+                            304, 312, 314, 315, 316, 318, 319, 321, 324, 326, 328, 330]
+
 
 class RegressionModelTrainer:
     """Handles training of regression models from dataset splits"""
@@ -49,8 +60,10 @@ class RegressionModelTrainer:
         Train a Random Forest regression model using the exact logic from notebooks/randomforest_regression.ipynb
         
         Args:
-            train_data: List of training data lines (list of strings)
-            val_data: List of validation data lines (list of strings) 
+            train_data: List of training data lines (list of strings) or
+                (n, 361) array of parsed frames
+            val_data: List of validation data lines (list of strings) or
+                (n, 361) array of parsed frames
             models_dir: Directory to save the trained model
             
         Returns:
@@ -200,10 +213,17 @@ class RegressionModelTrainer:
             return {"success": False, "error": error_msg, "details": error_details}
     
     def _prepare_dataframe(self, data_lines, dataset_name):
-        """Convert data lines to pandas DataFrame"""
+        """Convert data lines (or an array of parsed frames) to pandas DataFrame"""
         try:
             import pandas as pd
             
+            if isinstance(data_lines, np.ndarray):
+                # Parsed frames (see frame_cache.FrameTable)
+                if not len(data_lines):
+                    self.log_progress(f"❌ No valid data found in {dataset_name} set")
+                    return None
+                return pd.DataFrame(data_lines[:, :361].astype(np.float64))
+            
             processed_data = []
             for line in data_lines:
                 if isinstance(line, str):
@@ -267,6 +287,8 @@ class AIModelManager:
         self.model = None
         self.model_path = None
         self.model_loaded = False
+        self.engine = None  # CompiledForest used instead of model.predict when available
+        self.feature_indices = None  # LiDAR positions the model takes as input
         self.prediction_cache = {}  # Cache predictions to avoid recomputation
         
     def load_model(self, model_path):
@@ -282,6 +304,22 @@ class AIModelManager:
             with open(model_path, 'rb') as f:
                 self.model = pickle.load(f)
             
+            # Models saved by RegressionModelTrainer are wrapped in a dictionary
+            # with the indices of the features they were trained on
+            if isinstance(self.model, dict):
+                model_data = self.model
+                self.model = None
+                if 'model' not in model_data or model_data.get('feature_indices') is None:
+                    raise ValueError("Model file has no model or no feature indices")
+                self.model = model_data['model']
+                self.feature_indices = np.asarray(model_data['feature_indices'], dtype=np.intp)
+            else:
+                self.feature_indices = np.asarray(DECISIVE_FRAME_POSITIONS, dtype=np.intp)
+            
+            # Flatten random forests for low-latency single-frame predictions
+            if compile_model is not None:
+                self.engine = compile_model(self.model)
+            
             self.model_path = model_path
             self.model_loaded = True
             
@@ -305,6 +343,8 @@ class AIModelManager:
         self.model = None
         self.model_path = None
         self.model_loaded = False
+        self.engine = None
+        self.feature_indices = None
         self.prediction_cache.clear()
         print("AI model cleared")
     
@@ -368,7 +408,10 @@ class AIModelManager:
             input_data = self.prepare_input_data(lidar_data)
             
             # Make prediction
-            prediction = self.model.predict([input_data])[0]
+            if self.engine is not None:
+                prediction = self.engine.predict(input_data)[0]
+            else:
+                prediction = self.model.predict([input_data])[0]
             
             # Ensure prediction is a scalar
             if hasattr(prediction, 'item'):
@@ -395,33 +438,18 @@ class AIModelManager:
             lidar_data: Raw LiDAR data (list/array)
         
         Returns:
-            numpy array: Prepared input data
+            numpy array: The LiDAR values at the feature indices of the model
         """
+        feature_indices = self.feature_indices
+        if feature_indices is None:
+            feature_indices = np.asarray(DECISIVE_FRAME_POSITIONS, dtype=np.intp)
         try:
-            # Import DECISIVE_FRAME_POSITIONS from the main module
-            # These are the selected positions that the model was trained on
-            DECISIVE_FRAME_POSITIONS = [24, 29, 31, 35, 38, 39, 40, 41, 42, 43, 44, 45, 47, 50, 54, 55, 57, 302,
-                                      304, 312, 314, 315, 316, 318, 319, 321, 324, 326, 328, 330]
-            
-            # Convert to numpy array
-            full_lidar = np.array(lidar_data, dtype=np.float32)
-            
-            # Extract only the decisive frame positions
-            if len(full_lidar) >= 360:
-                # Use only the decisive positions from the LiDAR data
-                input_array = np.zeros(len(DECISIVE_FRAME_POSITIONS), dtype=np.float32)
-                for i, pos in enumerate(DECISIVE_FRAME_POSITIONS):
-                    if pos < len(full_lidar):
-                        input_array[i] = full_lidar[pos]
-                    else:
-                        input_array[i] = 0.0  # Default value for missing positions
-            else:
-                # If insufficient data, create array with zeros
-                input_array = np.zeros(len(DECISIVE_FRAME_POSITIONS), dtype=np.float32)
-                # Fill what we can
-                for i, pos in enumerate(DECISIVE_FRAME_POSITIONS):
-                    if pos < len(lidar_data):
-                        input_array[i] = lidar_data[pos]
+            full_lidar = np.asarray(lidar_data, dtype=np.float32)
+            
+            # Positions missing from short scans are left at 0
+            input_array = np.zeros(len(feature_indices), dtype=np.float32)
+            present = feature_indices < len(full_lidar)
+            input_array[present] = full_lidar[feature_indices[present]]
             
             # Handle any invalid values
             input_array = np.nan_to_num(input_array, nan=0.0, posinf=1000.0, neginf=0.0)
@@ -431,9 +459,7 @@ class AIModelManager:
         except Exception as e:
             print(f"Error preparing input data: {e}")
             # Return zeros as fallback - use the expected number of features
-            DECISIVE_FRAME_POSITIONS = [24, 29, 31, 35, 38, 39, 40, 41, 42, 43, 44, 45, 47, 50, 54, 55, 57, 302,
-                                      304, 312, 314, 315, 316, 318, 319, 321, 324, 326, 328, 330]
-            return np.zeros(len(DECISIVE_FRAME_POSITIONS), dtype=np.float32)
+            return np.zeros(len(feature_indices), dtype=np.float32)
     
     def get_model_path(self):
         """Get the path of the currently loaded model"""
@@ -482,8 +508,8 @@ def train_regression_model(train_data, val_data, models_dir="models", progress_c
     Convenience function to train a regression model
     
     Args:
-        train_data: List of training data lines
-        val_data: List of validation data lines
+        train_data: List of training data lines or array of parsed frames
+        val_data: List of validation data lines or array of parsed frames
         models_dir: Directory to save the model
         progress_callback: Callback function for progress updates
         
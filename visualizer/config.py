@@ -2,6 +2,8 @@
 Configuration constants and settings for the LiDAR Visualizer
 """
 
+import numpy as np
+
 # Logging Configuration
 LOG_LEVEL = "INFO"  # Available levels: DEBUG, INFO, WARNING, ERROR, CRITICAL
 LOG_TO_FILE = True  # Whether to log to file in addition to console
@@ -49,6 +51,29 @@ DECISIVE_POINT_RADIUS = 5  # Default radius for decisive frame points
 DECISIVE_POINT_CENTER_RADIUS = 2  # Default radius for decisive point centers
 CO_CENTRIC_CIRCLE_STEP = 0.2  # Default, will be set from preferences or data
 
+# Scan quality (loaded from the .quality.npy file next to a data file, if any)
+QUALITY_FILE_SUFFIX = ".quality.npy"
+COLOR_BY_QUALITY = True  # Color normal points from weak (red) to strong (green) returns
+MAX_QUALITY = 63  # Quality of the strongest return (6 bits in normal scans)
+
+# Parsed-frame cache (see frame_cache.py), a directory created next to every data file
+FRAME_CACHE_DIR = ".frame_cache"
+USE_FRAME_CACHE = True
+
+# Data files from this size on are indexed and read line by line when visited
+LAZY_LOAD_MIN_MB = 64
+
+# Recently viewed frames kept parsed (see frame_lru.py), and the number of
+# frames parsed ahead in the direction of navigation (0 disables prefetching)
+PARSED_FRAME_CACHE_MB = 32
+PREFETCH_FRAMES = 16
+
+# Data files are opened in the background (see file_loader.py): bytes indexed
+# per step, the first step before the first frame is shown, and how often
+# the window takes in the progress
+LOAD_BLOCK_MB = 4
+LOAD_POLL_MS = 50
+
 # Export Configuration
 EXPORT_FILE_PREFIX = "lidar_dataset"  # Default prefix for exported files
 EXPORT_TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"  # Default timestamp format for exported files
@@ -172,44 +197,26 @@ def calculate_scale_factor(data_manager, sample_size=10):
     Returns:
         float: Calculated scale factor
     """
-    import math
-    
     # Sample the first few frames to understand data range
-    valid_distances = []
-    sample_count = 0
-    original_pointer = data_manager.pointer
-    
     print("Analyzing data to determine optimal scale factor...")
     
-    # Reset to beginning to sample from start (respecting data start line for header detection)
-    data_manager._pointer = data_manager._data_start_line
-    data_manager._read_pos = -1
-    
-    while data_manager.has_next() and sample_count < sample_size:
-        distances = data_manager.dataframe
-        if len(distances) == LIDAR_RESOLUTION + 1:
-            for i in range(LIDAR_RESOLUTION):
-                try:
-                    distance_value = float(distances[i])
-                    if not (math.isinf(distance_value) or math.isnan(distance_value)) and distance_value > 0:
-                        valid_distances.append(distance_value)
-                except (ValueError, TypeError):
-                    continue
-        data_manager.next()
-        sample_count += 1
+    table = data_manager.frame_table()
+    rows = slice(0, min(sample_size, len(table)))
+    distances = table.distances[rows]
+    sampled = table.valid(rows) & table.complete[rows, None] & (distances > 0)
+    valid_distances = np.sort(distances[sampled].astype(np.float64))
     
     # Reset data manager to beginning (respecting data start line)
     data_manager._pointer = data_manager._data_start_line
     data_manager._read_pos = -1
     
-    if valid_distances:
+    if len(valid_distances):
         # Calculate statistics
-        min_dist = min(valid_distances)
-        max_dist = max(valid_distances)
-        avg_dist = sum(valid_distances) / len(valid_distances)
+        min_dist = valid_distances[0]
+        max_dist = valid_distances[-1]
+        avg_dist = valid_distances.mean()
         
         # Use 90th percentile as effective max to ignore outliers
-        valid_distances.sort()
         percentile_90 = valid_distances[int(0.9 * len(valid_distances))]
         
         # Calculate scale factor: target radius / effective max distance
@@ -1,6 +1,13 @@
 import numpy as np
 import pygame as pg
 import csv
+import mmap
+import os
+from collections.abc import MutableSequence
+from .config import LIDAR_RESOLUTION
+from .frame_cache import FrameTable, load_frame_table
+from .frame_lru import FrameLRU, FramePrefetcher, split_line
+from .frame_store import FrameStore, FrameStoreTable, format_frame, parse_frame
 from .logger import get_logger, debug, info, warning, error, log_data_operation, log_navigation
 
 COLOR_INACTIVE = pg.Color('red')
@@ -86,21 +93,222 @@ class InputBox(Observable):
         pg.draw.rect(screen, self.color, self.rect, 2)
 
 
+def line_ends(data, start, stop, block_size=1 << 20):
+    """Offsets just past every newline of data[start:stop]"""
+    view = np.frombuffer(data, dtype=np.uint8, count=stop)
+    ends = [np.zeros(0, dtype=np.uint64)]
+    for block in range(start, stop, block_size):
+        newlines = np.flatnonzero(view[block:min(block + block_size, stop)] == ord('\n'))
+        ends.append(newlines.astype(np.uint64) + np.uint64(block + 1))
+    del view
+    return np.concatenate(ends)
+
+
+def line_offsets(data, size, block_size=1 << 20):
+    """Start offsets of the lines of a buffer plus its size as last entry,
+    so line i spans offsets[i]:offsets[i + 1]"""
+    offsets = np.concatenate([np.zeros(1, dtype=np.uint64),
+                              line_ends(data, 0, size, block_size)])
+    if offsets[-1] != size:
+        offsets = np.append(offsets, np.uint64(size))  # last line without newline
+    return offsets
+
+
+class LazyLines(MutableSequence):
+    """Text lines of a data file read from disk when accessed.
+
+    The file is memory-mapped and indexed by the offset of every line (8
+    bytes per line); a line is only decoded when it is asked for. Assigned
+    and inserted lines are kept in memory and the file is left untouched.
+
+    `version` grows with every change, `layout` with the changes moving
+    lines (insertions, deletions) and `edited` collects the indices
+    assigned since the last layout change, so that the parsed frames know
+    when they are out of date.
+
+    With `index_bytes` only the lines within the first bytes of the file
+    are indexed; the others are added with add_file_lines as they are
+    indexed (see file_loader.FileLoader).
+    """
+
+    def __init__(self, path, index_bytes=None):
+        self.path = path
+        self._file = open(path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+        if index_bytes is None or index_bytes >= self.size:
+            self.offsets = line_offsets(self._data, self.size)
+        else:
+            self.offsets = np.concatenate([np.zeros(1, dtype=np.uint64),
+                                           line_ends(self._data, 0, index_bytes)])
+        self._file_lines = len(self.offsets) - 1
+        # ids of the lines in order (None: the lines of the file), ids from
+        # the file size up are lines added in memory
+        self._rows = None
+        self._text = {}
+        self._next_id = self.size + 1
+        self.version = 0
+        self.layout = 0
+        self.edited = set()
+
+    def __len__(self):
+        return self._file_lines if self._rows is None else len(self._rows)
+
+    @property
+    def file_lines(self):
+        """Number of lines indexed in the file; their ids are their line
+        numbers, lines added in memory get higher ids"""
+        return self._file_lines
+
+    def line_id(self, index):
+        """Id of a line, kept while lines are inserted or deleted around it"""
+        return self._id(self._index(index))
+
+    def line_ids(self):
+        """Ids of all lines in order"""
+        return np.arange(self._file_lines, dtype=np.int64) if self._rows is None else self._rows
+
+    @property
+    def indexed_bytes(self):
+        """Bytes of the file covered by the indexed lines"""
+        return int(self.offsets[-1])
+
+    @property
+    def complete(self):
+        """Whether all lines of the file are indexed"""
+        return self.indexed_bytes == self.size
+
+    def add_file_lines(self, ends):
+        """Append the next lines of the file, `ends` being the offsets where
+        they end"""
+        if not len(ends):
+            return
+        first = self._file_lines
+        self.offsets = np.concatenate([self.offsets, np.asarray(ends, dtype=np.uint64)])
+        self._file_lines = len(self.offsets) - 1
+        if self._rows is not None:
+            self._rows = np.concatenate([self._rows, np.arange(first, self._file_lines,
+                                                               dtype=np.int64)])
+        if self.version:
+            self._moved()  # frames parsed from the changed lines are out of date
+
+    def _index(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('line index out of range')
+        return index
+
+    def _id(self, index):
+        return index if self._rows is None else int(self._rows[index])
+
+    def _line(self, line_id):
+        text = self._text.get(line_id)
+        if text is None:
+            text = self._data[self.offsets[line_id]:self.offsets[line_id + 1]].decode()
+        return text
+
+    def _all_rows(self):
+        if self._rows is None:
+            self._rows = np.arange(self._file_lines, dtype=np.int64)
+        return self._rows
+
+    def _moved(self):
+        self.version += 1
+        self.layout += 1
+        self.edited.clear()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._line(self._id(i)) for i in range(*index.indices(len(self)))]
+        return self._line(self._id(self._index(index)))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._line(self._id(i))
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError('extended slices are not supported')
+            values = list(value)
+            ids = np.arange(self._next_id, self._next_id + len(values), dtype=np.int64)
+            self._next_id += len(values)
+            self._text.update(zip(ids.tolist(), values))
+            rows = self._all_rows()
+            for line_id in rows[start:max(stop, start)].tolist():
+                self._text.pop(line_id, None)
+            self._rows = np.concatenate([rows[:start], ids, rows[max(stop, start):]])
+            self._moved()
+        else:
+            index = self._index(index)
+            self._text[self._id(index)] = value
+            self.version += 1
+            self.edited.add(index)
+
+    def __delitem__(self, index):
+        rows = self._all_rows()
+        if not isinstance(index, slice):
+            index = self._index(index)
+        for line_id in np.atleast_1d(rows[index]).tolist():
+            self._text.pop(line_id, None)
+        self._rows = np.delete(rows, index)
+        self._moved()
+
+    def insert(self, index, value):
+        index = min(max(index + len(self) if index < 0 else index, 0), len(self))
+        self[index:index] = [value]
+
+    def clear(self):
+        self._rows = np.zeros(0, dtype=np.int64)
+        self._text.clear()
+        self._moved()
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+
 class DataManager(Observer):
-    def __init__(self, in_file, out_file, w_mode=True):
+    def __init__(self, in_file, out_file, w_mode=True, lazy=None, progressive=False):
         super().__init__()
         info(f"Initializing DataManager with input file: {in_file}", "DataManager")
         
         self.in_file = in_file  # Store the input file path for saving
         self.infile = open(in_file, 'r')
-        self.lines = self.infile.readlines()
-        
-        info(f"Loaded {len(self.lines)} lines from data file", "DataManager")
+        # Large files are indexed and read line by line when visited (lazy
+        # mode), others are held in memory as a FrameStore of numbers
+        if lazy is None:
+            from .config import LAZY_LOAD_MIN_MB
+            lazy = os.path.getsize(in_file) >= LAZY_LOAD_MIN_MB * 1024 * 1024
+        self.lazy = lazy
+        # A progressive manager only indexes the start of the file; a
+        # FileLoader indexes the rest and calls finish_loading
+        index_bytes = None
+        if progressive:
+            from .config import LOAD_BLOCK_MB
+            index_bytes = int(LOAD_BLOCK_MB * 1024 * 1024)
+        self.lines = LazyLines(in_file, index_bytes)
+        self.loading = not self.lines.complete
+        self.load_cancelled = False
         
         # Detect and skip header if present
         self._header_detected = self._detect_header()
         self._data_start_line = 1 if self._header_detected else 0
         
+        # Parsed frames of the data lines (see frame_table)
+        self._frame_table = None
+        self._table_version = None
+        self._table_layout = None
+        if not lazy and not self.loading:
+            from .config import USE_FRAME_CACHE
+            table = load_frame_table(in_file, self._data_start_line, use_cache=USE_FRAME_CACHE)
+            self.lines = FrameStore(table, self.lines, self._data_start_line)
+        
+        info(f"Loaded {len(self.lines)} lines from data file", "DataManager")
+        
         if self._header_detected:
             info("Header detected in data file, skipping first line", "DataManager")
         
@@ -109,11 +317,17 @@ class DataManager(Observer):
         self.outfile = open(out_file, 'w', newline='')
         self.writer = csv.writer(self.outfile)
         self.w_mode = w_mode
-        # current line
-        self._line = ''
         # current dataframe
         self._lidar_dataframe = []
         
+        # Recently parsed dataframes, and the frames ahead of the current one
+        # parsed on a worker thread (see frame_lru)
+        from .config import PARSED_FRAME_CACHE_MB, PREFETCH_FRAMES
+        self.frame_lru = FrameLRU(int(PARSED_FRAME_CACHE_MB * 1024 * 1024))
+        self.prefetcher = FramePrefetcher(self.frame_lru, self._read_line, PREFETCH_FRAMES)
+        self._direction = 1  # direction of the last move, +1 or -1
+        self._last_read = -1
+        
         # Modified frames tracking
         self._modified_frames = []  # List of frame indices that have been modified
         self._modified_pointer = -1  # Pointer for navigating through modified frames
@@ -121,8 +335,37 @@ class DataManager(Observer):
         # Augmented frames tracking
         self._augmented_frames_added = False  # Flag to track if augmented frames were added
         
+        # Per-bin quality of the data lines of the file (None without a
+        # quality file) and of the lines given a new one, by line id (see
+        # frame_quality)
+        self.qualities = None if self.loading else self._load_qualities()
+        self._quality_edits = {}
+        
         if self._header_detected:
             print(f"Header detected in {in_file}, skipping first line")
+
+    @property
+    def fully_loaded(self):
+        """Whether all lines of the file are available (not still being
+        indexed or cancelled while they were)"""
+        return not self.loading and not self.load_cancelled
+
+    def finish_loading(self, table=None):
+        """End of the background indexing of a progressive manager, with the
+        frame table of the file unless in lazy mode"""
+        self.loading = False
+        if table is not None and self.lines.version == 0:
+            self.lines = FrameStore(table, self.lines, self._data_start_line)
+        # lines edited while loading stay read from the file as in lazy mode
+        self._frame_table = None
+        self._table_version = None
+        self.qualities = self._load_qualities()  # by line id, edits while loading keep theirs
+        info(f"Loaded {len(self.lines)} lines from data file", "DataManager")
+
+    def cancel_loading(self):
+        """Keep the lines indexed so far; the file can then not be saved"""
+        self.loading = False
+        self.load_cancelled = True
     
     def _detect_header(self):
         """Detect if the file has a header row"""
@@ -174,14 +417,143 @@ class DataManager(Observer):
             print(f"Error detecting header: {e}")
             return False
 
+    def _load_qualities(self):
+        """Load the .quality.npy file written next to recordings converted
+        from the binary format (see scan_recording.quality_path)"""
+        from .config import QUALITY_FILE_SUFFIX
+        path = os.path.splitext(self.in_file)[0] + QUALITY_FILE_SUFFIX
+        if not os.path.exists(path):
+            return None
+        try:
+            qualities = np.load(path, mmap_mode='r')
+        except (OSError, ValueError) as e:
+            warning(f"Could not load quality file {path}: {e}", "DataManager")
+            return None
+        if qualities.ndim != 2 or qualities.shape[1] != LIDAR_RESOLUTION \
+                or len(qualities) != self.lines.file_lines - self._data_start_line:
+            warning(f"Quality file {path} does not match the data file, ignoring it", "DataManager")
+            return None
+        info(f"Loaded quality of {len(qualities)} frames from {path}", "DataManager")
+        return qualities
+
+    def frame_table(self):
+        """Parsed frames of the data lines as a FrameTable (row i is line
+        `_data_start_line + i`).
+
+        Lines held in a FrameStore are read from it (see FrameStoreTable),
+        without a second copy of the frames. In lazy mode the table comes
+        from the sidecar frame cache of the file while the lines are
+        unchanged; after edits the changed rows are updated in it, after
+        lines were inserted or deleted it is parsed from the lines again.
+        While the file is not fully loaded it covers the lines indexed so far.
+        """
+        lines = self.lines
+        table = self._frame_table
+        start = self._data_start_line
+        if not self.fully_loaded:
+            # only part of the file is indexed: parse the indexed lines
+            if table is None or self._table_version != lines.version \
+                    or len(table) != max(len(lines) - start, 0):
+                table = FrameTable.from_lines(lines, start)
+                lines.edited.clear()
+                self._frame_table = table
+                self._table_version = lines.version
+                self._table_layout = lines.layout
+            return table
+        if isinstance(lines, FrameStore):
+            if not isinstance(table, FrameStoreTable) or table.store is not lines:
+                table = FrameStoreTable(lines, start)
+        elif table is not None and self._table_version == lines.version:
+            return table
+        elif lines.version == 0:
+            from .config import USE_FRAME_CACHE
+            table = load_frame_table(self.in_file, start, use_cache=USE_FRAME_CACHE,
+                                     mmap_mode='c')
+        elif table is None or isinstance(table, FrameStoreTable) \
+                or self._table_layout != lines.layout:
+            table = FrameTable.from_lines(lines, start)
+        else:
+            rows = sorted(i for i in lines.edited if i >= start)
+            table.update_rows([i - start for i in rows], [lines[i] for i in rows])
+        lines.edited.clear()
+        self._frame_table = table
+        self._table_version = lines.version
+        self._table_layout = lines.layout
+        return table
+
+    def frame(self, index):
+        """Distances (360 float32 values) and angular velocity of a line,
+        ValueError if the line is not a frame"""
+        if isinstance(self.lines, FrameStore):
+            return self.lines.frame(index)
+        return parse_frame(self.lines[index])
+
+    def set_frame(self, index, distances, angular_velocity, quality=None):
+        """Replace the distances and angular velocity of a line, and the
+        quality of its bins if given (else the line keeps its quality)"""
+        if isinstance(self.lines, FrameStore):
+            self.lines.set_frame(index, distances, angular_velocity)
+        else:
+            self.lines[index] = format_frame(distances, angular_velocity)
+        if quality is not None:
+            self.set_frame_quality(index, quality)
+        if index == self._pointer:
+            self._read_pos = -1
+
+    def frame_quality(self, index):
+        """Quality of every bin of a line, or None if unknown.
+
+        The quality follows its line through insertions and deletions (it is
+        looked up by line id); lines inserted as text have none until
+        set_frame_quality gives them one.
+        """
+        line_id = self.lines.line_id(index)
+        quality = self._quality_edits.get(line_id)
+        if quality is not None:
+            return quality
+        row = line_id - self._data_start_line
+        if self.qualities is not None and 0 <= row < len(self.qualities):
+            return self.qualities[row]
+        return None
+
+    def set_frame_quality(self, index, quality):
+        """Set the quality of every bin of a line"""
+        self._quality_edits[self.lines.line_id(index)] = np.array(quality, dtype=np.uint8)
+
+    @property
+    def quality(self):
+        """Quality of every bin of the current frame, or None if unknown"""
+        if not self._data_start_line <= self._pointer < len(self.lines):
+            return None
+        return self.frame_quality(self._pointer)
+
     @property
     def dataframe(self):
         if self._read_pos < self._pointer:
-            self._line = self.lines[self._pointer].rstrip()
-            self._lidar_dataframe = self._line.split(',')
-            self._read_pos = self._pointer
+            index = self._pointer
+            if index != self._last_read:
+                self._direction = 1 if index > self._last_read else -1
+            self.frame_lru.sync(self.lines.version)
+            values = self.frame_lru.get(index)
+            if values is None:
+                values = split_line(self.lines[index])
+                self.frame_lru.put(index, values, self.lines.version)
+            self._lidar_dataframe = values
+            self._read_pos = self._last_read = index
+            end = len(self.lines) if self._direction > 0 else self._data_start_line - 1
+            self.prefetcher.request(index, self._direction, end, self.lines.version)
         return self._lidar_dataframe
 
+    def _read_line(self, index):
+        return self.lines[index]
+
+    def frame_cache_stats(self):
+        """Hit and miss counts of the parsed-frame cache (see FrameLRU.stats)
+        and the number of frames parsed ahead"""
+        stats = self.frame_lru.stats()
+        stats['prefetched'] = self.prefetcher.prefetched
+        return stats
+
     @property
     def pointer(self):
         return self._pointer
@@ -317,14 +689,19 @@ class DataManager(Observer):
     def update_current_frame(self, new_data):
         """Update the current frame with new data"""
         if self._pointer < len(self.lines):
-            # Convert the new data to a comma-separated line
-            new_line = ','.join(str(x) for x in new_data) + '\n'
-            
-            # Update the lines array
-            self.lines[self._pointer] = new_line
+            try:
+                # Store the numbers of the frame
+                if len(new_data) != LIDAR_RESOLUTION + 1:
+                    raise ValueError(f"expected {LIDAR_RESOLUTION + 1} values")
+                self.set_frame(self._pointer, np.asarray(new_data[:LIDAR_RESOLUTION], dtype=np.float32),
+                               float(new_data[LIDAR_RESOLUTION]))
+            except (ValueError, TypeError):
+                # Not a frame: keep it as a comma-separated line
+                self.lines[self._pointer] = ','.join(str(x) for x in new_data) + '\n'
             
             # Update the current dataframe
             self._lidar_dataframe = new_data[:]
+            self._read_pos = self._pointer
             
             # Mark this frame as modified
             if self._pointer not in self._modified_frames:
@@ -367,14 +744,17 @@ class DataManager(Observer):
 
     def save_to_original_file(self):
         """Save all modifications back to the original input file"""
+        if not self.fully_loaded:
+            # the lines not indexed yet would be lost
+            error(f"Cannot save {self.in_file}: the file is not fully loaded", "DataManager")
+            return False
         try:
             # Close the current input file handle
             if hasattr(self, 'infile') and self.infile:
                 self.infile.close()
             
             # Write all lines back to the original file
-            with open(self.in_file, 'w') as f:
-                f.writelines(self.lines)
+            self._save_lines()
             
             print(f"DEBUG: Saved {len(self.lines)} lines to {self.in_file}")
             print(f"DEBUG: Modified frames: {self._modified_frames}")
@@ -394,11 +774,70 @@ class DataManager(Observer):
                 pass
             return False
 
+    def _save_lines(self):
+        """Write the lines, which are partly read from the file being
+        replaced, to a temporary file first, then index the new file"""
+        tmp_path = self.in_file + '.saving'
+        with open(tmp_path, 'w') as f:
+            f.writelines(self.lines)
+        if self._frame_table is not None:
+            self.frame_table()  # take in pending edits before the lines are replaced
+        self._save_qualities()
+        # the file cannot be replaced while it is open (Windows)
+        if isinstance(self.lines, FrameStore):
+            self.lines.source.close()
+            os.replace(tmp_path, self.in_file)
+            self.lines.rebase(LazyLines(self.in_file))
+        else:
+            self.lines.close()
+            os.replace(tmp_path, self.in_file)
+            self.lines = LazyLines(self.in_file)
+        # the parsed frames already match the saved lines
+        self._table_version = self.lines.version
+        self._table_layout = self.lines.layout
+        self.frame_lru.clear()
+        # line ids are now the line numbers of the saved file
+        self._quality_edits = {}
+        self.qualities = self._load_qualities()
+
+    def _save_qualities(self):
+        """Write the quality of the lines being saved to the quality file,
+        or remove that file when some lines have no quality"""
+        if self.qualities is None and not self._quality_edits:
+            return
+        from .config import QUALITY_FILE_SUFFIX
+        path = os.path.splitext(self.in_file)[0] + QUALITY_FILE_SUFFIX
+        start = self._data_start_line
+        ids = np.asarray(self.lines.line_ids()[start:], dtype=np.int64)
+        qualities = np.zeros((len(ids), LIDAR_RESOLUTION), dtype=np.uint8)
+        known = np.zeros(len(ids), dtype=bool)
+        if self.qualities is not None:
+            rows = ids - start
+            known = (rows >= 0) & (rows < len(self.qualities))
+            qualities[known] = self.qualities[rows[known]]
+        for i in np.flatnonzero(np.isin(ids, list(self._quality_edits))).tolist():
+            qualities[i] = self._quality_edits[int(ids[i])]
+            known[i] = True
+        self.qualities = None  # release the memory map of the file being replaced
+        if not known.all():
+            warning(f"{np.count_nonzero(~known)} saved lines have no quality, "
+                    f"removing {path}", "DataManager")
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        tmp_path = path + '.saving'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, qualities)
+        os.replace(tmp_path, path)
+    
     def close(self):
         """Close all file handles"""
         try:
+            self.prefetcher.close()
+            debug(f"Parsed-frame cache: {self.frame_cache_stats()}", "DataManager")
             if hasattr(self, 'infile') and self.infile:
                 self.infile.close()
+            self.lines.close()
             if hasattr(self, 'outfile') and self.outfile:
                 self.outfile.close()
         except:
@@ -412,8 +851,13 @@ class DataManager(Observer):
         if isinstance(observable, InputBox):
             self._lidar_dataframe[360] = observable.value
             # Update the original line data in memory
-            updated_line = ','.join(str(x) for x in self._lidar_dataframe)
-            self.lines[self._pointer] = updated_line + '\n'
+            try:
+                distances, _ = self.frame(self._pointer)
+                self.set_frame(self._pointer, distances, float(observable.value))
+                self._read_pos = self._pointer
+            except ValueError:
+                updated_line = ','.join(str(x) for x in self._lidar_dataframe)
+                self.lines[self._pointer] = updated_line + '\n'
             # Track this frame as modified
             current_frame = self._pointer
             if current_frame not in self._modified_frames:
@@ -9,7 +9,8 @@ from tkinter import ttk, messagebox
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import numpy as np
-from .config import LIDAR_RESOLUTION
+from .config import LIDAR_RESOLUTION, USE_FRAME_CACHE
+from .frame_cache import FrameTable, load_frame_table
 
 
 class DataAnalyzer:
@@ -71,110 +72,28 @@ class DataAnalyzer:
         # Check if file has headers
         has_headers = self.has_header(data_file)
         
-        angular_velocities = []
-        total_invalid_count = 0
-        frames_with_invalid = 0
-        total_frames = 0
-        
-        with open(data_file, 'r') as f:
-            for line_num, line in enumerate(f, 1):
-                line = line.strip()
-                if not line:
-                    continue
-                
-                # Skip header line if present
-                if has_headers and line_num == 1:
-                    continue
-                
-                try:
-                    data = line.split(',')
-                    if len(data) == LIDAR_RESOLUTION + 1:  # 360 lidar + 1 turn value
-                        total_frames += 1
-                        
-                        # Check for invalid data in lidar readings
-                        invalid_in_frame = 0
-                        for i in range(LIDAR_RESOLUTION):
-                            try:
-                                value = float(data[i])
-                                if math.isinf(value) or math.isnan(value) or value == 0:
-                                    invalid_in_frame += 1
-                            except (ValueError, TypeError):
-                                invalid_in_frame += 1
-                        
-                        if invalid_in_frame > 0:
-                            frames_with_invalid += 1
-                            total_invalid_count += invalid_in_frame
-                        
-                        # Extract angular velocity (last column)
-                        try:
-                            ang_vel = float(data[360])
-                            if not (math.isinf(ang_vel) or math.isnan(ang_vel)):
-                                angular_velocities.append(ang_vel)
-                        except (ValueError, TypeError):
-                            pass  # Skip non-numeric angular velocities
-                            
-                except Exception as e:
-                    print(f"Warning: Could not process line {line_num}: {e}")
+        table = load_frame_table(data_file, 1 if has_headers else 0, use_cache=USE_FRAME_CACHE)
+        return self.analyze_frame_table(table, data_file, has_headers)
+    
+    def analyze_frame_table(self, table, file_path='frame_table', has_headers=False):
+        """Statistics of parsed frames (see frame_cache.FrameTable)"""
+        complete = np.flatnonzero(table.complete)
+        invalid = LIDAR_RESOLUTION - table.valid_counts(complete)
+        labels = table.labels[complete]
         
         return {
-            'angular_velocities': angular_velocities,
-            'total_invalid_count': total_invalid_count,
-            'frames_with_invalid': frames_with_invalid,
-            'total_frames': total_frames,
-            'file_path': data_file,
+            'angular_velocities': labels[np.isfinite(labels)].tolist(),
+            'total_invalid_count': int(invalid.sum()),
+            'frames_with_invalid': int(np.count_nonzero(invalid)),
+            'total_frames': len(complete),
+            'file_path': file_path,
             'has_headers': has_headers
         }
     
     def analyze_imputed_data(self, imputed_data):
         """Analyze imputed data and return statistics"""
-        angular_velocities = []
-        total_invalid_count = 0
-        frames_with_invalid = 0
-        total_frames = 0
-        
-        for line in imputed_data:
-            line = line.strip()
-            if not line:
-                continue
-            
-            try:
-                data = line.split(',')
-                if len(data) == LIDAR_RESOLUTION + 1:  # 360 lidar + 1 turn value
-                    total_frames += 1
-                    
-                    # Check for invalid data in lidar readings
-                    invalid_in_frame = 0
-                    for i in range(LIDAR_RESOLUTION):
-                        try:
-                            value = float(data[i])
-                            if math.isinf(value) or math.isnan(value) or value == 0:
-                                invalid_in_frame += 1
-                        except (ValueError, TypeError):
-                            invalid_in_frame += 1
-                    
-                    if invalid_in_frame > 0:
-                        frames_with_invalid += 1
-                        total_invalid_count += invalid_in_frame
-                    
-                    # Extract angular velocity (last column)
-                    try:
-                        ang_vel = float(data[360])
-                        if not (math.isinf(ang_vel) or math.isnan(ang_vel)):
-                            angular_velocities.append(ang_vel)
-                    except (ValueError, TypeError):
-                        pass  # Skip non-numeric angular velocities
-                        
-            except Exception as e:
-                print(f"Warning: Could not process line: {e}")
-        
-        return {
-            'angular_velocities': angular_velocities,
-            'total_invalid_count': total_invalid_count,
-            'frames_with_invalid': frames_with_invalid,
-            'total_frames': total_frames,
-            'file_path': 'imputed_data',
-            'has_headers': False
-        }
+        table = FrameTable.from_lines(list(imputed_data))
+        return self.analyze_frame_table(table, 'imputed_data')
     
     def analyze_imputed_data_from_list(self, imputed_data_list, has_headers=False):
         """Analyze imputed data from list and return statistics"""
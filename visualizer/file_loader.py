@@ -0,0 +1,128 @@
+"""
+Background loading of data files
+
+A DataManager opened with progressive=True indexes only the first block of
+its file, so the first frame can be shown at once. FileLoader indexes the
+rest of the file on a worker thread, then (unless the manager is in lazy
+mode) builds the frame table of the file, which writes its sidecar cache.
+
+The worker does not touch the manager: it posts the offsets of the lines it
+found to a queue, and poll(), called from the Tk loop, adds them to the
+lines of the manager. Navigation can therefore go on over the lines
+indexed so far while the count grows.
+"""
+
+import mmap
+import queue
+import threading
+
+import numpy as np
+
+from .data_input import line_ends
+from .frame_cache import load_frame_table
+from .logger import info, error
+
+
+class FileLoader:
+    """Indexes the rest of a progressively opened data file
+
+    Args:
+        data_manager: DataManager created with progressive=True
+        block_bytes: Bytes of the file indexed per step
+    """
+
+    def __init__(self, data_manager, block_bytes):
+        self.data_manager = data_manager
+        self.path = data_manager.in_file
+        self.size = data_manager.lines.size
+        self.block_bytes = block_bytes
+        self.indexed_bytes = data_manager.lines.indexed_bytes
+        self.parsing = False  # indexing done, frame table being built
+        self.done = False
+        self.cancelled = False
+        self.error = None
+        self._skip = data_manager._data_start_line
+        self._build_table = not data_manager.lazy
+        self._queue = queue.Queue()
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='file-loader', daemon=True)
+        self._thread.start()
+
+    @property
+    def progress(self):
+        """Fraction of the file indexed"""
+        return self.indexed_bytes / self.size if self.size else 1.0
+
+    def _run(self):
+        try:
+            start = self.indexed_bytes
+            with open(self.path, 'rb') as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    while start < self.size and not self._cancel.is_set():
+                        stop = min(start + self.block_bytes, self.size)
+                        ends = line_ends(data, start, stop)
+                        if stop == self.size and data[stop - 1:stop] != b'\n':
+                            ends = np.append(ends, np.uint64(stop))  # last line without newline
+                        self._queue.put(('lines', ends, stop))
+                        start = stop
+                finally:
+                    data.close()
+            if self._cancel.is_set():
+                return
+            table = None
+            if self._build_table:
+                from .config import USE_FRAME_CACHE
+                self._queue.put(('parsing', None, None))
+                table = load_frame_table(self.path, self._skip, use_cache=USE_FRAME_CACHE)
+            self._queue.put(('done', table, None))
+        except Exception as e:
+            self._queue.put(('error', e, None))
+
+    def poll(self):
+        """Take in the work of the thread. Returns True while loading"""
+        if self.done or self.cancelled:
+            return False
+        ends = []
+        while True:
+            try:
+                kind, value, stop = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'lines':
+                ends.append(value)
+                self.indexed_bytes = stop
+            elif kind == 'parsing':
+                self.parsing = True
+            elif kind == 'done':
+                self._add_lines(ends)
+                ends = []
+                self.data_manager.finish_loading(value)
+                self.done = True
+                info(f"Loaded {self.path} in the background", "FileLoader")
+            elif kind == 'error':
+                self._add_lines(ends)
+                ends = []
+                self.error = value
+                self.data_manager.cancel_loading()
+                self.cancelled = True
+                error(f"Loading {self.path} failed: {value}", "FileLoader")
+        self._add_lines(ends)
+        return not (self.done or self.cancelled)
+
+    def _add_lines(self, ends):
+        if ends:
+            self.data_manager.lines.add_file_lines(np.concatenate(ends))
+
+    def cancel(self):
+        """Stop loading and keep the lines indexed so far"""
+        if self.done or self.cancelled:
+            return
+        self._cancel.set()
+        self.poll()
+        if not self.done:
+            self.data_manager.cancel_loading()
+            self.cancelled = True
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
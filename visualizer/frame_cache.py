@@ -0,0 +1,273 @@
+"""
+Parsed-frame cache for LiDAR data files
+
+A data file is parsed once into a FrameTable: an (N, 361) float32 array of
+the 360 distances and the angular velocity of every data line, a bit-packed
+mask of the valid distances and a flag per line telling whether it had the
+361 values. The table is stored in a sidecar cache directory next to the
+file and memory-mapped by later loads, which then skip text parsing.
+
+The cache is keyed by the absolute path, size, modification time and a
+BLAKE2 hash of the content. When the size and modification time match the
+sidecar is used as is; when only the modification time changed the content
+hash decides, so touching a file or checking it out again does not cost a
+new parse while any change to its content does.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from .config import FRAME_CACHE_DIR, LIDAR_RESOLUTION
+from .logger import info, warning
+
+FRAME_COLUMNS = LIDAR_RESOLUTION + 1
+CACHE_VERSION = 1
+CHUNK_BYTES = 1 << 24  # text parsed per step when building a table
+_BIT_COUNTS = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1)
+
+
+class FrameTable:
+    """Parsed frames of a data file
+
+    Attributes:
+        frames: (N, 361) float32 array, NaN where a value did not parse
+        valid_bits: (N, 45) uint8 array, bit-packed mask of the distances
+            that are finite and non-zero
+        complete: (N,) bool array, lines with exactly 361 values (the
+            others are all NaN)
+    """
+
+    def __init__(self, frames, valid_bits, complete):
+        self.frames = frames
+        self.valid_bits = valid_bits
+        self.complete = complete
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def distances(self):
+        return self.frames[:, :LIDAR_RESOLUTION]
+
+    @property
+    def labels(self):
+        return self.frames[:, LIDAR_RESOLUTION]
+
+    def valid(self, rows=slice(None)):
+        """Mask of the valid distances of the given rows, (n, 360) bool"""
+        bits = self.valid_bits[rows]
+        return np.unpackbits(bits, axis=-1, count=LIDAR_RESOLUTION).astype(bool)
+
+    def valid_counts(self, rows=slice(None)):
+        """Number of valid distances of every given row"""
+        return _BIT_COUNTS[self.valid_bits[rows]].sum(axis=-1)
+
+    def set_frame(self, row, distances, label):
+        """Set a row from its numbers (None for a line that is not a frame)"""
+        if distances is None:
+            self.frames[row] = np.nan
+            self.complete[row] = False
+        else:
+            self.frames[row, :LIDAR_RESOLUTION] = distances
+            self.frames[row, LIDAR_RESOLUTION] = label
+            self.complete[row] = True
+        self.valid_bits[row] = _valid_bits(self.frames[row:row + 1])[0]
+
+    def update_rows(self, rows, lines):
+        """Re-parse the given rows from their new text lines"""
+        for row, line in zip(rows, lines):
+            frames = self.frames[row:row + 1]
+            complete = self.complete[row:row + 1]
+            _parse_chunk([line], frames, complete)
+            self.valid_bits[row] = _valid_bits(frames)[0]
+
+    @classmethod
+    def empty(cls, n):
+        return cls(np.full((n, FRAME_COLUMNS), np.nan, dtype=np.float32),
+                   np.zeros((n, (LIDAR_RESOLUTION + 7) // 8), dtype=np.uint8),
+                   np.zeros(n, dtype=bool))
+
+    @classmethod
+    def from_lines(cls, lines, first=0):
+        """Parse text lines held in memory (or any sequence of lines that
+        can be sliced), from line `first` on"""
+        table = cls.empty(max(len(lines) - first, 0))
+        step = max(1, CHUNK_BYTES // 2500)
+        for start in range(0, len(table), step):
+            chunk = lines[first + start:first + start + step]
+            end = start + len(chunk)
+            _parse_chunk(chunk, table.frames[start:end], table.complete[start:end])
+            table.valid_bits[start:end] = _valid_bits(table.frames[start:end])
+        return table
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return np.nan
+
+
+def _parse_chunk(lines, frames, complete):
+    """Parse text lines into the rows of `frames`, whole chunk at once when
+    every line is well formed, line by line otherwise"""
+    comma = b',' if lines and isinstance(lines[0], bytes) else ','
+    fields = np.fromiter((line.count(comma) for line in lines), dtype=np.int64, count=len(lines))
+    complete[:] = fields == FRAME_COLUMNS - 1
+    if complete.all():
+        try:
+            frames[:] = np.fromstring(comma.join(lines), dtype=np.float32,
+                                      sep=',').reshape(frames.shape)
+            return
+        except ValueError:
+            pass  # an empty or non-numeric value somewhere
+    for i, line in enumerate(lines):
+        if not complete[i]:
+            frames[i] = np.nan
+            continue
+        values = line.split(comma)
+        try:
+            frames[i] = np.array(values, dtype=np.float32)
+        except ValueError:
+            frames[i] = [_to_float(value) for value in values]
+
+
+def _valid_bits(frames):
+    distances = frames[:, :LIDAR_RESOLUTION]
+    return np.packbits(np.isfinite(distances) & (distances != 0), axis=1)
+
+
+def cache_paths(path):
+    """Sidecar files of a data file: frames, valid bits, complete flags and key"""
+    directory, name = os.path.split(os.path.abspath(path))
+    base = os.path.join(directory, FRAME_CACHE_DIR, name)
+    return (base + '.frames.npy', base + '.valid.npy', base + '.complete.npy',
+            base + '.key.json')
+
+
+def file_digest(path):
+    """BLAKE2 hash of the content and number of lines of a file"""
+    digest = hashlib.blake2b(digest_size=20)
+    lines = 0
+    last = b'\n'
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(CHUNK_BYTES)
+            if not block:
+                break
+            digest.update(block)
+            lines += block.count(b'\n')
+            last = block[-1:]
+    return digest.hexdigest(), lines + (last != b'\n')
+
+
+def _read_key(key_path):
+    try:
+        with open(key_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_key(key_path, key):
+    tmp_path = key_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(key, f)
+    os.replace(tmp_path, key_path)
+
+
+def _load_cached(path, skip, stat, mmap_mode):
+    """The sidecar table if it matches the file, else None"""
+    frames_path, valid_path, complete_path, key_path = cache_paths(path)
+    key = _read_key(key_path)
+    if key is None or key.get('version') != CACHE_VERSION or key.get('skip') != skip \
+            or key.get('path') != os.path.abspath(path) or key.get('size') != stat.st_size:
+        return None
+    if key.get('mtime_ns') != stat.st_mtime_ns:
+        digest, _ = file_digest(path)
+        if digest != key.get('digest'):
+            return None
+        key['mtime_ns'] = stat.st_mtime_ns
+        try:
+            _write_key(key_path, key)
+        except OSError:
+            pass
+    try:
+        table = FrameTable(*(np.load(p, mmap_mode=mmap_mode)
+                             for p in (frames_path, valid_path, complete_path)))
+    except (OSError, ValueError) as e:
+        warning(f"Could not load frame cache of {path}: {e}", "FrameCache")
+        return None
+    if not len(table.frames) == len(table.valid_bits) == len(table.complete) == key.get('rows'):
+        return None
+    return table
+
+
+def _build_cache(path, skip, stat, mmap_mode):
+    """Parse the file straight into new sidecar files and return the table"""
+    frames_path, valid_path, complete_path, key_path = cache_paths(path)
+    os.makedirs(os.path.dirname(frames_path), exist_ok=True)
+    digest, lines = file_digest(path)
+    rows = max(lines - skip, 0)
+    tmp_paths = [p + '.tmp.npy' for p in (frames_path, valid_path, complete_path)]
+    open_memmap = np.lib.format.open_memmap
+    frames = open_memmap(tmp_paths[0], mode='w+', dtype=np.float32,
+                         shape=(rows, FRAME_COLUMNS))
+    valid_bits = open_memmap(tmp_paths[1], mode='w+', dtype=np.uint8,
+                             shape=(rows, (LIDAR_RESOLUTION + 7) // 8))
+    complete = open_memmap(tmp_paths[2], mode='w+', dtype=bool, shape=(rows,))
+    row = 0
+    with open(path, 'rb') as f:
+        for _ in range(skip):
+            f.readline()
+        while row < rows:
+            chunk = f.readlines(CHUNK_BYTES)
+            if not chunk:
+                break
+            chunk = chunk[:rows - row]
+            end = row + len(chunk)
+            _parse_chunk(chunk, frames[row:end], complete[row:end])
+            valid_bits[row:end] = _valid_bits(frames[row:end])
+            row = end
+    for array in (frames, valid_bits, complete):
+        array.flush()
+    del frames, valid_bits, complete
+    for tmp_path, final_path in zip(tmp_paths, (frames_path, valid_path, complete_path)):
+        os.replace(tmp_path, final_path)
+    _write_key(key_path, {'version': CACHE_VERSION, 'path': os.path.abspath(path),
+                          'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                          'digest': digest, 'skip': skip, 'rows': rows})
+    return FrameTable(*(np.load(p, mmap_mode=mmap_mode)
+                        for p in (frames_path, valid_path, complete_path)))
+
+
+def load_frame_table(path, skip=0, use_cache=True, mmap_mode='r'):
+    """Parsed frames of a data file, from its sidecar cache when up to date
+
+    Args:
+        path: Data file, one frame per line
+        skip: Number of header lines before the first frame
+        use_cache: Whether to read and write the sidecar cache
+        mmap_mode: Mode of the memory maps of the cache, 'c' for arrays
+            that can be changed in memory without writing to the cache
+
+    Returns:
+        FrameTable: Row i is line `skip + i` of the file
+    """
+    stat = os.stat(path)
+    if use_cache:
+        table = _load_cached(path, skip, stat, mmap_mode)
+        if table is not None:
+            return table
+        try:
+            table = _build_cache(path, skip, stat, mmap_mode)
+            info(f"Parsed {len(table)} frames of {path} into the frame cache", "FrameCache")
+            return table
+        except OSError as e:
+            warning(f"Could not write frame cache of {path}: {e}", "FrameCache")
+    with open(path, 'rb') as f:
+        lines = f.readlines()
+    return FrameTable.from_lines(lines[skip:])
@@ -0,0 +1,165 @@
+"""
+Parsed-frame LRU cache and prefetcher of DataManager
+
+DataManager.dataframe hands out every line split into its 361 values.
+FrameLRU keeps the most recently used of those lists up to a memory budget,
+so that stepping back and forth or replaying a stretch of frames does not
+read and split the same lines again. FramePrefetcher parses the next frames
+in the direction of navigation on a worker thread, so that playback and
+held arrow keys find them in the cache.
+
+The cache is tied to the `version` of the lines it was filled from and is
+emptied when the lines change; lines parsed by the worker while the lines
+changed are dropped instead of being cached.
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+
+
+def split_line(line):
+    """Values of a text line, as DataManager.dataframe returns them"""
+    return line.rstrip().split(',')
+
+
+def values_size(values):
+    """Memory held by a list of value strings"""
+    return sys.getsizeof(values) + sum(map(sys.getsizeof, values))
+
+
+class FrameLRU:
+    """Least recently used parsed frames within a memory budget
+
+    Args:
+        max_bytes: Memory budget of the cached value lists (0 disables the cache)
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.version = None
+        self._frames = OrderedDict()  # line index -> (values, size)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._frames)
+
+    def __contains__(self, index):
+        return index in self._frames
+
+    def sync(self, version):
+        """Empty the cache if the lines changed since it was filled"""
+        with self._lock:
+            if version != self.version:
+                self._clear()
+                self.version = version
+
+    def get(self, index):
+        """Values of a cached line (a copy, the caller may change it) or
+        None, counted as a hit or a miss"""
+        with self._lock:
+            entry = self._frames.get(index)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._frames.move_to_end(index)
+            self.hits += 1
+            return list(entry[0])
+
+    def put(self, index, values, version):
+        """Cache the values of a line read at the given lines version"""
+        size = values_size(values)
+        with self._lock:
+            if version != self.version or size > self.max_bytes:
+                return
+            old = self._frames.pop(index, None)
+            if old is not None:
+                self.nbytes -= old[1]
+            self._frames[index] = (list(values), size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted) = self._frames.popitem(last=False)
+                self.nbytes -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self._frames.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        """Hit and miss counts, hit rate, cached frames and memory"""
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'frames': len(self._frames), 'nbytes': self.nbytes}
+
+
+class FramePrefetcher:
+    """Parses the frames ahead of the current one on a worker thread
+
+    Args:
+        cache: FrameLRU the parsed frames go to
+        read_line: Function returning the text of a line by index
+        count: Number of frames parsed ahead of the current one
+    """
+
+    def __init__(self, cache, read_line, count):
+        self.cache = cache
+        self.read_line = read_line
+        self.count = count
+        self.prefetched = 0
+        self._request = None
+        self._wake = threading.Condition()
+        self._closed = False
+        self._thread = None
+
+    def request(self, index, direction, end, version):
+        """Parse the `count` lines after `index` in `direction` (+1 or -1)
+        that are not cached yet, stopping at line `end` (excluded)"""
+        if self._closed or self.count <= 0:
+            return
+        with self._wake:
+            self._request = (index, direction, end, version)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='frame-prefetch',
+                                                daemon=True)
+                self._thread.start()
+            self._wake.notify()
+
+    def _run(self):
+        while True:
+            with self._wake:
+                while self._request is None and not self._closed:
+                    self._wake.wait()
+                if self._closed:
+                    return
+                index, direction, end, version = self._request
+                self._request = None
+            for step in range(1, self.count + 1):
+                i = index + step * direction
+                if (i - end) * direction >= 0 or i < 0:
+                    break
+                if self._request is not None or self._closed:
+                    break  # navigation moved on, start from the new frame
+                if i in self.cache:
+                    continue
+                try:
+                    values = split_line(self.read_line(i))
+                except Exception:
+                    break  # lines changed or closed while reading
+                self.cache.put(i, values, version)
+                self.prefetched += 1
+
+    def close(self):
+        """Stop the worker thread"""
+        with self._wake:
+            self._closed = True
+            self._wake.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
@@ -0,0 +1,385 @@
+"""
+Compact in-memory store of the frames of a data file
+
+FrameStore keeps the lines of a data file as columns of numbers instead of
+one CSV string per line: a uint16 matrix of the 360 distances in quarter
+millimetres (the resolution the sensor reports, see rplidar._process_scan),
+a float32 column of angular velocities and a bit-packed validity mask,
+about 770 bytes per frame against 2.5 KB or more for the text. Files with
+distances that do not fit (finer than a quarter millimetre, negative, above
+16383.75 mm, inf or nan) keep them in a float32 matrix instead.
+
+The store is still a sequence of text lines for the code reading `lines`:
+lines that were not changed are read back from the file, changed ones are
+formatted from their numbers. `frame` and `set_frame` read and write the
+numbers of a line directly. FrameStoreTable serves the frames as a
+FrameTable for statistics, K-best and training without copying them.
+"""
+
+from collections.abc import MutableSequence
+
+import numpy as np
+
+from .config import LIDAR_RESOLUTION
+from .frame_cache import FRAME_COLUMNS, FrameTable, _valid_bits
+
+SCALE = 4  # stored units per millimetre
+MAX_DISTANCE = np.iinfo(np.uint16).max / SCALE
+VALID_BYTES = (LIDAR_RESOLUTION + 7) // 8
+
+
+def parse_frame(text):
+    """Distances (float32 array) and label of a frame line, ValueError if
+    the line does not hold 361 numbers"""
+    values = text.strip().split(',')
+    if len(values) != FRAME_COLUMNS:
+        raise ValueError(f"expected {FRAME_COLUMNS} values, got {len(values)}")
+    values = np.array(values, dtype=np.float32)
+    return values[:LIDAR_RESOLUTION], values[LIDAR_RESOLUTION]
+
+
+def format_value(value):
+    """Shortest text reading back as the same float32"""
+    return np.format_float_positional(np.float32(value), trim='0')
+
+
+def format_frame(distances, label):
+    """Frame line of the given distances and label"""
+    return ','.join([format_value(d) for d in distances] + [format_value(label)]) + '\n'
+
+
+def fits_quantized(distances):
+    """Whether the distances are exact multiples of the stored unit within
+    the uint16 range"""
+    distances = np.asarray(distances, dtype=np.float32)
+    with np.errstate(invalid='ignore'):
+        scaled = distances * SCALE
+        return bool(np.all((distances >= 0) & (distances <= MAX_DISTANCE)
+                           & (scaled == np.rint(scaled))))
+
+
+class FrameStore(MutableSequence):
+    """Lines of a data file stored as columns of numbers
+
+    Args:
+        table: FrameTable of the lines of the file from line `first` on
+        source: LazyLines of the file, for the text of unchanged lines
+        first: Number of lines before the first row of the table (header)
+    """
+
+    def __init__(self, table, source, first=0):
+        n = len(source)
+        complete = np.zeros(n, dtype=bool)
+        complete[first:first + len(table)] = table.complete
+        self.quantized = all(fits_quantized(table.distances[start:start + 4096]
+                                            [table.complete[start:start + 4096]])
+                             for start in range(0, len(table), 4096))
+        self.distances = np.zeros((n, LIDAR_RESOLUTION),
+                                  dtype=np.uint16 if self.quantized else np.float32)
+        self.labels = np.zeros(n, dtype=np.float32)
+        self.valid_bits = np.zeros((n, VALID_BYTES), dtype=np.uint8)
+        for start in range(0, len(table), 4096):
+            rows = slice(first + start, first + min(start + 4096, len(table)))
+            self._store(rows, table.distances[start:start + 4096],
+                        table.labels[start:start + 4096])
+        self.is_frame = complete
+        self.edited_rows = np.zeros(n, dtype=bool)  # text formatted from the numbers
+        self.source = source
+        self.file_lines = n  # storage rows of the lines of the file
+        self._size = n
+        self._rows = None  # storage row of every line (None: line i is row i)
+        self._text = {}  # text of the rows of lines that are not frames
+        self.version = 0
+        self.layout = 0
+        self.edited = set()
+
+    def _store(self, rows, distances, labels):
+        distances = np.asarray(distances, dtype=np.float32)
+        if self.quantized:
+            with np.errstate(invalid='ignore'):
+                self.distances[rows] = np.rint(np.nan_to_num(distances) * SCALE)
+        else:
+            self.distances[rows] = distances
+        self.labels[rows] = labels
+        self.valid_bits[rows] = _valid_bits(np.atleast_2d(distances))
+
+    def _dequantize(self, rows):
+        if self.quantized:
+            return self.distances[rows].astype(np.float32) / SCALE
+        return self.distances[rows].copy()
+
+    def _unquantize(self):
+        """Switch to float32 distances for values that do not fit"""
+        self.distances = self.distances[:len(self.distances)].astype(np.float32) / SCALE
+        self.quantized = False
+
+    @property
+    def nbytes(self):
+        """Memory used by the columns"""
+        return sum(a.nbytes for a in (self.distances, self.labels, self.valid_bits,
+                                      self.is_frame, self.edited_rows))
+
+    # Storage rows
+
+    def _grow(self, count):
+        """Storage rows for `count` new lines"""
+        start = self._size
+        if start + count > len(self.labels):
+            capacity = max(start + count, len(self.labels) * 3 // 2)
+            for name in ('distances', 'labels', 'valid_bits', 'is_frame', 'edited_rows'):
+                array = getattr(self, name)
+                grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+                grown[:start] = array[:start]
+                setattr(self, name, grown)
+        self._size += count
+        return range(start, start + count)
+
+    def _row(self, index):
+        return index if self._rows is None else int(self._rows[index])
+
+    def line_id(self, index):
+        """Storage row of a line, kept while lines are inserted or deleted
+        around it (the lines of the file are rows 0 to file_lines - 1)"""
+        return self._row(self._index(index))
+
+    def line_ids(self):
+        """Storage rows of all lines in order"""
+        return np.arange(len(self), dtype=np.int64) if self._rows is None else self._rows
+
+    def _all_rows(self):
+        if self._rows is None:
+            self._rows = np.arange(len(self.source), dtype=np.int64)
+        return self._rows
+
+    def _write_line(self, row, text):
+        """Store a text line in a storage row, as numbers when it is a frame"""
+        self._text.pop(row, None)
+        try:
+            distances, label = parse_frame(text)
+        except ValueError:
+            self.is_frame[row] = False
+            self.edited_rows[row] = True
+            self._text[row] = text
+            return
+        self._write_frame(row, distances, label)
+
+    def _write_frame(self, row, distances, label):
+        if self.quantized and not fits_quantized(distances):
+            self._unquantize()
+        self._store(row, distances, label)
+        self.is_frame[row] = True
+        self.edited_rows[row] = True
+
+    def _line(self, row):
+        if row in self._text:
+            return self._text[row]
+        if not self.edited_rows[row]:
+            return self.source[row]
+        distances = self._dequantize(row)
+        return format_frame(distances.tolist(), self.labels[row])
+
+    # Sequence of text lines
+
+    def __len__(self):
+        return len(self.source) if self._rows is None else len(self._rows)
+
+    def _index(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('line index out of range')
+        return index
+
+    def _moved(self):
+        self.version += 1
+        self.layout += 1
+        self.edited.clear()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._line(self._row(i)) for i in range(*index.indices(len(self)))]
+        return self._line(self._row(self._index(index)))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._line(self._row(i))
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError('extended slices are not supported')
+            values = list(value)
+            new_rows = self._grow(len(values))
+            for row, text in zip(new_rows, values):
+                self._write_line(row, text)
+            rows = self._all_rows()
+            self._rows = np.concatenate([rows[:start], np.array(new_rows, dtype=np.int64),
+                                         rows[max(stop, start):]])
+            self._moved()
+        else:
+            index = self._index(index)
+            self._write_line(self._row(index), value)
+            self.version += 1
+            self.edited.add(index)
+
+    def __delitem__(self, index):
+        rows = self._all_rows()
+        if not isinstance(index, slice):
+            index = self._index(index)
+        self._rows = np.delete(rows, index)
+        self._moved()
+
+    def insert(self, index, value):
+        index = min(max(index + len(self) if index < 0 else index, 0), len(self))
+        self[index:index] = [value]
+
+    def clear(self):
+        self._rows = np.zeros(0, dtype=np.int64)
+        self._moved()
+
+    # Frames as numbers
+
+    def frame(self, index):
+        """Distances (float32 array) and label of a line, ValueError if the
+        line is not a frame"""
+        row = self._row(self._index(index))
+        if not self.is_frame[row]:
+            raise ValueError(f"line {index} is not a frame")
+        return self._dequantize(row), self.labels[row]
+
+    def set_frame(self, index, distances, label):
+        """Replace the distances and label of a line"""
+        index = self._index(index)
+        self._write_frame(self._row(index), distances, label)
+        self.version += 1
+        self.edited.add(index)
+
+    def frame_table(self, first=0):
+        """FrameTable of the lines from `first` on"""
+        rows = np.arange(self._size) if self._rows is None else self._rows
+        rows = rows[first:]
+        table = FrameTable.empty(len(rows))
+        for start in range(0, len(rows), 4096):
+            block = rows[start:start + 4096]
+            end = start + len(block)
+            complete = self.is_frame[block]
+            table.complete[start:end] = complete
+            table.frames[start:end, :LIDAR_RESOLUTION] = self._dequantize(block)
+            table.frames[start:end, LIDAR_RESOLUTION] = self.labels[block]
+            table.frames[start:end][~complete] = np.nan
+            table.valid_bits[start:end] = self.valid_bits[block] * complete[:, None]
+        return table
+
+    def rebase(self, source):
+        """Take the lines of a saved copy of the store as the new source
+        (the old source is left to the caller, who closes it before
+        replacing its file)"""
+        rows = np.arange(self._size) if self._rows is None else self._rows
+        for name in ('distances', 'labels', 'valid_bits', 'is_frame'):
+            setattr(self, name, getattr(self, name)[rows])
+        self.edited_rows = np.zeros(len(rows), dtype=bool)
+        self.source = source
+        self.file_lines = self._size = len(rows)
+        self._rows = None
+        self._text = {}
+
+    def close(self):
+        self.source.close()
+
+
+class FrameStoreTable:
+    """FrameTable of the lines of a FrameStore from line `first` on, read
+    from the store when rows are asked for instead of being copied, so
+    statistics, K-best and training do not hold a float32 copy of every
+    frame next to the store. It follows the changes of the store.
+
+    Args:
+        store: FrameStore holding the lines
+        first: Number of lines before the first row (header)
+    """
+
+    def __init__(self, store, first=0):
+        self.store = store
+        self.first = first
+        self.distances = _TableRows(self, with_label=False)
+        self.frames = _TableRows(self, with_label=True)
+
+    def __len__(self):
+        return max(len(self.store) - self.first, 0)
+
+    def _storage_rows(self, rows):
+        """Storage rows of the store for table rows (int, slice, index or
+        mask array)"""
+        n = len(self)
+        if isinstance(rows, slice):
+            index = np.arange(*rows.indices(n))
+        elif np.ndim(rows) == 0:
+            index = int(rows)
+            if index < 0:
+                index += n
+            if not 0 <= index < n:
+                raise IndexError('row index out of range')
+        else:
+            index = np.asarray(rows)
+            if index.dtype == bool:
+                index = np.flatnonzero(index)
+            index = np.where(index < 0, index + n, index)
+        index = index + self.first
+        if self.store._rows is None:
+            return index
+        return self.store._rows[index]
+
+    @property
+    def complete(self):
+        return self.store.is_frame[self._storage_rows(slice(None))]
+
+    @property
+    def labels(self):
+        rows = self._storage_rows(slice(None))
+        return np.where(self.store.is_frame[rows], self.store.labels[rows], np.float32(np.nan))
+
+    def read(self, rows, with_label=True):
+        """Distances (and label) of the given rows, NaN for lines that are
+        not frames"""
+        storage = self._storage_rows(rows)
+        values = self.store._dequantize(storage)
+        if with_label:
+            values = np.concatenate([values, self.store.labels[storage][..., None]], axis=-1)
+        complete = self.store.is_frame[storage]
+        return np.where(complete[..., None] if values.ndim == 2 else complete,
+                        values, np.float32(np.nan))
+
+    def valid(self, rows=slice(None)):
+        """Mask of the valid distances of the given rows, (n, 360) bool"""
+        storage = self._storage_rows(rows)
+        complete = self.store.is_frame[storage]
+        bits = self.store.valid_bits[storage]
+        valid = np.unpackbits(bits, axis=-1, count=LIDAR_RESOLUTION).astype(bool)
+        return valid & (complete[..., None] if valid.ndim == 2 else complete)
+
+    def valid_counts(self, rows=slice(None)):
+        """Number of valid distances of every given row"""
+        return self.valid(rows).sum(axis=-1)
+
+
+class _TableRows:
+    """Row-indexed column view of a FrameStoreTable (table.frames[rows, cols])"""
+
+    def __init__(self, table, with_label):
+        self.table = table
+        self.with_label = with_label
+
+    def __len__(self):
+        return len(self.table)
+
+    @property
+    def shape(self):
+        return (len(self.table), FRAME_COLUMNS if self.with_label else LIDAR_RESOLUTION)
+
+    def __getitem__(self, key):
+        rows, rest = (key[0], key[1:]) if isinstance(key, tuple) else (key, ())
+        values = self.table.read(rows, self.with_label)
+        if not rest:
+            return values
+        return values[rest] if values.ndim == 1 else values[(slice(None),) + rest]
@@ -31,49 +31,23 @@ def analyze_kbest_features(data_manager, k=30, score_func='f_classif'):
         # Collect all data points
         print(f"Starting K-Best analysis with k={k}, score_func={score_func}")
         
-        X_data = []  # LiDAR features (360 values per frame)
-        y_data = []  # Angular velocity labels
-        
-        # Reset data manager to beginning
-        original_pointer = data_manager.pointer
-        data_manager.first()
-        
-        frames_processed = 0
-        max_frames = min(1000, len(data_manager.lines))  # Limit for performance
-        
-        while data_manager.has_next() and frames_processed < max_frames:
-            try:
-                distances = data_manager.dataframe
-                if len(distances) == 361:  # 360 lidar + 1 angular velocity
-                    # Extract LiDAR features (first 360 values)
-                    lidar_features = distances[:360]
-                    angular_velocity = distances[360]
-                    
-                    # Clean the data - replace invalid values
-                    lidar_features = [
-                        float(x) if str(x).replace('.', '').replace('-', '').isdigit() 
-                        and str(x).lower() not in ['inf', 'nan', ''] 
-                        and float(x) > 0 
-                        else 1000.0  # Default safe distance
-                        for x in lidar_features
-                    ]
-                    
-                    # Validate angular velocity
-                    if str(angular_velocity).replace('.', '').replace('-', '').isdigit():
-                        X_data.append(lidar_features)
-                        y_data.append(float(angular_velocity))
-                        frames_processed += 1
-                
-                data_manager.next()
-                
-            except Exception as e:
-                print(f"Error processing frame {frames_processed}: {e}")
-                data_manager.next()
-                continue
-        
-        # Restore original position
-        data_manager._pointer = original_pointer
-        data_manager._read_pos = original_pointer - 1
+        # Parsed frames with 361 values (360 lidar + 1 angular velocity)
+        table = data_manager.frame_table()
+        max_frames = 1000  # Limit for performance
+        rows = []
+        for start in range(0, len(table), max_frames):
+            block = slice(start, start + max_frames)
+            usable = table.complete[block] & np.isfinite(table.labels[block])
+            rows.extend(start + np.flatnonzero(usable))
+            if len(rows) >= max_frames:
+                break
+        rows = np.array(rows[:max_frames], dtype=np.intp)
+        
+        # Clean the data - replace invalid values by a default safe distance
+        distances = table.distances[rows]
+        usable = table.valid(rows) & (distances > 0)
+        X_data = np.where(usable, distances, np.float32(1000.0))
+        y_data = table.labels[rows]
         
         if len(X_data) < 10:
             raise ValueError(f"Insufficient valid data for analysis. Only {len(X_data)} frames processed.")
@@ -72,6 +72,13 @@ class UIManager:
         
         # Menu components
         self.recent_menu = None
+        
+        # Background loading progress (shown while a data file loads)
+        self.status_label = None
+        self.load_progress_frame = None
+        self.load_progress_bar = None
+        self.load_progress_var = None
+        self.load_cancel_button = None
     
     def setup_ui(self):
         """Setup the main UI components"""
@@ -256,10 +263,36 @@ class UIManager:
         status_frame = ttk.Frame(parent)
         status_frame.pack(fill='x', side='bottom', pady=(5, 0))
         
+        # Progress of a data file loading in the background, hidden until then
+        self.load_progress_var = tk.StringVar()
+        self.load_progress_frame = ttk.Frame(status_frame)
+        ttk.Label(self.load_progress_frame, textvariable=self.load_progress_var,
+                  font=('TkDefaultFont', 9)).pack(side='left', padx=(0, 5))
+        self.load_progress_bar = ttk.Progressbar(self.load_progress_frame, mode='determinate',
+                                                 maximum=100, length=150)
+        self.load_progress_bar.pack(side='left')
+        self.load_cancel_button = ttk.Button(self.load_progress_frame, text="Cancel", width=7)
+        self.load_cancel_button.pack(side='left', padx=(5, 0))
+        
         # Create the status label - minimal styling
-        status_label = ttk.Label(status_frame, textvariable=self.status_var, 
+        self.status_label = ttk.Label(status_frame, textvariable=self.status_var, 
                  font=('TkDefaultFont', 9), wraplength=800, anchor='e', justify='right')
-        status_label.pack(fill='x')
+        self.status_label.pack(fill='x')
+    
+    def show_load_progress(self, cancel_callback):
+        """Show the loading progress bar with a Cancel button"""
+        self.load_cancel_button.config(command=cancel_callback)
+        self.set_load_progress(0, "Loading...")
+        self.load_progress_frame.pack(side='left', before=self.status_label)
+    
+    def set_load_progress(self, percent, text):
+        """Update the loading progress bar and its label"""
+        self.load_progress_bar['value'] = percent
+        self.load_progress_var.set(text)
+    
+    def hide_load_progress(self):
+        """Hide the loading progress bar"""
+        self.load_progress_frame.pack_forget()
     
     def show_dataset_radio_buttons(self):
         """Show the dataset selection radio buttons after data split"""
@@ -108,7 +108,9 @@ class VisualizationRenderer:
         self._draw_robot_distance_circles(center_x, center_y, dynamic_scale)
 
         # Render lidar points
-        self._render_lidar_points(distances, center_x, center_y, dynamic_scale, augmented_mode)
+        quality = getattr(data_manager, 'quality', None)
+        self._render_lidar_points(distances, center_x, center_y, dynamic_scale, augmented_mode,
+                                  quality)
 
         # Draw car
         self._draw_car(center_x, center_y)
@@ -307,8 +309,21 @@ class VisualizationRenderer:
                 
                 self.screen.blit(text_surface, (label_x, label_y))
 
-    def _render_lidar_points(self, distances, center_x, center_y, dynamic_scale, augmented_mode):
-        """Render the lidar points"""
+    def _quality_colors(self, quality):
+        """Point and center colors for a return of the given quality, from red
+        (weak) to the normal green (strong)"""
+        from .config import MAX_QUALITY
+        t = min(max(float(quality) / MAX_QUALITY, 0.0), 1.0)
+        point = (int(255 - 155 * t), int(80 + 175 * t), int(80 + 20 * t))
+        center = (int(200 - 150 * t), int(40 + 160 * t), int(40 + 10 * t))
+        return point, center
+
+    def _render_lidar_points(self, distances, center_x, center_y, dynamic_scale, augmented_mode,
+                             quality=None):
+        """Render the lidar points, colored by quality when it is known"""
+        from .config import COLOR_BY_QUALITY
+        if not COLOR_BY_QUALITY:
+            quality = None
         for x in range(LIDAR_RESOLUTION):
             try:
                 distance_value = float(distances[x])
@@ -336,9 +351,12 @@ class VisualizationRenderer:
             else:
                 # Regular LiDAR points in bright green with better visibility
                 from .config import NORMAL_POINT_RADIUS, NORMAL_POINT_CENTER_RADIUS
-                pygame.draw.circle(self.screen, (100, 255, 100), (x_coord, y_coord), NORMAL_POINT_RADIUS)
+                point_color, center_color = (100, 255, 100), (50, 200, 50)
+                if quality is not None:
+                    point_color, center_color = self._quality_colors(quality[x])
+                pygame.draw.circle(self.screen, point_color, (x_coord, y_coord), NORMAL_POINT_RADIUS)
                 # Add a darker center for better definition
-                pygame.draw.circle(self.screen, (50, 200, 50), (x_coord, y_coord), NORMAL_POINT_CENTER_RADIUS)
+                pygame.draw.circle(self.screen, center_color, (x_coord, y_coord), NORMAL_POINT_CENTER_RADIUS)
     
     def _draw_car(self, center_x, center_y):
         """Draw the car representation"""
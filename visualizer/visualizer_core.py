@@ -18,6 +18,7 @@ from .undo_system import UndoSystem
 from .data_statistics import DataAnalyzer
 from .visualization_renderer import VisualizationRenderer
 from .data_input import DataManager
+from .file_loader import FileLoader
 from .logger import get_logger, debug, info, warning, error, log_ui_event, log_navigation, log_dataset_operation, log_function
 from .ai_model import is_ai_model_loaded, load_ai_model, get_ai_prediction, get_ai_model_info
 from .custom_dialogs import ask_yes_no, ask_yes_no_cancel
@@ -77,15 +78,10 @@ class VisualizerWindow:
         self.undo_system = UndoSystem()
         self.data_analyzer = DataAnalyzer()
         
-        # Initialize data manager
-        self.data_manager = DataManager(config['data_file'], 'data/run2/_out.txt', False)
-        
-        # Set up main dataset as the original full dataset
-        self.main_dataset = self.data_manager
-        calculate_scale_factor(self.data_manager)
-        
-        # Initialize frame navigator
-        self.frame_navigator = FrameNavigator(self.data_manager)
+        # Initialize data manager; only the start of the file is read here,
+        # the rest is loaded in the background once the window is up
+        self.file_loader = None
+        self._open_data_manager(config['data_file'])
         
         # Create main tkinter window
         self.root = tk.Tk()
@@ -136,6 +132,9 @@ class VisualizerWindow:
         self.update_status()
         self.update_inputs()
         
+        # Load the rest of the data file in the background
+        self._start_loading()
+        
         # Bind window close event
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
         
@@ -558,42 +557,26 @@ class VisualizerWindow:
             return
             
         try:
-            # Get current frame data
-            current_line = self.data_manager.lines[self.data_manager.pointer]
-            
-            # Parse the data (expecting 360 LiDAR readings + angular velocity)
-            data_parts = current_line.strip().split(',')
-            if len(data_parts) < 361:
-                print(f"Invalid data format: expected 361 values, got {len(data_parts)}")
+            # Get current frame data (360 LiDAR readings + angular velocity)
+            try:
+                lidar_readings, angular_velocity = self.data_manager.frame(self.data_manager.pointer)
+            except ValueError as e:
+                print(f"Invalid data format: {e}")
                 return
             
-            # Extract LiDAR readings (first 360 values) and angular velocity (last value)
-            lidar_readings = [float(x) for x in data_parts[:360]]
-            angular_velocity = float(data_parts[360])
-            
             # Flip the LiDAR data horizontally by mapping angles
             # For horizontal flip: angle -> (180 - angle) % 360
-            # This means: index i -> index (180 - i) % 360
-            flipped_lidar = [0.0] * 360
-            for i in range(360):
-                # Calculate the flipped angle index
-                flipped_index = (180 - i) % 360
-                flipped_lidar[flipped_index] = lidar_readings[i]
+            # This means: index i -> index (180 - i) % 360 (its own inverse)
+            mirror = (180 - np.arange(360)) % 360
+            flipped_lidar = lidar_readings[mirror]
+            quality = self.data_manager.frame_quality(self.data_manager.pointer)
             
             # Negate the angular velocity for horizontal flip
             flipped_angular_velocity = -angular_velocity
             
-            # Reconstruct the data line in CSV format (360 distance values + angular velocity)
-            # Ensure all values are properly formatted as strings
-            flipped_data_strings = [str(float(x)) for x in flipped_lidar] + [str(float(flipped_angular_velocity))]
-            flipped_line = ','.join(flipped_data_strings)
-            
-            # Ensure the line ends with a newline character (preserve original format)
-            if not flipped_line.endswith('\n'):
-                flipped_line += '\n'
-            
-            # Update the data in memory
-            self.data_manager.lines[self.data_manager.pointer] = flipped_line
+            # Update the data in memory, the quality bins move with the distances
+            self.data_manager.set_frame(self.data_manager.pointer, flipped_lidar, flipped_angular_velocity,
+                                        None if quality is None else quality[mirror])
             
             # Invalidate the dataframe cache to force re-reading the modified data
             self.data_manager._read_pos = -1
@@ -662,39 +645,23 @@ class VisualizerWindow:
     
     def _flip_single_frame_horizontal(self, frame_index):
         """Apply horizontal flip to a single frame"""
-        # Get frame data
-        current_line = self.data_manager.lines[frame_index]
-        
-        # Parse the data (expecting 360 LiDAR readings + angular velocity)
-        data_parts = current_line.strip().split(',')
-        if len(data_parts) < 361:
-            print(f"Invalid data format: expected 361 values, got {len(data_parts)}")
+        # Get frame data (360 LiDAR readings + angular velocity)
+        try:
+            lidar_readings, angular_velocity = self.data_manager.frame(frame_index)
+        except ValueError as e:
+            print(f"Invalid data format: {e}")
             return
         
-        # Extract LiDAR readings (first 360 values) and angular velocity (last value)
-        lidar_readings = [float(x) for x in data_parts[:360]]
-        angular_velocity = float(data_parts[360])
-        
-        # Flip the LiDAR data horizontally using your algorithm: 0↔359, 1↔358, etc.
-        flipped_lidar = [0.0] * 360
-        for i in range(360):
-            # Horizontal flip: swap left and right sides
-            flipped_index = (359 - i) % 360
-            flipped_lidar[flipped_index] = lidar_readings[i]
+        # Flip the LiDAR data horizontally: 0↔359, 1↔358, etc.
+        flipped_lidar = lidar_readings[::-1]
+        quality = self.data_manager.frame_quality(frame_index)
         
         # Negate the angular velocity for horizontal flip
         flipped_angular_velocity = -angular_velocity
         
-        # Reconstruct the data line in CSV format
-        flipped_data_strings = [str(float(x)) for x in flipped_lidar] + [str(float(flipped_angular_velocity))]
-        flipped_line = ','.join(flipped_data_strings)
-        
-        # Ensure the line ends with a newline character
-        if not flipped_line.endswith('\n'):
-            flipped_line += '\n'
-        
-        # Update the data in memory
-        self.data_manager.lines[frame_index] = flipped_line
+        # Update the data in memory, the quality bins move with the distances
+        self.data_manager.set_frame(frame_index, flipped_lidar, flipped_angular_velocity,
+                                    None if quality is None else quality[::-1])
         
         # Mark this frame as modified so it gets saved
         if frame_index not in self.data_manager._modified_frames:
@@ -763,39 +730,25 @@ class VisualizerWindow:
     
     def _flip_single_frame_vertical(self, frame_index):
         """Apply vertical flip to a single frame"""
-        # Get frame data
-        current_line = self.data_manager.lines[frame_index]
-        
-        # Parse the data (expecting 360 LiDAR readings + angular velocity)
-        data_parts = current_line.strip().split(',')
-        if len(data_parts) < 361:
-            print(f"Invalid data format: expected 361 values, got {len(data_parts)}")
+        # Get frame data (360 LiDAR readings + angular velocity)
+        try:
+            lidar_readings, angular_velocity = self.data_manager.frame(frame_index)
+        except ValueError as e:
+            print(f"Invalid data format: {e}")
             return
         
-        # Extract LiDAR readings (first 360 values) and angular velocity (last value)
-        lidar_readings = [float(x) for x in data_parts[:360]]
-        angular_velocity = float(data_parts[360])
-        
         # Flip the LiDAR data vertically: forward↔backward
-        flipped_lidar = [0.0] * 360
-        for i in range(360):
-            # Vertical flip: 0°↔180°, 90° stays 90°, 270° stays 270°
-            flipped_index = (180 - i) % 360
-            flipped_lidar[flipped_index] = lidar_readings[i]
+        # Vertical flip: 0°↔180°, 90° stays 90°, 270° stays 270°
+        mirror = (180 - np.arange(360)) % 360
+        flipped_lidar = lidar_readings[mirror]
+        quality = self.data_manager.frame_quality(frame_index)
         
         # Keep the angular velocity the same for vertical flip (no left-right change)
         flipped_angular_velocity = angular_velocity
         
-        # Reconstruct the data line in CSV format
-        flipped_data_strings = [str(float(x)) for x in flipped_lidar] + [str(float(flipped_angular_velocity))]
-        flipped_line = ','.join(flipped_data_strings)
-        
-        # Ensure the line ends with a newline character
-        if not flipped_line.endswith('\n'):
-            flipped_line += '\n'
-        
-        # Update the data in memory
-        self.data_manager.lines[frame_index] = flipped_line
+        # Update the data in memory, the quality bins move with the distances
+        self.data_manager.set_frame(frame_index, flipped_lidar, flipped_angular_velocity,
+                                    None if quality is None else quality[mirror])
         
         # Mark this frame as modified so it gets saved
         if frame_index not in self.data_manager._modified_frames:
@@ -864,7 +817,9 @@ class VisualizerWindow:
         
         if result is True:  # Yes - save and exit
             try:
-                self.data_manager.save_to_original_file()
+                if not self.data_manager.save_to_original_file():
+                    messagebox.showerror("Save Error", "Failed to save changes")
+                    return False
                 self.mark_data_saved()
                 return True
             except Exception as e:
@@ -1236,12 +1191,9 @@ class VisualizerWindow:
             self.ui_manager.status_var.set("Loading data file...")
             self.root.update()
             
-            # Create new data manager
-            self.data_manager = DataManager(filename, 'data/run2/_out.txt', False)
-            calculate_scale_factor(self.data_manager)
-            
-            # Update frame navigator
-            self.frame_navigator = FrameNavigator(self.data_manager)
+            # Create new data manager (stopping the loading of the previous file)
+            self._stop_loading()
+            self._open_data_manager(filename)
             
             # Update config
             self.config['data_file'] = filename
@@ -1263,6 +1215,9 @@ class VisualizerWindow:
             # Update status
             self.update_status()
             
+            # Load the rest of the file in the background
+            self._start_loading()
+            
             # Add to recent files
             self.file_manager.add_recent_file(filename)
             self.ui_manager.update_recent_files_menu(self.file_manager.get_recent_files(), self.load_recent_file)
@@ -1287,6 +1242,75 @@ class VisualizerWindow:
             traceback.print_exc()
             return False
     
+    def _open_data_manager(self, filename):
+        """Open a data file as the main dataset. Only the start of the file is
+        indexed, _start_loading loads the rest (see file_loader)"""
+        previous = getattr(self, 'data_manager', None)
+        self.data_manager = DataManager(filename, 'data/run2/_out.txt', False, progressive=True)
+        if previous is not None:
+            previous.close()  # its file, memory map and prefetch thread
+        
+        # Set up main dataset as the original full dataset
+        self.main_dataset = self.data_manager
+        calculate_scale_factor(self.data_manager)
+        
+        # Initialize frame navigator
+        self.frame_navigator = FrameNavigator(self.data_manager)
+    
+    def _start_loading(self):
+        """Index the rest of the data file on a worker thread, showing the
+        progress and the growing frame count while navigation goes on"""
+        if not self.data_manager.loading:
+            return
+        from .config import LOAD_BLOCK_MB, LOAD_POLL_MS
+        self.file_loader = FileLoader(self.data_manager, int(LOAD_BLOCK_MB * 1024 * 1024))
+        self.ui_manager.show_load_progress(self.cancel_loading)
+        self.root.after(LOAD_POLL_MS, self._poll_loading, self.file_loader)
+    
+    def _poll_loading(self, loader):
+        """Take in the lines indexed by the loader, every LOAD_POLL_MS"""
+        if loader is not self.file_loader:
+            return  # cancelled or replaced by another file
+        from .config import LOAD_POLL_MS
+        loading = loader.poll()
+        frames = len(self.data_manager.lines) - self.data_manager._data_start_line
+        if loading:
+            if loader.parsing:
+                self.ui_manager.set_load_progress(100, f"Parsing {frames} frames...")
+            else:
+                self.ui_manager.set_load_progress(loader.progress * 100,
+                                                  f"Indexing {loader.progress:.0%} ({frames} frames)")
+            self.root.after(LOAD_POLL_MS, self._poll_loading, loader)
+        else:
+            self.file_loader = None
+            self.ui_manager.hide_load_progress()
+            self.update_button_states()
+            if loader.error is not None:
+                messagebox.showerror("Error", f"Failed to load the whole data file:\n{loader.error}\n\n"
+                                     f"The first {frames} frames can be viewed but not saved.")
+        
+        # Frame count of the main dataset grows as lines are indexed
+        if self.current_dataset_type == 'main':
+            frame_info = self.frame_navigator.get_current_frame_info()
+            self.ui_manager.total_frames_label.config(text=f"of {frame_info['total_frames']}")
+        self.update_status()
+    
+    def cancel_loading(self):
+        """Stop loading the data file, keeping the frames indexed so far"""
+        loader = self.file_loader
+        if loader is None:
+            return
+        self._stop_loading()
+        self.ui_manager.hide_load_progress()
+        self.update_status()
+        frames = len(self.data_manager.lines) - self.data_manager._data_start_line
+        print(f"Loading cancelled after {frames} frames; the file cannot be saved")
+    
+    def _stop_loading(self):
+        if self.file_loader is not None:
+            self.file_loader.cancel()
+            self.file_loader = None
+    
     def load_recent_file(self, file_path):
         """Load a file from the recent files list"""
         if self.file_manager.file_exists(file_path):
@@ -1305,6 +1329,10 @@ class VisualizerWindow:
                 messagebox.showerror("Error", "No data manager available for saving")
                 return
             
+            if not self.data_manager.fully_loaded:
+                messagebox.showerror("Error", "The data file is not fully loaded, it cannot be saved")
+                return
+            
             # Check if there are modifications to save
             if not hasattr(self.data_manager, 'has_changes_to_save') or not self.data_manager.has_changes_to_save():
                 messagebox.showinfo("Info", "No modifications to save")
@@ -3185,8 +3213,12 @@ MOUSE CONTROLS:
                 # Create a copy of the current frame for augmentation
                 new_lines.append(current_line)
             
-            # Insert the new frames into the data
+            # Insert the new frames into the data, with the quality of the current frame
+            quality = self.data_manager.frame_quality(self.data_manager.pointer)
             self.data_manager.lines[insert_position:insert_position] = new_lines
+            if quality is not None:
+                for i in range(len(new_lines)):
+                    self.data_manager.set_frame_quality(insert_position + i, quality)
             
             # Preserve dataset split information for new frames
             if self.ui_manager.data_splits:
@@ -3258,8 +3290,12 @@ MOUSE CONTROLS:
                 # Create an exact copy of the current frame
                 new_lines.append(current_line)
             
-            # Insert the duplicate frames into the data
+            # Insert the duplicate frames into the data, with the quality of the current frame
+            quality = self.data_manager.frame_quality(self.data_manager.pointer)
             self.data_manager.lines[insert_position:insert_position] = new_lines
+            if quality is not None:
+                for i in range(len(new_lines)):
+                    self.data_manager.set_frame_quality(insert_position + i, quality)
             
             # Preserve dataset split information for duplicated frames
             if self.ui_manager.data_splits:
@@ -3953,37 +3989,29 @@ MOUSE CONTROLS:
     def _apply_rotation_transformation(self, angle_degrees):
         """Apply rotation transformation by shifting array indices"""
         try:
-            # Get current data line
-            current_line = self.data_manager.lines[self.data_manager.pointer]
-            data_parts = current_line.strip().split(',')
-            
-            # Check if we have enough data points (expecting at least 361 elements)
-            if len(data_parts) < 361:
-                print(f"Warning: Insufficient data points for rotation ({len(data_parts)} < 361)")
+            # Get current frame (360 LiDAR readings + angular velocity)
+            try:
+                lidar_data, angular_velocity = self.data_manager.frame(self.data_manager.pointer)
+            except ValueError as e:
+                print(f"Warning: Insufficient data points for rotation ({e})")
                 return
             
             # Backup current frame before modification
             self.data_manager.backup_current_frame()
             
-            # Extract lidar data (first 360 elements) and angular velocity (last element)
-            lidar_data = data_parts[:360]  # First 360 elements are LiDAR readings
-            angular_velocity = data_parts[-1]  # Last element is angular velocity
-            other_data = data_parts[360:-1] if len(data_parts) > 361 else []  # Any data between LiDAR and angular velocity
-            
             # Calculate shift amount (1 degree = 1 index for 360-degree array)
             shift_amount = int(angle_degrees) % 360
             
             # Apply rotation by shifting array indices
             if shift_amount != 0:
                 # Positive shift for counter-clockwise, negative for clockwise
-                rotated_lidar = lidar_data[-shift_amount:] + lidar_data[:-shift_amount]
-                
-                # Reconstruct the data line with original angular velocity preserved
-                new_data_parts = rotated_lidar + other_data + [angular_velocity]
+                rotated_lidar = np.roll(lidar_data, shift_amount)
+                quality = self.data_manager.frame_quality(self.data_manager.pointer)
                 
-                # Update the line in data manager
-                new_line = ','.join(new_data_parts) + '\n'
-                self.data_manager.lines[self.data_manager.pointer] = new_line
+                # Update the frame in data manager, original angular velocity preserved
+                self.data_manager.set_frame(self.data_manager.pointer, rotated_lidar, angular_velocity,
+                                            None if quality is None else np.roll(quality, shift_amount))
+                new_line = self.data_manager.lines[self.data_manager.pointer]
                 self.data_manager.update_current_frame_from_string(new_line.strip())
                 
                 # Refresh display
@@ -4452,17 +4480,18 @@ MOUSE CONTROLS:
                     # Use ai_model directly with progress callback
                     from visualizer.ai_model import train_regression_model as train_func
                     
-                    # Prepare data
-                    train_data = []
-                    val_data = []
+                    # Prepare data from the parsed frames of the dataset
+                    table = self.main_dataset.frame_table()
+                    data_start = self.main_dataset._data_start_line
                     
-                    for frame_id in self.train_ids:
-                        if frame_id < len(self.main_dataset.lines):
-                            train_data.append(self.main_dataset.lines[frame_id].strip())
+                    def frame_rows(frame_ids):
+                        rows = np.array([frame_id - data_start for frame_id in frame_ids
+                                         if data_start <= frame_id < len(self.main_dataset.lines)],
+                                        dtype=np.intp)
+                        return table.frames[rows[table.complete[rows]]]
                     
-                    for frame_id in self.val_ids:
-                        if frame_id < len(self.main_dataset.lines):
-                            val_data.append(self.main_dataset.lines[frame_id].strip())
+                    train_data = frame_rows(self.train_ids)
+                    val_data = frame_rows(self.val_ids)
                     
                     append_output(f"📊 Training samples: {len(train_data)}\n")
                     append_output(f"📊 Validation samples: {len(val_data)}\n")
@@ -4531,6 +4560,9 @@ MOUSE CONTROLS:
                 return  # User cancelled the exit
             
             self.running = False
+            self._stop_loading()
+            if getattr(self, 'data_manager', None) is not None:
+                self.data_manager.close()
             self.renderer.cleanup()
             self.root.quit()
             self.root.destroy()